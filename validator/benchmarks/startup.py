@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Startup benchmark of the SEIS-PROV validator.
+
+Each measurement runs in a fresh Python process and records the time it
+takes to import the package, the time of the first validation, and the time
+of the first validation that is answered from the result cache.
+
+$ python startup.py --repeat 20 --json
+
+:copyright:
+    Lion Krischer (lion.krischer@googlemail.com), 2015
+:license:
+    BSD 3-Clause ("BSD New" or "BSD Simplified")
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_FILE = os.path.join(
+    _DIR, os.path.pardir, "seis_prov_validate", "test_data", "valid_files",
+    "waveform_trace_min.xml")
+
+# Executed in a new process. Prints the timings in seconds as JSON.
+_SCRIPT = """
+import json, sys, time
+t = time.time()
+import seis_prov_validate
+t_import = time.time() - t
+t = time.time()
+cache = None
+if sys.argv[2]:
+    from seis_prov_validate.cache import ResultCache
+    cache = ResultCache(sys.argv[2])
+result = seis_prov_validate.validate(sys.argv[1], cache=cache)
+t_validate = time.time() - t
+assert result.is_valid, str(result)
+print(json.dumps({"import": t_import, "first_call": t_validate,
+                  "heavy_modules": sorted(
+                      _i for _i in ("jsonschema", "lxml", "prov")
+                      if _i in sys.modules)}))
+"""
+
+
+def _run(filename, cache_dir=""):
+    output = subprocess.check_output(
+        [sys.executable, "-c", _SCRIPT, filename, cache_dir],
+        cwd=os.path.join(_DIR, os.path.pardir))
+    return json.loads(output.decode("utf-8"))
+
+
+def _median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+def benchmark(filename=DEFAULT_FILE, repeat=10):
+    """
+    Run the startup benchmark. Returns a dictionary with the median times in
+    milliseconds.
+
+    :param filename: The file to validate.
+    :param repeat: The number of processes to start for each measurement.
+    """
+    cache_dir = tempfile.mkdtemp()
+    try:
+        # Fill the cache.
+        _run(filename, cache_dir)
+        uncached = [_run(filename) for _ in range(repeat)]
+        cached = [_run(filename, cache_dir) for _ in range(repeat)]
+    finally:
+        shutil.rmtree(cache_dir)
+
+    return {
+        "python": sys.version.split()[0],
+        "repeat": repeat,
+        "import_ms": _median([_i["import"] for _i in uncached]) * 1000.0,
+        "first_call_ms": _median(
+            [_i["first_call"] for _i in uncached]) * 1000.0,
+        "first_cached_call_ms": _median(
+            [_i["first_call"] for _i in cached]) * 1000.0,
+        "modules_after_cached_call": cached[0]["heavy_modules"]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Startup benchmark of the SEIS-PROV validator.")
+    parser.add_argument("--file", default=DEFAULT_FILE,
+                        help="The file to validate.")
+    parser.add_argument("--repeat", type=int, default=10,
+                        help="Number of processes per measurement.")
+    parser.add_argument("--json", action="store_true",
+                        help="Print the results as JSON.")
+    parser.add_argument("--budget", type=float,
+                        help="Exit with a non-zero exit code if importing "
+                        "and the first validation together take longer than "
+                        "this many milliseconds.")
+    args = parser.parse_args(argv)
+
+    results = benchmark(filename=args.file, repeat=args.repeat)
+    total = results["import_ms"] + results["first_call_ms"]
+
+    if args.json:
+        print(json.dumps(results, indent=2, sort_keys=True))
+    else:
+        print("Median of %i runs with Python %s:" % (results["repeat"],
+                                                     results["python"]))
+        print("  import:            %8.1f ms" % results["import_ms"])
+        print("  first call:        %8.1f ms" % results["first_call_ms"])
+        print("  first cached call: %8.1f ms" %
+              results["first_cached_call_ms"])
+        print("  import + first call: %6.1f ms" % total)
+
+    if args.budget is not None and total > args.budget:
+        print("Startup budget of %.1f ms exceeded." % args.budget,
+              file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
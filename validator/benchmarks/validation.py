@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Throughput and memory benchmark of the SEIS-PROV validator.
+
+Synthetic PROV-XML and PROV-JSON documents with different layouts and sizes
+are written to a temporary directory with
+:class:`~seis_prov_validate.synthetic.CorpusGenerator` and each one is
+validated in a fresh Python process which reports the time of the validation
+and its peak memory usage.
+
+Layouts:
+
+* ``flat``: Waveform traces processed by a detrend activity each.
+* ``bundles``: The same traces split into bundles of about 100 records each.
+* ``wide``: Input parameters records with 100 parameters each.
+
+$ python validation.py --sizes 10,1000 --output results.json
+$ python validation.py --sizes 10,1000 --compare results.json
+
+:copyright:
+    Lion Krischer (lion.krischer@googlemail.com), 2015
+:license:
+    BSD 3-Clause ("BSD New" or "BSD Simplified")
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+
+try:
+    from seis_prov_validate import synthetic
+except ImportError:
+    # Use the package next to the benchmarks if it is not installed.
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(
+        __file__)), os.path.pardir))
+    from seis_prov_validate import synthetic
+
+_DIR = os.path.dirname(os.path.abspath(__file__))
+
+FORMATS = ("xml", "json")
+LAYOUTS = ("flat", "bundles", "wide")
+SIZES = (10, 1000, 100000, 1000000)
+
+# The processing chain of the flat and bundles layouts.
+CHAIN = ("detrend",)
+# Records per bundle of the bundles layout.
+BUNDLE_SIZE = 100
+# Attributes per record of the wide layout.
+WIDTH = 100
+
+# Executed in a new process. Prints the results as JSON.
+_SCRIPT = """
+import json, resource, sys, time
+from seis_prov_validate.validator import _load_schemas, validate
+filename, streaming, repeat = sys.argv[1], sys.argv[2] == "1", int(sys.argv[3])
+_load_schemas()
+rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+times = []
+for _ in range(repeat):
+    t = time.time()
+    result = validate(filename, streaming=streaming)
+    times.append(time.time() - t)
+rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({"seconds": min(times), "errors": result.errors,
+                  "rss_before_kb": rss_before, "rss_after_kb": rss_after}))
+"""
+
+
+def _generator(layout, count):
+    """
+    The generator of a document with about ``count`` records.
+    """
+    if layout == "wide":
+        return synthetic.CorpusGenerator(
+            traces=max(count - 1, 1), scenario="parameters", parameters=WIDTH)
+    # Each trace results in one record for itself and five for each
+    # activity of the chain. The software agent is shared by all traces.
+    traces = max((count - 1) // (1 + 5 * len(CHAIN)), 1)
+    bundles = 0
+    if layout == "bundles":
+        bundles = max(traces * (1 + 5 * len(CHAIN)) // BUNDLE_SIZE, 1)
+    return synthetic.CorpusGenerator(traces=traces, chain=CHAIN,
+                                     bundles=bundles)
+
+
+def _counted(containers, counts):
+    """
+    Count the records of the containers while they are written.
+    """
+    def records(container):
+        for record in container:
+            counts["records"] += 1
+            yield record
+
+    for bundle, container in containers:
+        yield bundle, records(container)
+
+
+def write(filename, layout, count):
+    """
+    Write a synthetic document. Returns the number of records.
+
+    :param filename: The filename. Written as PROV-JSON if it ends with
+        ``.json``, otherwise as PROV-XML.
+    :param layout: One of :data:`LAYOUTS`.
+    :param count: The approximate number of records.
+    """
+    counts = {"records": 0}
+    writer = synthetic.write_json if filename.endswith(".json") else \
+        synthetic.write_xml
+    with io.open(filename, "wt", encoding="utf-8") as fh:
+        writer(fh, _counted(_generator(layout, count).containers(), counts))
+    return counts["records"]
+
+
+def _run(filename, streaming, repeat):
+    output = subprocess.check_output(
+        [sys.executable, "-c", _SCRIPT, filename, "1" if streaming else "0",
+         str(repeat)], cwd=os.path.join(_DIR, os.path.pardir))
+    return json.loads(output.decode("utf-8"))
+
+
+def benchmark(formats=FORMATS, layouts=LAYOUTS, sizes=SIZES,
+              streaming=False, repeat=3, directory=None):
+    """
+    Run the benchmark. Returns a list of dictionaries, one for each case.
+
+    :param formats: The formats of the documents.
+    :param layouts: The layouts of the documents.
+    :param sizes: The approximate number of records of the documents.
+    :param streaming: Use the streaming validation.
+    :param repeat: Validations per case, the fastest one counts. Documents
+        with more than 1000 records are only validated once.
+    :param directory: Where to write the documents. A temporary directory
+        if not given.
+    """
+    tmp_dir = directory or tempfile.mkdtemp()
+    results = []
+    try:
+        for fmt in formats:
+            for layout in layouts:
+                for size in sizes:
+                    filename = os.path.join(tmp_dir, "%s_%i.%s" % (
+                        layout, size, fmt))
+                    records = write(filename, layout, size)
+                    file_size = os.path.getsize(filename)
+                    run = _run(filename, streaming,
+                               repeat if size <= 1000 else 1)
+                    os.remove(filename)
+
+                    seconds = run["seconds"]
+                    results.append({
+                        "name": "%s-%s-%i%s" % (
+                            fmt, layout, size,
+                            "-streaming" if streaming else ""),
+                        "format": fmt,
+                        "layout": layout,
+                        "records": records,
+                        "streaming": streaming,
+                        "bytes": file_size,
+                        "seconds": seconds,
+                        "records_per_second": records / seconds,
+                        "mb_per_second": file_size / 1024.0 ** 2 / seconds,
+                        "peak_rss_mb": run["rss_after_kb"] / 1024.0,
+                        "rss_increase_mb": (run["rss_after_kb"] -
+                                            run["rss_before_kb"]) / 1024.0,
+                        "valid": not run["errors"],
+                        "errors": run["errors"]})
+    finally:
+        if directory is None:
+            shutil.rmtree(tmp_dir)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compare results to a baseline. Returns a list of messages, one for each
+    case that got slower or uses more memory than the tolerance allows.
+    """
+    baseline = dict((_i["name"], _i) for _i in baseline["results"])
+    regressions = []
+    for result in results:
+        old = baseline.get(result["name"])
+        if old is None:
+            continue
+        for key in ("seconds", "rss_increase_mb"):
+            # Ignore differences below a millisecond and a megabyte.
+            if result[key] > old[key] * (1.0 + tolerance) and \
+                    result[key] - old[key] > 1E-3:
+                regressions.append("%s: %s went from %.4g to %.4g." % (
+                    result["name"], key, old[key], result[key]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Throughput and memory benchmark of the SEIS-PROV "
+        "validator.")
+    parser.add_argument("--formats", default=",".join(FORMATS),
+                        help="Comma separated list of formats.")
+    parser.add_argument("--layouts", default=",".join(LAYOUTS),
+                        help="Comma separated list of layouts.")
+    parser.add_argument("--sizes", default=",".join(str(_i) for _i in SIZES),
+                        help="Comma separated list of record counts.")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Use the streaming validation.")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Validations of small documents per case.")
+    parser.add_argument("--output", help="Write the results as JSON to this "
+                        "file.")
+    parser.add_argument("--compare", metavar="BASELINE",
+                        help="Compare to the results in this file and exit "
+                        "with a non-zero exit code on regressions.")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed relative regression for --compare.")
+    args = parser.parse_args(argv)
+
+    results = benchmark(
+        formats=args.formats.split(","), layouts=args.layouts.split(","),
+        sizes=[int(_i) for _i in args.sizes.split(",")],
+        streaming=args.streaming, repeat=args.repeat)
+
+    for r in results:
+        print("%-32s %10.4f s %12.0f records/s %8.2f MB/s %8.1f MB%s" % (
+            r["name"], r["seconds"], r["records_per_second"],
+            r["mb_per_second"], r["rss_increase_mb"],
+            "" if r["valid"] else "  INVALID"))
+
+    output = {"python": platform.python_version(),
+              "platform": platform.platform(),
+              "results": results}
+    if args.output:
+        with io.open(args.output, "wt", encoding="utf-8") as fh:
+            fh.write(json.dumps(output, indent=2, sort_keys=True))
+            fh.write("\n")
+
+    failed = [_i["name"] for _i in results if not _i["valid"]]
+    if failed:
+        print("Invalid documents: %s" % ", ".join(failed), file=sys.stderr)
+        sys.exit(1)
+
+    if args.compare:
+        with io.open(args.compare, "rt", encoding="utf-8") as fh:
+            regressions = compare(results, json.load(fh), args.tolerance)
+        for message in regressions:
+            print(message, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,4 +7,4 @@
     BSD 3-Clause ("BSD New" or "BSD Simplified")
 """
 
-from .validator import validate  # NOQA
+from .validator import validate, validate_document, Validator  # NOQA
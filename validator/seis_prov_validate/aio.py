@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Validate SEIS-PROV files from asyncio applications.
+
+The validations run in an executor so they never block the event loop. A
+thread pool works for most cases as large parts of the parsing happen
+without holding the GIL, a process pool spreads CPU bound validations
+across all cores. Requires Python >= 3.6.
+
+:copyright:
+    Lion Krischer (lion.krischer@googlemail.com), 2015
+:license:
+    BSD 3-Clause ("BSD New" or "BSD Simplified")
+"""
+import asyncio
+import concurrent.futures
+import functools
+import io
+import multiprocessing
+
+from .validator import validate
+
+# Default number of validations in flight at the same time.
+DEFAULT_CONCURRENCY = multiprocessing.cpu_count()
+
+# asyncio.get_event_loop() is deprecated within coroutines and its
+# replacement only exists in Python >= 3.7.
+_get_running_loop = getattr(asyncio, "get_running_loop",
+                            asyncio.get_event_loop)
+
+
+def _validate(file_or_object, kwargs):
+    """
+    Runs in the executor. Raw bytes are validated as an in-memory file.
+    """
+    if isinstance(file_or_object, (bytes, bytearray, memoryview)):
+        file_or_object = io.BytesIO(file_or_object)
+    return validate(file_or_object, **kwargs)
+
+
+def _read(file_object):
+    return file_object.read()
+
+
+async def validate_async(file_or_object, executor=None, limit=None,
+                         **kwargs):
+    """
+    Validate a given SEIS-PROV file without blocking the event loop.
+
+    :param file_or_object: The filename, file-like object, or the bytes of
+        the file to validate.
+    :param executor: The :class:`concurrent.futures.Executor` running the
+        validation. Defaults to the default executor of the event loop.
+        File-like objects cannot be sent to other processes so they are read
+        in the default executor first when using a
+        :class:`~concurrent.futures.ProcessPoolExecutor`.
+    :param limit: An :class:`asyncio.Semaphore` shared between calls to
+        bound the number of validations in flight at the same time.
+
+    All further keyword arguments are passed on to
+    :func:`~seis_prov_validate.validator.validate`.
+    """
+    if limit is not None:
+        async with limit:
+            return await validate_async(file_or_object, executor=executor,
+                                        **kwargs)
+
+    loop = _get_running_loop()
+    if isinstance(executor, concurrent.futures.ProcessPoolExecutor) and \
+            hasattr(file_or_object, "read"):
+        file_or_object = await loop.run_in_executor(None, _read,
+                                                    file_or_object)
+    return await loop.run_in_executor(
+        executor, functools.partial(_validate, file_or_object, kwargs))
+
+
+async def _iterate(files):
+    if hasattr(files, "__aiter__"):
+        async for item in files:
+            yield item
+    else:
+        for item in files:
+            yield item
+
+
+async def validate_many_async(files, executor=None,
+                              concurrency=DEFAULT_CONCURRENCY, **kwargs):
+    """
+    Validate many files without blocking the event loop. Asynchronous
+    generator yielding ``(file_or_object, result)`` tuples in the order in
+    which the validations finish.
+
+    The next files are only taken from ``files`` once fewer than
+    ``concurrency`` validations are in flight so it can also be a lazy or
+    asynchronous iterable of files that are still arriving.
+
+    :param files: Iterable or asynchronous iterable of filenames, file-like
+        objects, or bytes.
+    :param executor: The executor running the validations, see
+        :func:`validate_async`.
+    :param concurrency: Maximum number of validations in flight at the same
+        time.
+
+    All further keyword arguments are passed on to
+    :func:`~seis_prov_validate.validator.validate`.
+    """
+    async def _validate_one(file_or_object):
+        return file_or_object, await validate_async(
+            file_or_object, executor=executor, **kwargs)
+
+    pending = set()
+    try:
+        async for file_or_object in _iterate(files):
+            if len(pending) >= max(1, concurrency):
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+            pending.add(asyncio.ensure_future(_validate_one(file_or_object)))
+
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        # Only happens if the consumer stops early or on errors.
+        for task in pending:
+            task.cancel()
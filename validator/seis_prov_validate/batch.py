@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Validate large numbers of SEIS-PROV files, optionally in parallel.
+
+:copyright:
+    Lion Krischer (lion.krischer@googlemail.com), 2015
+:license:
+    BSD 3-Clause ("BSD New" or "BSD Simplified")
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import glob
+import os
+
+from .validator import validate, _load_schemas
+
+# Extensions of files that are picked up when searching directories.
+EXTENSIONS = (".xml", ".json")
+
+
+def find_files(paths, extensions=EXTENSIONS):
+    """
+    Expand a list of paths to a list of files to validate.
+
+    Directories are recursively searched for files with one of the
+    ``extensions`` and glob patterns are expanded. Everything else is
+    passed on as is so non-existent paths will later result in proper
+    validation errors.
+
+    :param paths: List of filenames, directories, and glob patterns.
+    :param extensions: The extensions of files picked up in directories.
+    """
+    filenames = []
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, files in os.walk(path):
+                dirnames.sort()
+                filenames.extend(
+                    os.path.join(dirpath, _i) for _i in sorted(files)
+                    if os.path.splitext(_i)[1].lower() in extensions)
+        elif not os.path.exists(path) and any(_i in path for _i in "*?["):
+            filenames.extend(find_files(sorted(glob.glob(path)),
+                                        extensions=extensions))
+        else:
+            filenames.append(path)
+    return filenames
+
+
+def _init_worker():
+    """
+    Load all schemas once per worker process.
+    """
+    _load_schemas()
+
+
+def _validate_file(args):
+    filename, kwargs = args
+    return filename, validate(filename, **kwargs)
+
+
+def validate_many(filenames, jobs=1, **kwargs):
+    """
+    Validate many files. Generator yielding ``(filename, result)`` tuples in
+    the order in which the validations finish.
+
+    :param filenames: The files to validate.
+    :param jobs: The number of processes to use. If 1, everything runs in the
+        current process, if 0 or ``None`` all available cores are used.
+
+    All further keyword arguments are passed on to
+    :func:`~seis_prov_validate.validator.validate`.
+    """
+    import multiprocessing
+
+    filenames = [(_i, kwargs) for _i in filenames]
+    if not jobs:
+        jobs = multiprocessing.cpu_count()
+    jobs = min(jobs, len(filenames))
+
+    if jobs <= 1:
+        for filename in filenames:
+            yield _validate_file(filename)
+        return
+
+    # Send files in chunks to reduce the communication overhead for many
+    # small files but keep them small enough to evenly distribute the work.
+    chunksize = max(1, min(64, len(filenames) // (jobs * 4)))
+
+    pool = multiprocessing.Pool(processes=jobs, initializer=_init_worker)
+    try:
+        for item in pool.imap_unordered(_validate_file, filenames,
+                                        chunksize=chunksize):
+            yield item
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Persistent cache of validation results.
+
+Results are keyed by the hash of the validated bytes, the hash of all
+schemas, and the validation options. Changing the schemas thus automatically
+invalidates all cached results. The validator stores messages without the
+name of the validated file so results are shared by files with the same
+contents.
+
+:copyright:
+    Lion Krischer (lion.krischer@googlemail.com), 2015
+:license:
+    BSD 3-Clause ("BSD New" or "BSD Simplified")
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+
+import six
+
+_SCHEMA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           "schemas")
+
+# Number of bytes read at once when hashing files.
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+# Default maximum size of all cached results.
+DEFAULT_MAX_SIZE = 100 * 1024 * 1024
+
+# Default location of the cache used by the command line interface.
+DEFAULT_DIRECTORY = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.join("~", ".cache")),
+    "seis_prov_validate")
+
+
+def _schema_hash():
+    """
+    Hash of all schemas used for the validation.
+    """
+    h = hashlib.sha256()
+    for filename in sorted(os.listdir(_SCHEMA_DIR)):
+        h.update(filename.encode("utf-8"))
+        with io.open(os.path.join(_SCHEMA_DIR, filename), "rb") as fh:
+            h.update(fh.read())
+    return h.hexdigest()
+
+
+def file_hash(file_or_object):
+    """
+    SHA-256 hash of the contents of a file.
+
+    :param file_or_object: The filename or an open file-like object. The
+        position of file-like objects is restored afterwards.
+    """
+    h = hashlib.sha256()
+    if isinstance(file_or_object, six.string_types):
+        with io.open(file_or_object, "rb") as fh:
+            for chunk in iter(lambda: fh.read(_HASH_CHUNK_SIZE), b""):
+                h.update(chunk)
+    else:
+        position = file_or_object.tell()
+        for chunk in iter(lambda: file_or_object.read(_HASH_CHUNK_SIZE),
+                          b""):
+            h.update(chunk)
+        file_or_object.seek(position, 0)
+    return h.hexdigest()
+
+
+class ResultCache(object):
+    """
+    Cache of validation results stored in an SQLite database.
+
+    The least recently used results are removed once all results together
+    exceed the maximum size. A cache can be shared by multiple threads and
+    processes.
+
+    :param directory: The directory of the cache. Created if necessary.
+    :param max_size: The maximum size of all cached results in bytes.
+    """
+    def __init__(self, directory=DEFAULT_DIRECTORY, max_size=DEFAULT_MAX_SIZE):
+        self.directory = os.path.abspath(os.path.expanduser(directory))
+        self.max_size = max_size
+        self.schema_hash = _schema_hash()
+        self._local = threading.local()
+
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        with self._connection as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS results ("
+                         "key TEXT PRIMARY KEY, value TEXT, size INTEGER, "
+                         "accessed REAL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS results_accessed "
+                         "ON results (accessed)")
+
+    def __getstate__(self):
+        # Connections cannot be pickled, each process opens its own.
+        state = self.__dict__.copy()
+        del state["_local"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    @property
+    def filename(self):
+        return os.path.join(self.directory, "results.sqlite")
+
+    @property
+    def _connection(self):
+        """
+        The connection of the current thread and process.
+        """
+        pid = os.getpid()
+        if getattr(self._local, "pid", None) != pid:
+            import sqlite3
+            conn = sqlite3.connect(self.filename, timeout=60)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = conn
+            self._local.pid = pid
+        return self._local.connection
+
+    def key(self, file_or_object, **options):
+        """
+        The key of the result for a file validated with the given options.
+
+        :param file_or_object: The filename or an open file-like object.
+        """
+        h = hashlib.sha256()
+        h.update(self.schema_hash.encode("ascii"))
+        h.update(file_hash(file_or_object).encode("ascii"))
+        h.update(json.dumps(options, sort_keys=True).encode("utf-8"))
+        return h.hexdigest()
+
+    def get(self, key):
+        """
+        Returns the cached ``(errors, warnings)`` tuple for the given key or
+        ``None``.
+        """
+        with self._connection as conn:
+            row = conn.execute("SELECT value FROM results WHERE key = ?",
+                               (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE results SET accessed = ? WHERE key = ?",
+                         (time.time(), key))
+        value = json.loads(row[0])
+        return value["errors"], value["warnings"]
+
+    def put(self, key, errors, warnings):
+        """
+        Store a result and remove the least recently used ones if the cache
+        grew too large.
+        """
+        value = json.dumps({"errors": errors, "warnings": warnings})
+        size = len(value.encode("utf-8"))
+        with self._connection as conn:
+            conn.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                         (key, value, size, time.time()))
+            total = conn.execute(
+                "SELECT SUM(size) FROM results").fetchone()[0] or 0
+            if total <= self.max_size:
+                return
+            remove = []
+            for old_key, old_size in conn.execute(
+                    "SELECT key, size FROM results ORDER BY accessed"):
+                remove.append((old_key,))
+                total -= old_size
+                if total <= self.max_size:
+                    break
+            conn.executemany("DELETE FROM results WHERE key = ?", remove)
+
+    def __len__(self):
+        return self._connection.execute(
+            "SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def clear(self):
+        """
+        Remove all cached results.
+        """
+        with self._connection as conn:
+            conn.execute("DELETE FROM results")
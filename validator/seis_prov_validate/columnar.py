@@ -0,0 +1,321 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Export SEIS-PROV records to columnar tables.
+
+Every SEIS-PROV type becomes one table with a column for each of its
+attributes in the definitions so large numbers of records can be analyzed
+with vectorized operations. The columns are NumPy masked arrays with the
+dtype of the attribute type, missing values are masked. The tables can be
+converted to Arrow tables with dictionary encoded strings and written as
+Parquet files which requires ``pyarrow``.
+
+Documents are not validated. All records with a known SEIS-PROV type are
+exported, values that do not fit the type of their column are missing.
+
+:copyright:
+    Lion Krischer (lion.krischer@googlemail.com), 2015
+:license:
+    BSD 3-Clause ("BSD New" or "BSD Simplified")
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import collections
+import datetime
+import os
+
+import numpy as np
+import prov.model
+import six
+
+from . import native
+from .validator import _check_json_schema
+
+# NumPy dtypes of the attribute types. Attributes allowing more than one
+# type get a float column if all of them are numbers and an object column
+# otherwise.
+DTYPES = {
+    "xsd:string": "object",
+    "xsd:anyURI": "object",
+    "xsd:double": "float64",
+    "xsd:decimal": "float64",
+    "xsd:integer": "int64",
+    "xsd:positiveInteger": "int64",
+    "xsd:dateTime": "datetime64[us]"}
+
+# The columns every table starts with and their types. ``document`` is the
+# position of the document in the exported sequence, ``bundle`` the URI of
+# the bundle or missing for the root document, and ``id`` the local part of
+# the SEIS-PROV id.
+BASE_COLUMNS = (("document", ("xsd:integer",)),
+                ("bundle", ("xsd:anyURI",)),
+                ("id", ("xsd:string",)),
+                ("label", ("xsd:string",)))
+
+# The keys of the record types in the JSON schema.
+_SCHEMA_KEYS = (("entity", "entities"), ("activity", "activities"),
+                ("agent", "agents"))
+
+
+def _column_dtype(types):
+    dtypes = set(DTYPES[_i] for _i in types)
+    if len(dtypes) == 1:
+        return dtypes.pop()
+    if dtypes.issubset(("float64", "int64")):
+        return "float64"
+    return "object"
+
+
+def _to_float(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, six.integer_types + (float,)):
+        return float(value)
+    if isinstance(value, prov.model.Literal):
+        try:
+            return float(value.value)
+        except ValueError:
+            return None
+    return None
+
+
+def _to_int(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, six.integer_types):
+        return int(value)
+    if isinstance(value, prov.model.Literal):
+        try:
+            return int(value.value)
+        except ValueError:
+            return None
+    return None
+
+
+def _to_datetime(value):
+    if not isinstance(value, datetime.datetime):
+        return None
+    # Times with a timezone are stored as UTC.
+    if value.utcoffset() is not None:
+        value = (value - value.utcoffset()).replace(tzinfo=None)
+    return value
+
+
+def _to_string(value):
+    if isinstance(value, six.string_types):
+        return value
+    if isinstance(value, prov.model.Literal):
+        return value.value
+    if isinstance(value, (prov.model.Identifier, native.QName)):
+        return value.uri
+    return None
+
+
+_CONVERTERS = {
+    "object": _to_string,
+    "float64": _to_float,
+    "int64": _to_int,
+    "datetime64[us]": _to_datetime}
+
+# Values of missing entries in the data of the masked arrays.
+_FILL_VALUES = {
+    "object": None,
+    "float64": np.nan,
+    "int64": 0,
+    "datetime64[us]": None}
+
+
+class ColumnarTable(object):
+    """
+    All records of a single SEIS-PROV type.
+
+    :ivar name: The name of the SEIS-PROV type, e.g. ``"waveform_trace"``.
+    :ivar columns: Ordered dictionary of the columns. Each column is a
+        :class:`numpy.ma.MaskedArray` with missing values masked.
+    :ivar types: Ordered dictionary of the attribute types of each column.
+    """
+    def __init__(self, name, columns, types):
+        self.name = name
+        self.columns = columns
+        self.types = types
+
+    def __len__(self):
+        return len(self.columns["id"])
+
+    def __repr__(self):
+        return "<ColumnarTable: %s, %i records>" % (self.name, len(self))
+
+    def to_arrow(self):
+        """
+        Convert to a :class:`pyarrow.Table`. Strings are dictionary encoded
+        and missing values are nulls. Requires ``pyarrow``.
+        """
+        import pyarrow as pa
+
+        arrays = []
+        for column in self.columns.values():
+            mask = np.ma.getmaskarray(column)
+            if column.dtype == object:
+                arrays.append(pa.array(
+                    column.data, type=pa.string(),
+                    mask=mask).dictionary_encode())
+            else:
+                arrays.append(pa.array(column.data, mask=mask))
+        return pa.Table.from_arrays(arrays, names=list(self.columns.keys()))
+
+
+class TableBuilder(object):
+    """
+    Collects the SEIS-PROV records of any number of documents, one after
+    the other, into one table per SEIS-PROV type.
+    """
+    def __init__(self):
+        schema = _check_json_schema(check=False)
+        # Maps each record type to its SEIS-PROV types and the SEIS-PROV
+        # types to their columns.
+        self._types = {}
+        self._columns = {}
+        self._dtypes = {}
+        for record_type, key in _SCHEMA_KEYS:
+            self._types[record_type] = frozenset(schema[key].keys())
+            for name, definition in schema[key].items():
+                columns = collections.OrderedDict(BASE_COLUMNS)
+                for attribute in definition["attributes"]:
+                    columns[attribute["name"]] = tuple(attribute["types"])
+                self._columns[name] = columns
+                self._dtypes[name] = dict(
+                    (_k, _column_dtype(_v)) for _k, _v in columns.items())
+        self._values = {}
+        # Repeated strings share a single object.
+        self._strings = {}
+        self.documents = 0
+
+    def _add_record(self, record, name, document, bundle):
+        columns = self._columns[name]
+        dtypes = self._dtypes[name]
+        values = self._values.get(name)
+        if values is None:
+            values = self._values[name] = collections.OrderedDict(
+                (_i, []) for _i in columns)
+        row = {"document": document, "bundle": bundle,
+               "id": record.identifier.localpart,
+               "label": record.labels[0] if record.labels else None}
+        for key, value in record.attributes:
+            if key in dtypes and key not in row:
+                row[key] = value
+        for key, value in row.items():
+            value = _CONVERTERS[dtypes[key]](value)
+            if isinstance(value, six.string_types):
+                value = self._strings.setdefault(value, value)
+            row[key] = value
+        for key, column in values.items():
+            column.append(row.get(key))
+
+    def add(self, source):
+        """
+        Add all SEIS-PROV records of a document.
+
+        :param source: The document. See
+            :func:`~seis_prov_validate.native.read_document`.
+        """
+        doc = native.read_document(source)
+        document = self.documents
+        self.documents += 1
+
+        prefix = doc.seis_prov_prefix
+        for bundle, records in [(None, doc.records)] + doc.bundles:
+            if bundle is not None:
+                bundle = bundle.uri
+            for record in records:
+                name = native.seis_prov_type(record, prefix)
+                if name is not None and \
+                        name in self._types[record.record_type]:
+                    self._add_record(record, name, document, bundle)
+
+    def tables(self):
+        """
+        Ordered dictionary of the :class:`ColumnarTable` objects of all
+        SEIS-PROV types with at least one record, sorted by their names.
+        """
+        tables = collections.OrderedDict()
+        for name in sorted(self._values):
+            columns = collections.OrderedDict()
+            for key, values in self._values[name].items():
+                dtype = self._dtypes[name][key]
+                mask = np.array([_i is None for _i in values], dtype=bool)
+                fill = _FILL_VALUES[dtype]
+                if dtype == "object":
+                    data = np.empty(len(values), dtype=object)
+                    data[:] = values
+                else:
+                    data = np.array(
+                        [fill if _i is None else _i for _i in values],
+                        dtype=dtype)
+                columns[key] = np.ma.masked_array(data, mask=mask)
+            tables[name] = ColumnarTable(
+                name, columns, collections.OrderedDict(self._columns[name]))
+        return tables
+
+
+def to_tables(sources):
+    """
+    Export the SEIS-PROV records of one or more documents to one
+    :class:`ColumnarTable` per SEIS-PROV type.
+
+    :param sources: A single document or an iterable of documents. See
+        :meth:`TableBuilder.add` for the accepted types.
+    """
+    if isinstance(sources, six.string_types) or hasattr(sources, "read") or \
+            isinstance(sources, (prov.model.ProvDocument,
+                                 native.NativeDocument)):
+        sources = [sources]
+    builder = TableBuilder()
+    for source in sources:
+        builder.add(source)
+    return builder.tables()
+
+
+def write_parquet(tables, directory):
+    """
+    Write each table to a Parquet file named after its SEIS-PROV type.
+    Returns the filenames. Requires ``pyarrow``.
+
+    :param tables: Dictionary of :class:`ColumnarTable` objects as returned
+        by :func:`to_tables`.
+    :param directory: The output directory. Created if it does not exist.
+    """
+    import pyarrow.parquet
+
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    filenames = []
+    for name, table in tables.items():
+        filename = os.path.join(directory, "%s.parquet" % name)
+        pyarrow.parquet.write_table(table.to_arrow(), filename)
+        filenames.append(filename)
+    return filenames
+
+
+def main(argv=None):
+    import argparse
+
+    from .batch import find_files
+
+    parser = argparse.ArgumentParser(
+        description="Export the records of SEIS-PROV documents to one "
+        "Parquet file per SEIS-PROV type.")
+    parser.add_argument("paths", nargs="+", help="Files, directories, or "
+                        "glob patterns of the documents.")
+    parser.add_argument("--output", required=True,
+                        help="The output directory.")
+    args = parser.parse_args(argv)
+
+    tables = to_tables(find_files(args.paths))
+    for filename, table in zip(write_parquet(tables, args.output),
+                               tables.values()):
+        print("Wrote %i records to '%s'." % (len(table), filename))
+
+
+if __name__ == "__main__":
+    main()
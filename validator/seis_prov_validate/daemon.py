@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Long running validation daemon and its client.
+
+The daemon keeps a :class:`~seis_prov_validate.validator.Validator` with all
+schemas compiled and answers validation requests over a Unix domain socket.
+Requests and responses are single lines of JSON:
+
+    {"filename": "/abs/path/file.xml", "options": {"streaming": false}}
+    {"errors": [], "warnings": []}
+
+The client does not import any of the heavy dependencies so a validation
+through the daemon only costs the startup of the Python interpreter.
+
+:copyright:
+    Lion Krischer (lion.krischer@googlemail.com), 2015
+:license:
+    BSD 3-Clause ("BSD New" or "BSD Simplified")
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import json
+import os
+import socket
+import tempfile
+import threading
+
+import six
+from six.moves import queue, socketserver
+
+from .validator import SeisProvValidationResult, Validator
+
+# Options clients can pass on to the validation.
+OPTIONS = ("xsd_roundtrip", "streaming", "all_errors", "max_errors",
+           "stats")
+
+DEFAULT_THREADS = 4
+
+
+def _default_socket():
+    directory = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    uid = os.getuid() if hasattr(os, "getuid") else 0
+    return os.path.join(directory, "seis_prov_validate-%i.sock" % uid)
+
+
+DEFAULT_SOCKET = _default_socket()
+
+
+class DaemonNotRunning(Exception):
+    pass
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """
+    Handles all requests of a single connection.
+    """
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line.decode("utf-8"))
+            except ValueError:
+                request = None
+            if not isinstance(request, dict):
+                self._respond({"errors": ["Invalid request."],
+                               "warnings": []})
+                continue
+
+            if request.get("command") == "shutdown":
+                self._respond({"errors": [], "warnings": []})
+                threading.Thread(target=self.server.shutdown).start()
+                return
+
+            options = request.get("options", {})
+            if not isinstance(request.get("filename"), six.string_types) or \
+                    not isinstance(options, dict):
+                self._respond({"errors": ["Invalid request."],
+                               "warnings": []})
+                continue
+            options = dict((key, value) for key, value in options.items()
+                           if key in OPTIONS)
+            result = self.server.validator.validate(request["filename"],
+                                                    **options)
+            self._respond({"errors": result.errors,
+                           "warnings": result.warnings,
+                           "stats": result.stats})
+
+    def _respond(self, response):
+        self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+        self.wfile.flush()
+
+
+class DaemonServer(socketserver.UnixStreamServer):
+    """
+    Validation daemon listening on a Unix domain socket.
+
+    Connections are handled by a fixed number of threads which all share one
+    validator. Each thread compiles the XSD schema once when it starts.
+
+    :param socket_path: The path of the socket.
+    :param validator: The validator to use. A new one if not given.
+    :param threads: The number of connections handled at the same time.
+    """
+    def __init__(self, socket_path=DEFAULT_SOCKET, validator=None,
+                 threads=DEFAULT_THREADS):
+        self.socket_path = os.path.abspath(socket_path)
+        self.validator = validator if validator is not None else Validator()
+        self.validator.plan
+
+        if os.path.exists(self.socket_path):
+            if ping(self.socket_path):
+                raise ValueError("A daemon is already listening on '%s'." %
+                                 self.socket_path)
+            # Left over from a daemon that did not shut down properly.
+            os.remove(self.socket_path)
+
+        # Only the current user can connect.
+        umask = os.umask(0o077)
+        try:
+            socketserver.UnixStreamServer.__init__(self, self.socket_path,
+                                                   _RequestHandler)
+        finally:
+            os.umask(umask)
+
+        self._requests = queue.Queue()
+        for _ in range(max(1, threads)):
+            thread = threading.Thread(target=self._worker)
+            thread.daemon = True
+            thread.start()
+
+    def process_request(self, request, client_address):
+        self._requests.put((request, client_address))
+
+    def _worker(self):
+        self.validator.xsd_schema
+        while True:
+            request, client_address = self._requests.get()
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    def server_close(self):
+        socketserver.UnixStreamServer.server_close(self)
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+
+def serve(socket_path=DEFAULT_SOCKET, threads=DEFAULT_THREADS, cache=None):
+    """
+    Run the daemon until it is interrupted or receives a shutdown request.
+
+    :param socket_path: The path of the socket.
+    :param threads: The number of connections handled at the same time.
+    :param cache: A :class:`~seis_prov_validate.cache.ResultCache` used for
+        all validations.
+    """
+    server = DaemonServer(socket_path, validator=Validator(cache=cache),
+                          threads=threads)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+class DaemonClient(object):
+    """
+    Client of the validation daemon. Keeps a single connection open for all
+    requests.
+
+    :param socket_path: The path of the daemon's socket.
+    """
+    def __init__(self, socket_path=DEFAULT_SOCKET):
+        self.socket_path = socket_path
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self._socket.connect(socket_path)
+        except socket.error:
+            self._socket.close()
+            raise DaemonNotRunning("No validation daemon is listening on "
+                                   "'%s'." % socket_path)
+        self._file = self._socket.makefile("rwb")
+
+    def _request(self, request):
+        self._file.write(json.dumps(request).encode("utf-8") + b"\n")
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            raise DaemonNotRunning("The validation daemon closed the "
+                                   "connection.")
+        return json.loads(line.decode("utf-8"))
+
+    def validate(self, filename, **options):
+        """
+        Validate a file with the daemon. Relative paths are resolved here as
+        the daemon might run in a different directory.
+
+        :param filename: The filename of the file to validate.
+        :param options: Passed on to
+            :meth:`~seis_prov_validate.validator.Validator.validate`.
+        """
+        response = self._request({"filename": os.path.abspath(filename),
+                                  "options": options})
+        return SeisProvValidationResult(errors=response["errors"],
+                                        warnings=response["warnings"],
+                                        stats=response.get("stats"))
+
+    def shutdown(self):
+        """
+        Stop the daemon.
+        """
+        self._request({"command": "shutdown"})
+
+    def close(self):
+        self._file.close()
+        self._socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def ping(socket_path=DEFAULT_SOCKET):
+    """
+    True if a daemon is listening on the socket.
+    """
+    try:
+        DaemonClient(socket_path).close()
+    except DaemonNotRunning:
+        return False
+    return True
@@ -0,0 +1,328 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Structural differences between two provenance documents.
+
+Diffing the serialized files reports every reordered attribute and changed
+namespace prefix. Instead, the content of each record is normalized: the
+values of the record itself and the references of the relations are
+compared independent of their order and of the prefixes. Elements are
+aligned by their ids and, for elements whose id changed, by their content.
+Relations are compared as edges between the aligned elements. Everything
+is done with dictionary lookups so the time is linear in the size of the
+documents.
+
+:copyright:
+    Lion Krischer (lion.krischer@googlemail.com), 2015
+:license:
+    BSD 3-Clause ("BSD New" or "BSD Simplified")
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import collections
+import datetime
+import sys
+
+import prov.model
+import six
+
+from . import native
+from .identifier_index import ELEMENT_TYPES, REFERENCE_ATTRIBUTES
+
+# A relation between elements. ``references`` is a sorted tuple of
+# ``(attribute, QName)`` tuples.
+Edge = collections.namedtuple("Edge", ["relation", "references"])
+
+
+def _canonical(value):
+    """
+    String representation of a value independent of the prefixes and the
+    serialization format.
+    """
+    if isinstance(value, (native.QName, prov.model.Identifier)):
+        return "uri:%s" % value.uri
+    if isinstance(value, prov.model.Literal):
+        return "literal:%s^^%s@%s" % (value.value, value.datatype,
+                                      value.langtag)
+    if isinstance(value, datetime.datetime):
+        return "datetime:%s" % value.isoformat()
+    return "%s:%s" % (type(value).__name__, value)
+
+
+class _Element(object):
+    """
+    An element of a document together with its normalized content.
+    """
+    __slots__ = ["record", "bundle", "key", "content"]
+
+    def __init__(self, record, bundle, key):
+        self.record = record
+        self.bundle = bundle
+        self.key = key
+        self.content = (
+            record.record_type,
+            bundle.uri if bundle is not None else None,
+            tuple(sorted(_canonical(_i) for _i in record.prov_types)),
+            tuple(sorted(_canonical(_i) for _i in record.labels)),
+            tuple(sorted((_i[0], _canonical(_i[1]))
+                         for _i in record.attributes)))
+
+
+def _read(source):
+    """
+    Normalized elements and edges of a document. Elements are keyed by the
+    URI of their id and, for ids that are used more than once, the number
+    of earlier uses.
+    """
+    doc = native.read_document(source)
+    elements = collections.OrderedDict()
+    edges = []
+    for bundle, records in [(None, doc.records)] + doc.bundles:
+        for record in records:
+            if record.record_type in ELEMENT_TYPES:
+                key = (record.identifier.uri, 0)
+                while key in elements:
+                    key = (key[0], key[1] + 1)
+                elements[key] = _Element(record, bundle, key)
+            elif record.record_type in REFERENCE_ATTRIBUTES:
+                edges.append(Edge(record.record_type,
+                                  tuple(sorted(record.references,
+                                               key=lambda x: x[0]))))
+    return elements, edges
+
+
+class RecordChange(object):
+    """
+    An element that exists in both documents but with a different content.
+
+    :ivar old: The :class:`~seis_prov_validate.native.NativeRecord` in the
+        old document.
+    :ivar new: The record in the new document.
+    :ivar changes: List of ``(name, old values, new values)`` tuples, one
+        for each part of the record that changed. ``name`` is
+        ``"record_type"``, ``"bundle"``, ``"prov:type"``, ``"prov:label"``,
+        or the name of a SEIS-PROV attribute. The values are tuples.
+    """
+    __slots__ = ["old", "new", "changes"]
+
+    def __init__(self, old, new):
+        self.old = old.record
+        self.new = new.record
+        self.changes = []
+        for i, name in enumerate(("record_type", "bundle", "prov:type",
+                                  "prov:label")):
+            if old.content[i] != new.content[i]:
+                self.changes.append((
+                    name, _values(old, name), _values(new, name)))
+
+        old_attributes = _attributes(old.record)
+        new_attributes = _attributes(new.record)
+        for name in sorted(set(old_attributes) | set(new_attributes)):
+            a = old_attributes.get(name, ())
+            b = new_attributes.get(name, ())
+            if sorted(_canonical(_i) for _i in a) != \
+                    sorted(_canonical(_i) for _i in b):
+                self.changes.append((name, a, b))
+
+    def __repr__(self):
+        return "<RecordChange: %s, %i changes>" % (self.new.identifier,
+                                                   len(self.changes))
+
+
+def _values(element, name):
+    if name == "record_type":
+        return (element.record.record_type,)
+    elif name == "bundle":
+        return (element.bundle,) if element.bundle is not None else ()
+    elif name == "prov:type":
+        return element.record.prov_types
+    return element.record.labels
+
+
+def _attributes(record):
+    attributes = collections.defaultdict(tuple)
+    for name, value in record.attributes:
+        attributes[name] += (value,)
+    return attributes
+
+
+class DocumentDiff(object):
+    """
+    The differences between two documents.
+
+    :ivar added: Records of the elements only in the new document.
+    :ivar removed: Records of the elements only in the old document.
+    :ivar renamed: List of ``(old record, new record)`` tuples of elements
+        with the same content but different ids.
+    :ivar changed: List of :class:`RecordChange` objects.
+    :ivar added_edges: :class:`Edge` tuples of the relations only in the
+        new document.
+    :ivar removed_edges: :class:`Edge` tuples of the relations only in the
+        old document. References to renamed elements use their new ids.
+    """
+    def __init__(self, added, removed, renamed, changed, added_edges,
+                 removed_edges):
+        self.added = added
+        self.removed = removed
+        self.renamed = renamed
+        self.changed = changed
+        self.added_edges = added_edges
+        self.removed_edges = removed_edges
+
+    @property
+    def is_identical(self):
+        return not (self.added or self.removed or self.renamed or
+                    self.changed or self.added_edges or self.removed_edges)
+
+    def __repr__(self):
+        return ("<DocumentDiff: %i added, %i removed, %i renamed, %i "
+                "changed, %i added edges, %i removed edges>" % (
+                    len(self.added), len(self.removed), len(self.renamed),
+                    len(self.changed), len(self.added_edges),
+                    len(self.removed_edges)))
+
+    def format(self):
+        """
+        Human readable lines describing all differences.
+        """
+        lines = []
+        for record in self.removed:
+            lines.append("- %s %s" % (record.record_type, record.identifier))
+        for record in self.added:
+            lines.append("+ %s %s" % (record.record_type, record.identifier))
+        for old, new in self.renamed:
+            lines.append("> %s %s renamed to %s" % (
+                new.record_type, old.identifier, new.identifier))
+        for change in self.changed:
+            lines.append("~ %s %s" % (change.new.record_type,
+                                      change.new.identifier))
+            for name, old, new in change.changes:
+                lines.append("    %s: %s -> %s" % (
+                    name, _format_values(old), _format_values(new)))
+        for sign, edges in (("-", self.removed_edges),
+                            ("+", self.added_edges)):
+            for edge in edges:
+                lines.append("%s %s(%s)" % (sign, edge.relation, ", ".join(
+                    "%s=%s" % _i for _i in edge.references)))
+        return lines
+
+
+def _format_values(values):
+    if not values:
+        return "(none)"
+    return ", ".join("'%s'" % _i if isinstance(_i, six.string_types) else
+                     six.text_type(_i) for _i in values)
+
+
+def diff(old, new, detect_renames=True):
+    """
+    Compare two documents. Returns a :class:`DocumentDiff`.
+
+    Elements are aligned by their ids. Elements only in one of the documents
+    that have the same content are then aligned as renamed, in the order
+    they appear in the documents. Only relations with references to other
+    elements are compared, see
+    :data:`~seis_prov_validate.identifier_index.REFERENCE_ATTRIBUTES`.
+
+    :param old: The old document. See
+        :func:`~seis_prov_validate.native.read_document` for the accepted
+        types.
+    :param new: The new document.
+    :param detect_renames: Align elements with different ids by their
+        content.
+    """
+    old_elements, old_edges = _read(old)
+    new_elements, new_edges = _read(new)
+
+    changed = []
+    added = []
+    for key, element in new_elements.items():
+        other = old_elements.get(key)
+        if other is None:
+            added.append(element)
+        elif other.content != element.content:
+            changed.append(RecordChange(other, element))
+    removed = [_v for _k, _v in old_elements.items()
+               if _k not in new_elements]
+
+    renamed = []
+    matched = set()
+    mapping = {}
+    if detect_renames and added and removed:
+        candidates = collections.defaultdict(collections.deque)
+        for element in removed:
+            candidates[element.content].append(element)
+        remaining = []
+        for element in added:
+            matches = candidates.get(element.content)
+            if matches:
+                other = matches.popleft()
+                renamed.append((other.record, element.record))
+                matched.add(other.key)
+                mapping[other.record.identifier] = element.record.identifier
+            else:
+                remaining.append(element)
+        added = remaining
+        removed = [_i for _i in removed if _i.key not in matched]
+
+    # Edges are compared as multisets with the references to renamed
+    # elements changed to their new ids.
+    if mapping:
+        old_edges = [Edge(_i.relation, tuple(
+            (_a, mapping.get(_r, _r)) for _a, _r in _i.references))
+            for _i in old_edges]
+    removed_edges = _surplus(old_edges, new_edges)
+    added_edges = _surplus(new_edges, old_edges)
+
+    return DocumentDiff(
+        added=[_i.record for _i in added],
+        removed=[_i.record for _i in removed],
+        renamed=renamed, changed=changed, added_edges=added_edges,
+        removed_edges=removed_edges)
+
+
+def _surplus(edges, others):
+    """
+    The edges that are more often part of ``edges`` than of ``others`` in
+    the order of ``edges``.
+    """
+    counts = collections.Counter(edges)
+    counts.subtract(others)
+    surplus = []
+    for edge in edges:
+        if counts[edge] > 0:
+            counts[edge] -= 1
+            surplus.append(edge)
+    return surplus
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Show the structural differences between two "
+        "provenance documents. Exits with 1 if they differ.")
+    parser.add_argument("old", help="The old document.")
+    parser.add_argument("new", help="The new document.")
+    parser.add_argument("--no-renames", action="store_true",
+                        help="Do not align elements with different ids by "
+                        "their content.")
+    args = parser.parse_args(argv)
+
+    result = diff(args.old, args.new, detect_renames=not args.no_renames)
+    if result.is_identical:
+        print("The documents are identical.")
+        sys.exit(0)
+    for line in result.format():
+        print(line)
+    print("\n%i added, %i removed, %i renamed, %i changed, %i added edges, "
+          "%i removed edges." % (
+              len(result.added), len(result.removed), len(result.renamed),
+              len(result.changed), len(result.added_edges),
+              len(result.removed_edges)))
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
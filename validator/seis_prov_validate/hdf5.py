@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Validate the SEIS-PROV documents embedded in HDF5 files.
+
+ASDF files store each provenance document as a one-dimensional byte dataset
+in the ``Provenance`` group. All of them can be validated at once without
+extracting them first. Requires ``h5py``.
+
+:copyright:
+    Lion Krischer (lion.krischer@googlemail.com), 2015
+:license:
+    BSD 3-Clause ("BSD New" or "BSD Simplified")
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import collections
+import io
+
+from .batch import _init_worker
+from .validator import SeisProvValidationResult, _get_validator
+
+# Extensions of files that are picked up when searching directories.
+EXTENSIONS = (".h5", ".hdf5", ".asdf")
+
+# The group of the provenance documents in ASDF files.
+PROVENANCE_GROUP = "Provenance"
+
+
+def list_documents(filename, group=PROVENANCE_GROUP):
+    """
+    Sorted names of all datasets in the provenance group of an HDF5 file.
+    Files without the group have no documents.
+
+    :param filename: The HDF5 file.
+    :param group: The group containing the documents.
+    """
+    import h5py
+
+    with h5py.File(filename, "r") as f:
+        if group not in f:
+            return []
+        return sorted(f[group].keys())
+
+
+def iter_documents(filename, names=None, group=PROVENANCE_GROUP):
+    """
+    Generator yielding ``(name, data)`` tuples for the documents in an HDF5
+    file.
+
+    The datasets are directly read into a single buffer that is reused for
+    all documents. ``data`` is a memoryview of that buffer so it must be
+    used or copied before the next document is requested. It is ``None`` for
+    datasets that cannot be a serialized document.
+
+    :param filename: The HDF5 file.
+    :param names: The names of the datasets to read. Defaults to all
+        datasets in the group.
+    :param group: The group containing the documents.
+    """
+    import h5py
+    import numpy as np
+
+    with h5py.File(filename, "r") as f:
+        if group not in f:
+            return
+        datasets = f[group]
+        if names is None:
+            names = sorted(datasets.keys())
+
+        buf = np.empty(0, dtype=np.uint8)
+        for name in names:
+            dataset = datasets[name]
+            if not isinstance(dataset, h5py.Dataset) or \
+                    len(dataset.shape) != 1 or dataset.dtype.itemsize != 1:
+                yield name, None
+                continue
+            size = dataset.shape[0]
+            if size > len(buf):
+                buf = np.empty(max(size, 2 * len(buf)), dtype=np.uint8)
+            if size:
+                # Read into a view with the type of the dataset so HDF5 does
+                # not convert signed bytes.
+                dataset.read_direct(buf.view(dataset.dtype),
+                                    dest_sel=np.s_[:size])
+            yield name, memoryview(buf)[:size]
+
+
+def _validate_documents(args):
+    filename, names, group, kwargs = args
+    validator = _get_validator()
+    results = []
+    for name, data in iter_documents(filename, names=names, group=group):
+        if data is None:
+            result = SeisProvValidationResult(
+                errors=["Dataset '%s' is not a one-dimensional array of "
+                        "bytes and thus cannot be a serialized SEIS-PROV "
+                        "document." % name], warnings=[])
+        else:
+            result = validator.validate(io.BytesIO(data), **kwargs)
+        results.append((name, result))
+    return results
+
+
+def validate_datasets(filename, jobs=1, group=PROVENANCE_GROUP, **kwargs):
+    """
+    Validate all documents in an HDF5 file. Generator yielding
+    ``(name, result)`` tuples in the order in which the validations finish.
+
+    :param filename: The HDF5 file.
+    :param jobs: The number of processes to use. If 1, everything runs in the
+        current process, if 0 or ``None`` all available cores are used. Each
+        process opens the file itself and validates chunks of documents.
+    :param group: The group containing the documents.
+
+    All further keyword arguments are passed on to
+    :func:`~seis_prov_validate.validator.validate`.
+    """
+    import multiprocessing
+
+    names = list_documents(filename, group=group)
+    if not jobs:
+        jobs = multiprocessing.cpu_count()
+    jobs = min(jobs, len(names))
+
+    if jobs <= 1:
+        for item in _validate_documents((filename, names, group, kwargs)):
+            yield item
+        return
+
+    # Same chunking as for many files but each chunk is read by the worker
+    # so only the names and results are sent between the processes.
+    chunksize = max(1, min(64, len(names) // (jobs * 4)))
+    chunks = [(filename, names[_i:_i + chunksize], group, kwargs)
+              for _i in range(0, len(names), chunksize)]
+
+    pool = multiprocessing.Pool(processes=jobs, initializer=_init_worker)
+    try:
+        for results in pool.imap_unordered(_validate_documents, chunks):
+            for item in results:
+                yield item
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+
+class HDF5ValidationResult(object):
+    """
+    The results of all documents in an HDF5 file.
+
+    :param filename: The HDF5 file.
+    :param results: Ordered dictionary of the
+        :class:`~seis_prov_validate.validator.SeisProvValidationResult` of
+        each document keyed by the dataset name.
+    """
+    def __init__(self, filename, results):
+        self.filename = filename
+        self.results = results
+
+    @property
+    def invalid(self):
+        """
+        Names of all invalid documents.
+        """
+        return [_k for _k, _v in self.results.items() if not _v.is_valid]
+
+    @property
+    def is_valid(self):
+        return not self.invalid
+
+    def __str__(self):
+        invalid_count = len(self.invalid)
+        return "%s: %i documents, %i valid, %i invalid." % (
+            self.filename, len(self.results),
+            len(self.results) - invalid_count, invalid_count)
+
+
+def validate_hdf5(filename, jobs=1, group=PROVENANCE_GROUP, **kwargs):
+    """
+    Validate all documents in an HDF5 file, e.g. an ASDF file.
+
+    :param filename: The HDF5 file.
+    :param jobs: The number of processes to use. If 1, everything runs in the
+        current process, if 0 or ``None`` all available cores are used.
+    :param group: The group containing the documents.
+
+    All further keyword arguments are passed on to
+    :func:`~seis_prov_validate.validator.validate`. Returns a
+    :class:`HDF5ValidationResult`.
+    """
+    results = dict(validate_datasets(filename, jobs=jobs, group=group,
+                                     **kwargs))
+    return HDF5ValidationResult(filename, collections.OrderedDict(
+        (_i, results[_i]) for _i in sorted(results)))
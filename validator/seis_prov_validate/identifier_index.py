@@ -0,0 +1,332 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Index of all identifiers defined and referenced in a provenance document.
+
+:copyright:
+    Lion Krischer (lion.krischer@googlemail.com), 2015
+:license:
+    BSD 3-Clause ("BSD New" or "BSD Simplified")
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import collections
+
+import prov.constants
+import prov.model
+
+
+# The attributes of each relation pointing to other records that are checked
+# for dangling references. Attribute and relation names are the ones used in
+# PROV-JSON which are also the tag names in PROV-XML.
+REFERENCE_ATTRIBUTES = {
+    "used": ("prov:activity", "prov:entity"),
+    "wasGeneratedBy": ("prov:entity", "prov:activity"),
+    "wasAssociatedWith": ("prov:activity", "prov:agent", "prov:plan"),
+    "wasDerivedFrom": ("prov:generatedEntity", "prov:usedEntity",
+                       "prov:activity"),
+    "wasAttributedTo": ("prov:entity", "prov:agent"),
+    "actedOnBehalfOf": ("prov:delegate", "prov:responsible",
+                        "prov:activity"),
+    "wasInformedBy": ("prov:informed", "prov:informant")
+}
+
+ELEMENT_TYPES = ("entity", "activity", "agent")
+
+
+def record_entry(record):
+    """
+    Everything the index needs to know about a prov record.
+
+    Returns ``("definition", (namespace_uri, localpart, record_type))`` for
+    elements, ``("relation", (relation_type, references))`` for relations,
+    and ``None`` for all other records.
+
+    :param record: The prov record.
+    """
+    rec_type = prov.constants.PROV_N_MAP[record.get_type()]
+    if rec_type in ELEMENT_TYPES:
+        return "definition", (record.identifier.namespace.uri,
+                              record.identifier.localpart, rec_type)
+    elif rec_type in REFERENCE_ATTRIBUTES:
+        references = []
+        for attr, value in record.formal_attributes:
+            if not isinstance(value, prov.model.QualifiedName):
+                continue
+            attr = str(attr)
+            if attr not in REFERENCE_ATTRIBUTES[rec_type]:
+                continue
+            references.append(
+                (attr, (value.namespace.uri, value.localpart)))
+        return "relation", (rec_type, tuple(references))
+    return None
+
+
+class IdentifierIndex(object):
+    """
+    Index of the identifiers of all elements and of all references between
+    them in a document and all its bundles.
+
+    Identifiers are stored as ``(namespace_uri, localpart)`` tuples so
+    indices can be built from prov documents as well as directly from
+    parsed files. Adding definitions and relations is O(1) so the whole
+    index is built in a single linear pass.
+    """
+    def __init__(self):
+        # Maps each identifier to a list of (record type, bundle) tuples.
+        self._definitions = collections.defaultdict(list)
+        # List of (relation type, bundle, ((attribute, identifier), ...)).
+        self._relations = []
+        # Prefixes of all namespaces to create human readable names.
+        self._prefixes = {}
+
+    @classmethod
+    def from_document(cls, doc):
+        """
+        Build the index from a prov document and all its bundles.
+
+        :param doc: The :class:`prov.model.ProvDocument` to index.
+        """
+        index = cls()
+        index.add_bundle(doc)
+        for bundle in doc.bundles:
+            index.add_definition(bundle.identifier.namespace.uri,
+                                 bundle.identifier.localpart, "bundle")
+            index.add_bundle(bundle, bundle=bundle.identifier.uri)
+        return index
+
+    def add_bundle(self, doc, bundle=None):
+        """
+        Add all records of a single prov document or bundle to the index.
+
+        :param doc: The prov document or bundle.
+        :param bundle: The identifier of the bundle. ``None`` for the root
+            document.
+        """
+        for ns in doc.namespaces:
+            self.add_namespace(ns.prefix, ns.uri)
+        for record in doc._records:
+            self.add_record(record, bundle=bundle)
+
+    def add_record(self, record, bundle=None):
+        """
+        Add a single prov record to the index.
+
+        :param record: The prov record.
+        :param bundle: The identifier of the bundle. ``None`` for the root
+            document.
+        """
+        self.add_entry(record_entry(record), bundle=bundle)
+
+    def add_entry(self, entry, bundle=None):
+        """
+        Add what :func:`record_entry` extracted from a record to the index.
+
+        :param entry: The entry of the record.
+        :param bundle: The identifier of the bundle. ``None`` for the root
+            document.
+        """
+        if entry is None:
+            return
+        kind, args = entry
+        if kind == "definition":
+            self.add_definition(*args, bundle=bundle)
+        else:
+            self.add_relation(*args, bundle=bundle)
+
+    def add_namespace(self, prefix, uri):
+        """
+        Register the prefix of a namespace. Only used to create human
+        readable names.
+
+        :param prefix: The prefix of the namespace.
+        :param uri: The URI of the namespace.
+        """
+        self._prefixes.setdefault(uri, prefix)
+
+    def add_definition(self, namespace, localpart, record_type, bundle=None):
+        """
+        Register the definition of an identifier.
+
+        :param namespace: The namespace URI of the identifier.
+        :param localpart: The local part of the identifier.
+        :param record_type: The type of the record, e.g. ``"entity"``.
+        :param bundle: The bundle the record is defined in. ``None`` for the
+            root document.
+        """
+        self._definitions[(namespace, localpart)].append(
+            (record_type, bundle))
+
+    def add_relation(self, relation_type, references, bundle=None):
+        """
+        Register a relation between records.
+
+        :param relation_type: The type of the relation, e.g. ``"used"``.
+        :param references: Sequence of ``(attribute, identifier)`` tuples
+            where each identifier is a ``(namespace_uri, localpart)`` tuple.
+        :param bundle: The bundle the relation is defined in. ``None`` for
+            the root document.
+        """
+        self._relations.append((relation_type, bundle, tuple(references)))
+
+    def __len__(self):
+        return len(self._definitions)
+
+    def __contains__(self, identifier):
+        return identifier in self._definitions
+
+    def definitions(self, identifier):
+        """
+        Returns a list of ``(record_type, bundle)`` tuples, one for each
+        definition of the given identifier.
+        """
+        return list(self._definitions.get(identifier, []))
+
+    @property
+    def relations(self):
+        """
+        List of all ``(relation_type, bundle, references)`` tuples.
+        """
+        return list(self._relations)
+
+    def get_name(self, identifier):
+        """
+        Human readable name of an identifier. Uses the prefix of its
+        namespace if known, otherwise the full URI.
+        """
+        namespace, localpart = identifier
+        if namespace in self._prefixes:
+            return "%s:%s" % (self._prefixes[namespace], localpart)
+        return namespace + localpart
+
+    def duplicates(self, namespace=None):
+        """
+        Returns a sorted list of all identifiers of elements that are defined
+        more than once, across all bundles.
+
+        :param namespace: Only consider identifiers in this namespace.
+        """
+        return sorted(
+            key for key, value in self._definitions.items()
+            if (namespace is None or key[0] == namespace) and
+            sum(1 for _i in value if _i[0] in ELEMENT_TYPES) > 1)
+
+    def dangling_references(self, namespace=None):
+        """
+        Returns a list of ``(relation_type, attribute, identifier)`` tuples
+        for all references to identifiers that are not defined anywhere in
+        the document.
+
+        :param namespace: Only consider identifiers in this namespace.
+        """
+        dangling = []
+        for relation_type, _, references in self._relations:
+            for attr, key in references:
+                if namespace is not None and key[0] != namespace:
+                    continue
+                if key not in self._definitions:
+                    dangling.append((relation_type, attr, key))
+        return dangling
+
+
+class IncrementalIdentifierIndex(IdentifierIndex):
+    """
+    Identifier index that also supports removing records.
+
+    Duplicates and dangling references are kept up to date with every change
+    so querying them only costs as much as the problems found, not a pass
+    over the whole index. Used to repeatedly validate documents that only
+    changed a little.
+    """
+    def __init__(self):
+        IdentifierIndex.__init__(self)
+        # Counts of each (relation type, bundle, references) tuple.
+        self._relations = collections.Counter()
+        # Maps each referenced identifier to the counts of the
+        # (relation type, attribute) tuples referencing it.
+        self._references = collections.defaultdict(collections.Counter)
+        self._duplicates = set()
+        self._dangling = set()
+
+    def _update(self, identifier):
+        definitions = self._definitions.get(identifier)
+        if sum(1 for _i in definitions or () if _i[0] in ELEMENT_TYPES) > 1:
+            self._duplicates.add(identifier)
+        else:
+            self._duplicates.discard(identifier)
+        if not definitions and self._references.get(identifier):
+            self._dangling.add(identifier)
+        else:
+            self._dangling.discard(identifier)
+
+    def add_definition(self, namespace, localpart, record_type, bundle=None):
+        IdentifierIndex.add_definition(self, namespace, localpart,
+                                       record_type, bundle=bundle)
+        self._update((namespace, localpart))
+
+    def remove_definition(self, namespace, localpart, record_type,
+                          bundle=None):
+        """
+        Remove a definition added with :meth:`add_definition`.
+        """
+        identifier = (namespace, localpart)
+        definitions = self._definitions[identifier]
+        definitions.remove((record_type, bundle))
+        if not definitions:
+            del self._definitions[identifier]
+        self._update(identifier)
+
+    def add_relation(self, relation_type, references, bundle=None):
+        references = tuple(references)
+        self._relations[(relation_type, bundle, references)] += 1
+        for attr, identifier in references:
+            self._references[identifier][(relation_type, attr)] += 1
+            self._update(identifier)
+
+    def remove_relation(self, relation_type, references, bundle=None):
+        """
+        Remove a relation added with :meth:`add_relation`.
+        """
+        references = tuple(references)
+        key = (relation_type, bundle, references)
+        self._relations[key] -= 1
+        if not self._relations[key]:
+            del self._relations[key]
+        for attr, identifier in references:
+            counts = self._references[identifier]
+            counts[(relation_type, attr)] -= 1
+            if not counts[(relation_type, attr)]:
+                del counts[(relation_type, attr)]
+            if not counts:
+                del self._references[identifier]
+            self._update(identifier)
+
+    def remove_entry(self, entry, bundle=None):
+        """
+        Remove an entry added with :meth:`add_entry`.
+        """
+        if entry is None:
+            return
+        kind, args = entry
+        if kind == "definition":
+            self.remove_definition(*args, bundle=bundle)
+        else:
+            self.remove_relation(*args, bundle=bundle)
+
+    @property
+    def relations(self):
+        return list(self._relations.elements())
+
+    def duplicates(self, namespace=None):
+        return sorted(_i for _i in self._duplicates
+                      if namespace is None or _i[0] == namespace)
+
+    def dangling_references(self, namespace=None):
+        dangling = []
+        for key in sorted(self._dangling):
+            if namespace is not None and key[0] != namespace:
+                continue
+            for relation_type, attr in sorted(self._references[key]):
+                dangling.append((relation_type, attr, key))
+        return dangling
@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Mint SEIS-PROV ids in bulk without collisions.
+
+SEIS-PROV ids look like ``sp001_wf_f84fb9a``: the step in the processing
+chain, the two letter code of the type, and a random looking suffix of 7 to
+12 lowercase letters and digits. Random suffixes eventually collide once
+documents of parallel workers are merged. An :class:`IdentifierMinter`
+instead counts and scrambles the counter with a bijection derived from a
+seed so ids are deterministic and never repeat. Workers minting ids for the
+same document use the same seed and distinct worker numbers: each worker
+only uses every n-th counter value so their ids never collide either.
+
+Bulk minting requires ``numpy``.
+
+:copyright:
+    Lion Krischer (lion.krischer@googlemail.com), 2015
+:license:
+    BSD 3-Clause ("BSD New" or "BSD Simplified")
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import hashlib
+import math
+
+import six
+
+from .validator import _check_json_schema
+
+# The characters of the suffixes.
+DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+# Maps the names of all SEIS-PROV types to their two letter codes. Filled on
+# first use.
+_CODES = {}
+
+
+def two_letter_code(name):
+    """
+    The two letter code of a SEIS-PROV type, e.g. ``"wf"`` for
+    ``"waveform_trace"``.
+
+    :param name: The name of the SEIS-PROV type.
+    """
+    if not _CODES:
+        schema = _check_json_schema(check=False)
+        for key in ("entities", "activities", "agents"):
+            for type_name, definition in schema[key].items():
+                _CODES[type_name] = definition["two_letter_code"]
+    try:
+        return _CODES[name]
+    except KeyError:
+        raise ValueError("'%s' is not a SEIS-PROV type." % name)
+
+
+def _prefix(name, step):
+    if not 0 <= step <= 99999:
+        raise ValueError("The step must be between 0 and 99999.")
+    return "sp%03i_%s_" % (step, two_letter_code(name))
+
+
+def _encode(value, length):
+    """
+    Fixed length base 36 representation of a non-negative integer.
+    """
+    digits = []
+    for _ in range(length):
+        value, digit = divmod(value, 36)
+        digits.append(DIGITS[digit])
+    return "".join(reversed(digits))
+
+
+def _seed_integers(seed, count):
+    """
+    Integers below 2 ** 64 derived from a seed.
+    """
+    digest = hashlib.sha256(six.text_type(seed).encode("utf-8")).digest()
+    return [int(hashlib.sha256(digest + six.int2byte(i)).hexdigest()[:16],
+                16) for i in range(count)]
+
+
+class IdentifierMinter(object):
+    """
+    Mints unique SEIS-PROV ids.
+
+    The n-th id of a worker is computed from ``n * workers + worker`` with
+    a bijection on all numbers the suffix can represent. The ids of a
+    minter thus repeat neither within nor across types and steps, and
+    neither do the ids of minters with the same seed and number of workers
+    but different worker numbers. The same seed, worker, and start always
+    yield the same ids.
+
+    :param seed: Any integer or string. Determines the order of the ids.
+    :param worker: The number of this worker, ``0 <= worker < workers``.
+    :param workers: The total number of workers.
+    :param length: The length of the suffixes, between 7 and 12.
+    :param start: The counter of the first id.
+    """
+    def __init__(self, seed=0, worker=0, workers=1, length=12, start=0):
+        if not 7 <= length <= 12:
+            raise ValueError("The length must be between 7 and 12.")
+        if workers < 1 or not 0 <= worker < workers:
+            raise ValueError("The worker must be between 0 and %i." %
+                             (workers - 1))
+        self.seed = seed
+        self.worker = worker
+        self.workers = workers
+        self.length = length
+        self.count = start
+
+        # The largest power of two the suffixes can represent.
+        self._bits = int(math.floor(length * math.log(36, 2)))
+        self._mask = (1 << self._bits) - 1
+        self._shift = self._bits // 2
+        # Odd multipliers and an offset. The multiplications and xor shifts
+        # are bijections modulo 2 ** bits.
+        a, b, c = _seed_integers(seed, 3)
+        self._a = (a | 1) & self._mask
+        self._b = b & self._mask
+        self._c = (c | 1) & self._mask
+
+    @property
+    def capacity(self):
+        """
+        The number of ids this worker can mint in total.
+        """
+        return ((self._mask - self.worker) // self.workers) + 1
+
+    def _reserve(self, count):
+        if self.count + count > self.capacity:
+            raise ValueError("Cannot mint %i more ids. The minter is "
+                             "exhausted after %i ids." % (count,
+                                                          self.capacity))
+        start = self.count
+        self.count += count
+        return start
+
+    def _scramble(self, value):
+        mask = self._mask
+        value = (value * self._a + self._b) & mask
+        value ^= value >> self._shift
+        value = (value * self._c) & mask
+        value ^= value >> self._shift
+        return value
+
+    def mint(self, name, step=1):
+        """
+        A single new id.
+
+        :param name: The name of the SEIS-PROV type, e.g.
+            ``"waveform_trace"``.
+        :param step: The step in the processing chain.
+        """
+        prefix = _prefix(name, step)
+        counter = self._reserve(1) * self.workers + self.worker
+        return prefix + _encode(self._scramble(counter), self.length)
+
+    def mint_many(self, name, count, step=1):
+        """
+        A NumPy array of ``count`` new ids. All of them are computed at once
+        which is orders of magnitude faster than calling :meth:`mint` in a
+        loop. Returns the same ids as calling :meth:`mint` ``count`` times.
+
+        :param name: The name of the SEIS-PROV type.
+        :param count: The number of ids.
+        :param step: The step in the processing chain.
+        """
+        import numpy as np
+
+        prefix = _prefix(name, step).encode("ascii")
+        start = self._reserve(count)
+
+        mask = np.uint64(self._mask)
+        shift = np.uint64(self._shift)
+        values = np.arange(start, start + count, dtype=np.uint64)
+        values *= np.uint64(self.workers)
+        values += np.uint64(self.worker)
+        # Overflows wrap around modulo 2 ** 64 which is a multiple of
+        # 2 ** bits.
+        with np.errstate(over="ignore"):
+            values = (values * np.uint64(self._a) + np.uint64(self._b)) & mask
+            values ^= values >> shift
+            values = (values * np.uint64(self._c)) & mask
+        values ^= values >> shift
+
+        width = len(prefix) + self.length
+        chars = np.empty((count, width), dtype=np.uint8)
+        chars[:, :len(prefix)] = np.frombuffer(prefix, dtype=np.uint8)
+        lookup = np.frombuffer(DIGITS.encode("ascii"), dtype=np.uint8)
+        base = np.uint64(36)
+        for i in range(width - 1, len(prefix) - 1, -1):
+            chars[:, i] = lookup[(values % base).astype(np.intp)]
+            values //= base
+        return chars.view("S%i" % width).reshape(count).astype(
+            "U%i" % width)
+
+
+def mint_from_content(name, content, step=1, length=12):
+    """
+    An id derived from the content of a record so identical records always
+    get the same id, e.g. when the same input is processed again.
+
+    Different contents get different ids with a very high probability but,
+    unlike ids of an :class:`IdentifierMinter`, not with certainty.
+
+    :param name: The name of the SEIS-PROV type.
+    :param content: Bytes or a string identifying the record.
+    :param step: The step in the processing chain.
+    :param length: The length of the suffix, between 7 and 12.
+    """
+    if not 7 <= length <= 12:
+        raise ValueError("The length must be between 7 and 12.")
+    if isinstance(content, six.text_type):
+        content = content.encode("utf-8")
+    value = int(hashlib.sha256(content).hexdigest(), 16) % (36 ** length)
+    return _prefix(name, step) + _encode(value, length)
@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Incremental validation of documents that grow over time.
+
+Workflows appending records to a document after every processing step and
+validating it each time would otherwise check all records again and again.
+A :class:`ValidationSession` remembers the result of every record it has
+seen by its content so only new and changed records are validated. The
+checks across records use an index that is updated with the changes.
+
+:copyright:
+    Lion Krischer (lion.krischer@googlemail.com), 2015
+:license:
+    BSD 3-Clause ("BSD New" or "BSD Simplified")
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import collections
+import hashlib
+
+from .identifier_index import IncrementalIdentifierIndex, record_entry
+from .validator import (SEIS_PROV_NAMESPACE, _ValidationContext,
+                        _check_record, _get_stats, _get_validator,
+                        _log_error, _log_record_error, _log_warning, _phase,
+                        _validate_identifiers)
+
+
+def _record_hash(record):
+    """
+    Hash of the contents of a prov record. Independent of the order of its
+    attributes.
+    """
+    import prov.model
+
+    def canonical(value):
+        if isinstance(value, prov.model.QualifiedName):
+            return "%s=%s" % (value, value.uri)
+        return "%s:%s" % (type(value).__name__, value)
+
+    h = hashlib.sha1()
+    h.update(("%s %s" % (record.get_type(), canonical(
+        record.identifier))).encode("utf-8"))
+    for item in sorted("%s\t%s" % (canonical(_i[0]), canonical(_i[1]))
+                       for _i in record.attributes):
+        h.update(b"\n")
+        h.update(item.encode("utf-8"))
+    return h.digest()
+
+
+class ValidationSession(object):
+    """
+    Validate the same, growing document over and over again.
+
+    Every record is only validated the first time a record with its contents
+    is seen. The results of records that are still part of the document are
+    kept and reported again so each validation returns exactly what
+    :func:`~seis_prov_validate.validator.validate_document` returns for the
+    document. The SEIS-PROV namespace is part of the record checks so
+    changing it validates all records again.
+
+    :param validator: The :class:`~seis_prov_validate.validator.Validator`
+        to use. Defaults to a shared one.
+    """
+    def __init__(self, validator=None):
+        self.validator = validator if validator is not None else \
+            _get_validator()
+        self.reset()
+
+    def reset(self):
+        """
+        Forget everything so the next validation checks all records.
+        """
+        self._namespace = None
+        # Maps each record hash to (localpart, errors, index entry).
+        self._records = {}
+        # Counts of the (bundle, record hash) tuples in the index and the
+        # index entries of these records. Bundles are stored by their id.
+        self._current = collections.Counter()
+        self._entries = {}
+        # Maps the id() of each record object to (record, number of
+        # attribute values, record hash). Attributes of prov records can
+        # only be added so unchanged objects do not have to be hashed again.
+        self._hashes = {}
+        self._index = IncrementalIdentifierIndex()
+        # Number of records validated by the last validation.
+        self.checked_records = 0
+
+    def validate(self, doc, all_errors=None, max_errors=None, stats=None):
+        """
+        Validate the current state of a prov document.
+
+        Documents created with the prov package are usually valid PROV-XML
+        so, as with
+        :meth:`~seis_prov_validate.validator.Validator.validate_document`,
+        the document is not validated against the PROV-XML schema. That
+        always covers the whole document.
+
+        :param doc: The :class:`prov.model.ProvDocument` to validate.
+        :param all_errors: See
+            :meth:`~seis_prov_validate.validator.Validator.validate`.
+        :param max_errors: See
+            :meth:`~seis_prov_validate.validator.Validator.validate`.
+        :param stats: See
+            :meth:`~seis_prov_validate.validator.Validator.validate`.
+        """
+        import prov.model
+        if not isinstance(doc, prov.model.ProvDocument):
+            raise TypeError("Expected a prov.model.ProvDocument, got '%s'." %
+                            type(doc).__name__)
+
+        validator = self.validator
+        if all_errors is None:
+            all_errors = validator.all_errors
+        if max_errors is None:
+            max_errors = validator.max_errors
+        if not all_errors:
+            max_errors = None
+        if stats is None:
+            stats = validator.stats
+
+        self.checked_records = 0
+        with _ValidationContext(validator, all_errors=all_errors,
+                                max_errors=max_errors,
+                                stats=stats) as context:
+            with _phase("schemas"):
+                plan = validator.plan
+            context.run(self._validate, doc, plan)
+        return context.result()
+
+    def _check(self, record, plan, ns):
+        """
+        Validate a single record and collect all its errors.
+        """
+        self.checked_records += 1
+        with _ValidationContext(self.validator, all_errors=True) as capture:
+            localpart = _check_record(record, plan, ns)
+        return localpart, capture.errors, record_entry(record)
+
+    def _validate(self, doc, plan):
+        stats = _get_stats()
+        if stats is not None:
+            stats.bundles = len(doc.bundles)
+            stats.records = len(doc._records) + sum(
+                len(_i._records) for _i in doc.bundles)
+
+        if not doc._records:
+            _log_error("File does not contain a single provenance record.")
+
+        for ns in doc.namespaces:
+            if ns.uri == SEIS_PROV_NAMESPACE:
+                break
+        else:
+            _log_warning("The document is a valid W3C PROV document but not "
+                         "a single SEIS-PROV record has been found.")
+            return
+
+        if (ns.prefix, ns.uri) != self._namespace:
+            self.reset()
+            self._namespace = (ns.prefix, ns.uri)
+
+        # Step 4: Only records that have not been seen before are validated.
+        # The errors are reported once the index is up to date.
+        errors = []
+        seis_prov_record = False
+        current = collections.Counter()
+        entries = {}
+        hashes = {}
+        with _phase("records"):
+            containers = [(None, doc)] + [(_i.identifier.uri, _i)
+                                          for _i in doc.bundles]
+            for bundle, container in containers:
+                if bundle is not None:
+                    entries[bundle] = ("definition", (
+                        container.identifier.namespace.uri,
+                        container.identifier.localpart, "bundle"))
+                    current[(None, bundle)] += 1
+                for record in container._records:
+                    size = sum(len(_i) for _i in record._attributes.values())
+                    known = self._hashes.get(id(record))
+                    if known is not None and known[0] is record and \
+                            known[1] == size:
+                        key = known[2]
+                    else:
+                        key = _record_hash(record)
+                    hashes[id(record)] = (record, size, key)
+                    result = self._records.get(key)
+                    if result is None:
+                        result = self._records[key] = self._check(
+                            record, plan, ns)
+                    localpart, record_errors, entries[key] = result
+                    current[(bundle, key)] += 1
+                    errors.extend(record_errors)
+                    if localpart is not None:
+                        seis_prov_record = True
+
+        # Apply the differences to the index and forget records that are no
+        # longer part of the document.
+        with _phase("identifiers"):
+            for container in [doc] + list(doc.bundles):
+                for namespace in container.namespaces:
+                    self._index.add_namespace(namespace.prefix,
+                                              namespace.uri)
+            for (bundle, key), count in (self._current - current).items():
+                for _ in range(count):
+                    self._index.remove_entry(self._entries[key],
+                                             bundle=bundle)
+            for (bundle, key), count in (current - self._current).items():
+                for _ in range(count):
+                    self._index.add_entry(entries[key], bundle=bundle)
+            self._current = current
+            self._entries = entries
+            self._hashes = hashes
+            if len(self._records) > len(entries):
+                self._records = dict(
+                    (_k, _v) for _k, _v in self._records.items()
+                    if _k in entries)
+
+        for message in errors:
+            _log_record_error(message)
+
+        if not seis_prov_record:
+            _log_warning("The document is a valid W3C PROV document but not "
+                         "a single SEIS-PROV record has been found.")
+            return
+
+        # Step 5: Checks across all records of the document and its bundles.
+        with _phase("identifiers"):
+            _validate_identifiers(self._index, ns=ns)
@@ -0,0 +1,351 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Lineage queries on SEIS-PROV documents.
+
+Questions like "which raw traces, agents, and parameters produced this
+cross correlation" require following the relations of a document across
+many records. A :class:`LineageGraph` indexes the relations of a document
+once in both directions so every query only visits the records it returns.
+The transitive closures of recently queried records are kept in a least
+recently used cache and closures of records that are already cached are
+reused for the records depending on them.
+
+:copyright:
+    Lion Krischer (lion.krischer@googlemail.com), 2015
+:license:
+    BSD 3-Clause ("BSD New" or "BSD Simplified")
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import collections
+import threading
+
+import six
+
+from . import native
+from .identifier_index import ELEMENT_TYPES
+from .validator import SEIS_PROV_NAMESPACE
+
+# For each relation the attribute referencing the record that depends on
+# the others and the attributes referencing the records it depends on.
+EDGES = {
+    "used": ("prov:activity", ("prov:entity",)),
+    "wasGeneratedBy": ("prov:entity", ("prov:activity",)),
+    "wasDerivedFrom": ("prov:generatedEntity", ("prov:usedEntity",)),
+    "wasAssociatedWith": ("prov:activity", ("prov:agent", "prov:plan")),
+    "actedOnBehalfOf": ("prov:delegate", ("prov:responsible",)),
+    "wasAttributedTo": ("prov:entity", ("prov:agent",)),
+    "wasInformedBy": ("prov:informed", ("prov:informant",))
+}
+
+# The relations a lineage follows by default.
+LINEAGE_RELATIONS = ("used", "wasGeneratedBy", "wasDerivedFrom",
+                     "wasAssociatedWith", "actedOnBehalfOf")
+
+CacheInfo = collections.namedtuple("CacheInfo",
+                                   ["hits", "misses", "maxsize", "currsize"])
+
+
+class LineageNode(object):
+    """
+    A single element of a lineage graph.
+
+    :ivar identifier: The URI of the element.
+    :ivar name: The qualified name of the element, e.g.
+        ``"seis_prov:sp001_wf_f84fb9a"``.
+    :ivar record_type: ``"entity"``, ``"activity"``, ``"agent"``, or
+        ``None`` for elements that are referenced but not defined.
+    :ivar seis_prov_type: The SEIS-PROV type, e.g. ``"waveform_trace"``, or
+        ``None``.
+    :ivar label: The first prov:label or ``None``.
+    :ivar attributes: Dictionary of the attributes in the SEIS-PROV
+        namespace. Only the first value of each attribute is kept.
+    :ivar bundle: The URI of the bundle the element is defined in or
+        ``None``.
+    """
+    __slots__ = ["identifier", "name", "record_type", "seis_prov_type",
+                 "label", "attributes", "bundle"]
+
+    def __init__(self, identifier, name, record_type=None,
+                 seis_prov_type=None, label=None, attributes=None,
+                 bundle=None):
+        self.identifier = identifier
+        self.name = name
+        self.record_type = record_type
+        self.seis_prov_type = seis_prov_type
+        self.label = label
+        self.attributes = attributes if attributes is not None else {}
+        self.bundle = bundle
+
+    def __repr__(self):
+        return "<LineageNode: %s %s>" % (
+            self.seis_prov_type or self.record_type, self.name)
+
+
+class LineageGraph(object):
+    """
+    Graph of the elements of a document and their dependencies.
+
+    Elements are identified by their URIs so the same element used in
+    different bundles is a single node.
+
+    :param source: The document. See
+        :func:`~seis_prov_validate.native.read_document`.
+    :param relations: The relations to follow. Must be keys of
+        :data:`EDGES`.
+    :param cache_size: The maximum number of cached closures.
+    """
+    def __init__(self, source, relations=LINEAGE_RELATIONS,
+                 cache_size=1024):
+        for relation in relations:
+            if relation not in EDGES:
+                raise ValueError("Unknown relation '%s'." % relation)
+        self.relations = tuple(relations)
+        self.cache_size = cache_size
+
+        doc = native.read_document(source)
+        self._namespaces = dict(doc.namespaces)
+        self._nodes = []
+        self._index = {}
+        # Adjacency lists of the node indices each node depends on and of
+        # the ones depending on it.
+        self._upstream = []
+        self._downstream = []
+
+        prefix = doc.seis_prov_prefix
+        containers = [(None, doc.records)] + doc.bundles
+        for bundle, records in containers:
+            for record in records:
+                if record.record_type not in ELEMENT_TYPES:
+                    continue
+                node = self._nodes[self._add_node(record.identifier)]
+                if node.record_type is not None:
+                    # Keep the first definition of duplicate ids.
+                    continue
+                node.record_type = record.record_type
+                node.seis_prov_type = native.seis_prov_type(record, prefix)
+                node.label = record.labels[0] if record.labels else None
+                for key, value in record.attributes:
+                    node.attributes.setdefault(key, value)
+                node.bundle = bundle.uri if bundle is not None else None
+
+        for _, records in containers:
+            for record in records:
+                if record.record_type not in self.relations:
+                    continue
+                target, sources = EDGES[record.record_type]
+                references = dict(record.references)
+                if target not in references:
+                    continue
+                i = self._add_node(references[target])
+                for attribute in sources:
+                    if attribute not in references:
+                        continue
+                    j = self._add_node(references[attribute])
+                    if j not in self._upstream[i]:
+                        self._upstream[i].append(j)
+                        self._downstream[j].append(i)
+
+        self._lock = threading.Lock()
+        self.clear_cache()
+
+    def _add_node(self, identifier):
+        """
+        Index of the node of an identifier. Added if it does not exist yet.
+        """
+        i = self._index.get(identifier.uri)
+        if i is None:
+            i = self._index[identifier.uri] = len(self._nodes)
+            self._nodes.append(LineageNode(identifier.uri, str(identifier)))
+            self._upstream.append([])
+            self._downstream.append([])
+        return i
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __contains__(self, identifier):
+        try:
+            self._resolve(identifier)
+        except KeyError:
+            return False
+        return True
+
+    @property
+    def nodes(self):
+        """
+        All nodes in the order they appear in the document.
+        """
+        return list(self._nodes)
+
+    def _resolve(self, identifier):
+        """
+        Index of the node of a URI, a qualified name with a prefix of the
+        document, the local part of a SEIS-PROV id, or any object with an
+        ``uri`` attribute.
+        """
+        if isinstance(identifier, LineageNode):
+            identifier = identifier.identifier
+        elif not isinstance(identifier, six.string_types):
+            identifier = identifier.uri
+        i = self._index.get(identifier)
+        if i is not None:
+            return i
+        if ":" in identifier:
+            prefix, localpart = identifier.split(":", 1)
+            if prefix in self._namespaces:
+                i = self._index.get(self._namespaces[prefix] + localpart)
+        else:
+            i = self._index.get(SEIS_PROV_NAMESPACE + identifier)
+        if i is None:
+            raise KeyError("Unknown identifier '%s'." % identifier)
+        return i
+
+    def node(self, identifier):
+        """
+        The :class:`LineageNode` of an identifier. Raises a ``KeyError`` if
+        the graph has no such node.
+
+        :param identifier: URI, qualified name, or local part of a
+            SEIS-PROV id.
+        """
+        return self._nodes[self._resolve(identifier)]
+
+    def parents(self, identifier):
+        """
+        The nodes an element directly depends on.
+        """
+        return [self._nodes[_i]
+                for _i in self._upstream[self._resolve(identifier)]]
+
+    def children(self, identifier):
+        """
+        The nodes directly depending on an element.
+        """
+        return [self._nodes[_i]
+                for _i in self._downstream[self._resolve(identifier)]]
+
+    def clear_cache(self):
+        with self._lock:
+            # Maps (direction, node index) to the frozenset of the indices
+            # of all reachable nodes. Ordered from least to most recently
+            # used.
+            self._cache = collections.OrderedDict()
+            self._hits = 0
+            self._misses = 0
+
+    def cache_info(self):
+        """
+        Statistics of the closure cache in the same form as
+        :func:`functools.lru_cache` reports them.
+        """
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, self.cache_size,
+                             len(self._cache))
+
+    def _cached(self, key):
+        """
+        Cached closure or ``None``. Marks it as the most recently used.
+        """
+        closure = self._cache.pop(key, None)
+        if closure is not None:
+            self._cache[key] = closure
+        return closure
+
+    def _closure(self, i, direction):
+        """
+        Frozenset of the indices of all nodes reachable from node ``i``.
+        """
+        key = (direction, i)
+        with self._lock:
+            closure = self._cached(key)
+            if closure is not None:
+                self._hits += 1
+                return closure
+            self._misses += 1
+
+            adjacency = self._upstream if direction == "up" else \
+                self._downstream
+            reachable = set()
+            stack = list(adjacency[i])
+            while stack:
+                j = stack.pop()
+                if j in reachable:
+                    continue
+                reachable.add(j)
+                known = self._cached((direction, j))
+                if known is not None:
+                    reachable.update(known)
+                else:
+                    stack.extend(adjacency[j])
+            # Elements in cycles are not part of their own lineage.
+            reachable.discard(i)
+            closure = frozenset(reachable)
+
+            if self.cache_size:
+                self._cache[key] = closure
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            return closure
+
+    def _query(self, identifier, direction, types, record_types,
+               attributes):
+        if isinstance(types, six.string_types):
+            types = (types,)
+        if isinstance(record_types, six.string_types):
+            record_types = (record_types,)
+
+        nodes = []
+        for i in sorted(self._closure(self._resolve(identifier), direction)):
+            node = self._nodes[i]
+            if types is not None and node.seis_prov_type not in types:
+                continue
+            if record_types is not None and \
+                    node.record_type not in record_types:
+                continue
+            if attributes and not _matches(node, attributes):
+                continue
+            nodes.append(node)
+        return nodes
+
+    def ancestors(self, identifier, types=None, record_types=None,
+                  attributes=None):
+        """
+        All nodes an element directly or indirectly depends on in the order
+        they appear in the document.
+
+        :param identifier: URI, qualified name, or local part of a
+            SEIS-PROV id.
+        :param types: Only return nodes with one of these SEIS-PROV types.
+        :param record_types: Only return nodes with one of these record
+            types, e.g. ``"agent"``.
+        :param attributes: Dictionary of SEIS-PROV attributes the returned
+            nodes must have. Values are either compared for equality or
+            called with the value of the node, which must return ``True``.
+        """
+        return self._query(identifier, "up", types, record_types, attributes)
+
+    def descendants(self, identifier, types=None, record_types=None,
+                    attributes=None):
+        """
+        All nodes directly or indirectly depending on an element in the
+        order they appear in the document. Takes the same filters as
+        :meth:`ancestors`.
+        """
+        return self._query(identifier, "down", types, record_types,
+                           attributes)
+
+
+def _matches(node, attributes):
+    for key, expected in attributes.items():
+        if key not in node.attributes:
+            return False
+        value = node.attributes[key]
+        if callable(expected):
+            if expected(value) is not True:
+                return False
+        elif value != expected:
+            return False
+    return True
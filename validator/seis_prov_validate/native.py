@@ -0,0 +1,831 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Lightweight reader for SEIS-PROV documents that bypasses the prov package.
+
+Converting a parsed file to a :class:`prov.model.ProvDocument` is the most
+expensive step of a validation. This module reads parsed PROV-XML trees and
+PROV-JSON objects directly into compact records holding only what the
+SEIS-PROV validation needs: the record type, the id, the prov:type's, the
+labels, the attributes in the SEIS-PROV namespace, and the references of
+relations.
+
+Values are converted exactly like the prov package converts them. Documents
+using anything the reader does not reproduce faithfully, for example
+namespaces declared on nested elements, raise an
+:class:`UnsupportedDocument` exception and have to be read with the prov
+package.
+
+:copyright:
+    Lion Krischer (lion.krischer@googlemail.com), 2015
+:license:
+    BSD 3-Clause ("BSD New" or "BSD Simplified")
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import io
+
+from lxml import etree
+import six
+import prov.constants
+import prov.model
+from prov.identifier import Identifier
+
+from .identifier_index import (ELEMENT_TYPES, REFERENCE_ATTRIBUTES,
+                               IdentifierIndex)
+from .validator import (SEIS_PROV_NAMESPACE, _AGENT_TYPES, _log_warning,
+                        _parse_file, _phase, _read_prov_document)
+
+_PROV_NS = prov.constants.PROV.uri
+_XSD_NS = prov.constants.XSD.uri
+# PROV-XML files use the XSD namespace without the trailing hash.
+_XML_XSD_NS = "http://www.w3.org/2001/XMLSchema"
+_DOCUMENT_TAG = "{%s}document" % _PROV_NS
+_BUNDLE_TAG = "{%s}bundleContent" % _PROV_NS
+_ID_ATTRIB = "{%s}id" % _PROV_NS
+_REF_ATTRIB = "{%s}ref" % _PROV_NS
+_XSI_TYPE_ATTRIB = "{http://www.w3.org/2001/XMLSchema-instance}type"
+
+# Namespaces every prov document knows.
+_DEFAULT_NAMESPACES = dict(
+    (_k, _v.uri) for _k, _v in prov.model.DEFAULT_NAMESPACES.items())
+
+# Local names of the formal attributes in the PROV namespace.
+_QNAME_ATTRIBUTES = frozenset(
+    _i.localpart for _i in prov.constants.PROV_ATTRIBUTE_QNAMES)
+_TIME_ATTRIBUTES = frozenset(
+    _i.localpart for _i in prov.constants.PROV_ATTRIBUTE_LITERALS)
+
+_INTEGER_TYPES = (prov.model.XSD_INT, prov.model.XSD_LONG,
+                  prov.model.XSD_INTEGER)
+
+_PLAN_KEYS = {"entity": prov.model.PROV_ENTITY,
+              "activity": prov.model.PROV_ACTIVITY,
+              "agent": prov.model.PROV_AGENT}
+
+
+class UnsupportedDocument(Exception):
+    """
+    Raised for documents the native reader cannot read exactly like the prov
+    package would.
+    """
+    pass
+
+
+class QName(object):
+    """
+    Qualified name. Two names are equal if their URIs are equal, just like
+    in the prov package.
+    """
+    __slots__ = ["namespace", "prefix", "localpart"]
+
+    def __init__(self, namespace, prefix, localpart):
+        self.namespace = namespace
+        self.prefix = prefix
+        self.localpart = localpart
+
+    @property
+    def uri(self):
+        return self.namespace + self.localpart
+
+    def __eq__(self, other):
+        return isinstance(other, QName) and self.uri == other.uri
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.uri)
+
+    def __str__(self):
+        return "%s:%s" % (self.prefix, self.localpart)
+
+    def __repr__(self):
+        return "<QName: %s>" % self
+
+
+# Maps the names of all PROV records to the names of their base records and
+# the prov:type the more specific ones assert, e.g. "person" is an "agent"
+# with the type prov:Person.
+_RECORD_TYPES = {}
+for _rec_type, _name in list(prov.constants.PROV_N_MAP.items()) + list(
+        prov.constants.ADDITIONAL_N_MAP.items()):
+    _base = prov.constants.PROV_BASE_CLS[_rec_type]
+    _RECORD_TYPES[_name] = (
+        prov.constants.PROV_N_MAP[_base],
+        None if _base == _rec_type else
+        QName(_PROV_NS, "prov", _rec_type.localpart))
+del _rec_type, _name, _base
+
+
+class NativeRecord(object):
+    """
+    A single record.
+
+    :ivar record_type: The name of the record type, e.g. ``"entity"``. More
+        specific types like ``"person"`` are stored as their base type with
+        an additional prov:type.
+    :ivar identifier: The :class:`QName` of the record or ``None``.
+    :ivar prov_types: Tuple of all distinct prov:type values.
+    :ivar labels: Tuple of all distinct prov:label values.
+    :ivar attributes: Tuple of distinct ``(local name, value)`` tuples of
+        all attributes in the SEIS-PROV namespace.
+    :ivar references: Tuple of ``(attribute, QName)`` tuples of all
+        references to other records, e.g. ``("prov:entity", ...)``.
+    """
+    __slots__ = ["record_type", "identifier", "prov_types", "labels",
+                 "attributes", "references"]
+
+    def __init__(self, record_type, identifier, prov_types=(), labels=(),
+                 attributes=(), references=()):
+        self.record_type = record_type
+        self.identifier = identifier
+        self.prov_types = tuple(prov_types)
+        self.labels = tuple(labels)
+        self.attributes = tuple(attributes)
+        self.references = tuple(references)
+
+    def __repr__(self):
+        return "<NativeRecord: %s %s>" % (self.record_type, self.identifier)
+
+
+class NativeDocument(object):
+    """
+    A document read by the native reader.
+
+    :ivar namespaces: Dictionary of the prefixes and URIs of the namespaces
+        the prov package would register with the root document.
+    :ivar records: List of the :class:`NativeRecord` objects of the root
+        document.
+    :ivar bundles: List of ``(QName, records)`` tuples, one for each
+        bundle.
+    """
+    __slots__ = ["namespaces", "records", "bundles"]
+
+    def __init__(self, namespaces, records, bundles):
+        self.namespaces = namespaces
+        self.records = records
+        self.bundles = bundles
+
+    @property
+    def record_count(self):
+        return len(self.records) + sum(len(_i[1]) for _i in self.bundles)
+
+    @property
+    def seis_prov_prefix(self):
+        """
+        The prefix of the SEIS-PROV namespace or ``None`` if the root
+        document does not use it.
+        """
+        for prefix, uri in self.namespaces.items():
+            if uri == SEIS_PROV_NAMESPACE:
+                return prefix
+        return None
+
+
+# Values the prov package keeps as literals the validation cannot handle
+# natively, e.g. strings with a language.
+_OPAQUE = object()
+
+
+def _add_value(values, value):
+    if value not in values:
+        values.append(value)
+
+
+def _xsd_value(text, localpart):
+    """
+    Convert the text of a value with a datatype in the XSD namespace like
+    the prov package does.
+    """
+    datatype = prov.model.XSD[localpart]
+    try:
+        value = prov.model.parse_xsd_types(text, datatype)
+    except Exception:
+        # The prov package cannot read the document.
+        raise UnsupportedDocument
+    if value is None or (
+            datatype in _INTEGER_TYPES and
+            prov.model.canonical_xsd_datatype(value) != datatype):
+        return prov.model.Literal(text, datatype)
+    return value
+
+
+def _parse_time(text):
+    if not isinstance(text, six.string_types):
+        raise UnsupportedDocument
+    value = prov.model.parse_xsd_datetime(text)
+    if value is None:
+        raise UnsupportedDocument
+    return value
+
+
+class _RecordBuilder(object):
+    """
+    Collects the attributes of a single record.
+    """
+    def __init__(self, record_type, identifier):
+        self.base_type, asserted = _RECORD_TYPES[record_type]
+        if identifier is None and self.base_type in ELEMENT_TYPES:
+            raise UnsupportedDocument
+        self.identifier = identifier
+        self.prov_types = []
+        self.labels = []
+        self.attributes = []
+        self.references = []
+        self.formal = set()
+        self.asserted = asserted
+
+    def add(self, namespace, localpart, value):
+        if namespace == _PROV_NS:
+            if localpart in _QNAME_ATTRIBUTES or \
+                    localpart in _TIME_ATTRIBUTES:
+                # Single valued.
+                if localpart in self.formal:
+                    raise UnsupportedDocument
+                self.formal.add(localpart)
+                if localpart in _QNAME_ATTRIBUTES:
+                    self.references.append(("prov:" + localpart, value))
+                return
+            if localpart == "type":
+                values = self.prov_types
+            elif localpart == "label":
+                values = self.labels
+            else:
+                return
+        elif namespace == SEIS_PROV_NAMESPACE:
+            if isinstance(value, QName):
+                raise UnsupportedDocument
+            values = self.attributes
+            value = (localpart, value)
+        else:
+            return
+        if value is _OPAQUE or (isinstance(value, tuple) and
+                                value[1] is _OPAQUE):
+            raise UnsupportedDocument
+        _add_value(values, value)
+
+    def finish(self):
+        if self.asserted is not None:
+            _add_value(self.prov_types, self.asserted)
+        reference_attributes = REFERENCE_ATTRIBUTES.get(self.base_type, ())
+        return NativeRecord(
+            self.base_type, self.identifier, self.prov_types, self.labels,
+            self.attributes, [_i for _i in self.references
+                              if _i[0] in reference_attributes])
+
+
+class _XMLReader(object):
+    """
+    Reads a PROV-XML tree. All prefixes have to be declared on the root
+    element.
+    """
+    def __init__(self, root):
+        if root.tag != _DOCUMENT_TAG:
+            raise UnsupportedDocument
+        self.nsmap = dict(root.nsmap)
+        if None in self.nsmap:
+            raise UnsupportedDocument
+        for prefix, uri in self.nsmap.items():
+            if prefix in _DEFAULT_NAMESPACES and \
+                    uri not in (_DEFAULT_NAMESPACES[prefix], _XML_XSD_NS):
+                raise UnsupportedDocument
+        if list(self.nsmap.values()).count(SEIS_PROV_NAMESPACE) > 1:
+            raise UnsupportedDocument
+        declarations = sum(1 for _ in etree.iterwalk(
+            root, events=("start-ns",)))
+        if declarations != len(self.nsmap):
+            raise UnsupportedDocument
+        # Namespaces used by the records of the root document.
+        self.used = {}
+
+    def qname(self, value, used=None):
+        if value is None or ":" not in value:
+            raise UnsupportedDocument
+        prefix, localpart = value.split(":", 1)
+        if prefix not in self.nsmap:
+            raise UnsupportedDocument
+        uri = self.nsmap[prefix]
+        if uri == _XML_XSD_NS:
+            uri = _XSD_NS
+        if used is not None:
+            used.setdefault(prefix, uri)
+        return QName(uri, prefix, localpart)
+
+    def read(self, root):
+        records = self.read_container(root, self.used)
+        bundles = []
+        for element in root:
+            if element.tag == _BUNDLE_TAG:
+                identifier = self.qname(element.get(_ID_ATTRIB), self.used)
+                bundles.append((identifier, self.read_container(element)))
+        return NativeDocument(self.used, records, bundles)
+
+    def read_container(self, container, used=None):
+        records = []
+        prefix = "{%s}" % _PROV_NS
+        for element in container:
+            tag = element.tag
+            if not isinstance(tag, six.string_types) or \
+                    not tag.startswith(prefix):
+                raise UnsupportedDocument
+            if tag == _BUNDLE_TAG:
+                if used is None:
+                    raise UnsupportedDocument
+                continue
+            record_type = tag[len(prefix):]
+            if record_type not in _RECORD_TYPES:
+                raise UnsupportedDocument
+
+            rec_id = element.get(_ID_ATTRIB)
+            builder = _RecordBuilder(
+                record_type,
+                self.qname(rec_id, used) if rec_id is not None else None)
+
+            for child in element:
+                self.read_attribute(builder, child, used)
+
+            for key, value in element.attrib.items():
+                if key == _XSI_TYPE_ATTRIB:
+                    builder.add(_PROV_NS, "type", self.qname(value, used))
+                elif key != _ID_ATTRIB:
+                    raise UnsupportedDocument
+            records.append(builder.finish())
+        return records
+
+    def read_attribute(self, builder, child, used):
+        tag = child.tag
+        if not isinstance(tag, six.string_types) or not tag.startswith("{") \
+                or child.prefix is None:
+            raise UnsupportedDocument
+        namespace, localpart = tag[1:].split("}", 1)
+        # Escaped local names.
+        if "_x" in localpart:
+            raise UnsupportedDocument
+        if namespace == _XML_XSD_NS:
+            namespace = _XSD_NS
+        if used is not None:
+            used.setdefault(child.prefix, namespace)
+
+        attrib = child.attrib
+        text = child.text if child.text is not None else ""
+        formal = namespace == _PROV_NS and (localpart in _QNAME_ATTRIBUTES or
+                                            localpart in _TIME_ATTRIBUTES)
+        if not attrib:
+            if formal:
+                if localpart in _QNAME_ATTRIBUTES:
+                    raise UnsupportedDocument
+                value = _parse_time(text)
+            else:
+                value = text
+        elif len(attrib) > 1:
+            raise UnsupportedDocument
+        elif _REF_ATTRIB in attrib:
+            value = self.qname(attrib[_REF_ATTRIB], used)
+        elif _XSI_TYPE_ATTRIB in attrib:
+            datatype = self.qname(attrib[_XSI_TYPE_ATTRIB])
+            if datatype.namespace != _XSD_NS:
+                value = _OPAQUE
+            elif datatype.localpart == "QName":
+                value = self.qname(child.text, used)
+            else:
+                value = _xsd_value(text, datatype.localpart)
+            if formal:
+                raise UnsupportedDocument
+        else:
+            raise UnsupportedDocument
+        if formal and localpart in _QNAME_ATTRIBUTES and \
+                not isinstance(value, QName):
+            raise UnsupportedDocument
+        builder.add(namespace, localpart, value)
+
+
+def read_xml(tree):
+    """
+    Read a parsed PROV-XML document.
+
+    :param tree: An lxml element tree or its root element.
+    """
+    root = tree.getroot() if hasattr(tree, "getroot") else tree
+    return _XMLReader(root).read(root)
+
+
+class _JSONReader(object):
+    """
+    Reads a decoded PROV-JSON document.
+    """
+    def __init__(self):
+        self.seis_prov_prefixes = set()
+
+    def namespaces(self, container, parent):
+        prefixes = container.get("prefix", {})
+        if not isinstance(prefixes, dict):
+            raise UnsupportedDocument
+        namespaces = dict(parent)
+        for prefix, uri in prefixes.items():
+            if prefix == "default" or not isinstance(uri, six.string_types) \
+                    or namespaces.get(prefix, uri) != uri:
+                raise UnsupportedDocument
+            namespaces[prefix] = uri
+            if uri == SEIS_PROV_NAMESPACE:
+                self.seis_prov_prefixes.add(prefix)
+        if len(self.seis_prov_prefixes) > 1:
+            raise UnsupportedDocument
+        return namespaces
+
+    def qname(self, value, namespaces):
+        """
+        Returns ``None`` for names the prov package cannot resolve either.
+        """
+        if not isinstance(value, six.string_types):
+            raise UnsupportedDocument
+        if value.startswith("_:") or ":" not in value:
+            return None
+        prefix, localpart = value.split(":", 1)
+        if prefix not in namespaces:
+            # The prov package would try to interpret it as a URI.
+            raise UnsupportedDocument
+        return QName(namespaces[prefix], prefix, localpart)
+
+    def value(self, value, namespaces):
+        if isinstance(value, dict):
+            if "$" not in value:
+                raise UnsupportedDocument
+            text = value["$"]
+            if not isinstance(text, (six.string_types, bool, int, float)):
+                raise UnsupportedDocument
+            datatype = None
+            if value.get("type") is not None:
+                datatype = self.qname(value["type"], namespaces)
+                if datatype is None:
+                    raise UnsupportedDocument
+                datatype = datatype.uri
+            if datatype == _XSD_NS + "anyURI":
+                if not isinstance(text, six.string_types):
+                    raise UnsupportedDocument
+                return Identifier(text)
+            elif datatype in (_XSD_NS + "QName",
+                              _PROV_NS + "QUALIFIED_NAME"):
+                name = self.qname(text, namespaces)
+                if name is None:
+                    raise UnsupportedDocument
+                return name
+            # Literals convert their values to strings.
+            text = six.text_type(text)
+            if value.get("lang") is not None:
+                return _OPAQUE
+            elif datatype is None:
+                return text
+            elif datatype.startswith(_XSD_NS):
+                return _xsd_value(text, datatype[len(_XSD_NS):])
+            return _OPAQUE
+        elif isinstance(value, (six.string_types, bool, int, float)):
+            return value
+        raise UnsupportedDocument
+
+    def read(self, obj):
+        if not isinstance(obj, dict):
+            raise UnsupportedDocument
+        namespaces = self.namespaces(obj, _DEFAULT_NAMESPACES)
+        records = self.read_container(obj, namespaces, root=True)
+        bundles = []
+        content = obj.get("bundle", {})
+        if not isinstance(content, dict):
+            raise UnsupportedDocument
+        for bundle_id, container in content.items():
+            if not isinstance(container, dict):
+                raise UnsupportedDocument
+            bundle_namespaces = self.namespaces(container, namespaces)
+            identifier = self.qname(bundle_id, bundle_namespaces)
+            if identifier is None:
+                raise UnsupportedDocument
+            bundles.append((identifier, self.read_container(
+                container, bundle_namespaces)))
+        return NativeDocument(
+            dict((_k, _v) for _k, _v in namespaces.items()
+                 if _k not in _DEFAULT_NAMESPACES), records, bundles)
+
+    def read_container(self, container, namespaces, root=False):
+        records = []
+        for record_type, group in container.items():
+            if record_type == "prefix" or (root and record_type == "bundle"):
+                continue
+            if record_type not in prov.constants.PROV_RECORD_IDS_MAP or \
+                    _RECORD_TYPES[record_type][1] is not None or \
+                    not isinstance(group, dict):
+                raise UnsupportedDocument
+            for rec_id, content in group.items():
+                if isinstance(content, dict):
+                    content = [content]
+                elif not isinstance(content, list) or \
+                        not all(isinstance(_i, dict) for _i in content):
+                    raise UnsupportedDocument
+                identifier = self.qname(rec_id, namespaces)
+                for element in content:
+                    records.append(self.read_record(
+                        record_type, identifier, element, namespaces))
+        return records
+
+    def read_record(self, record_type, identifier, element, namespaces):
+        builder = _RecordBuilder(record_type, identifier)
+        for name, values in element.items():
+            if name in prov.constants.PROV_ATTRIBUTES_ID_MAP:
+                if isinstance(values, list):
+                    if len(values) != 1:
+                        raise UnsupportedDocument
+                    values = values[0]
+                localpart = name[len("prov:"):]
+                if localpart in _QNAME_ATTRIBUTES:
+                    value = self.qname(values, namespaces)
+                    if value is None:
+                        raise UnsupportedDocument
+                else:
+                    value = _parse_time(values)
+                builder.add(_PROV_NS, localpart, value)
+                continue
+
+            attribute = self.qname(name, namespaces)
+            if attribute is None:
+                raise UnsupportedDocument
+            if not isinstance(values, list):
+                values = [values]
+            for value in values:
+                builder.add(attribute.namespace, attribute.localpart,
+                            self.value(value, namespaces))
+        return builder.finish()
+
+
+def read_json(obj):
+    """
+    Read a decoded PROV-JSON document.
+
+    :param obj: The decoded JSON object. It is not modified.
+    """
+    return _JSONReader().read(obj)
+
+
+def read(fileformat, parsed):
+    """
+    Read an already parsed document.
+
+    Raises an :class:`UnsupportedDocument` exception if the document has to
+    be read with the prov package.
+
+    :param fileformat: The format of the parsed document, ``"xml"`` or
+        ``"json"``.
+    :param parsed: An lxml element tree or a decoded PROV-JSON object.
+    """
+    if fileformat == "xml":
+        return read_xml(parsed)
+    return read_json(parsed)
+
+
+def from_prov_document(doc):
+    """
+    Convert a :class:`prov.model.ProvDocument` to a :class:`NativeDocument`.
+    Works for all documents, e.g. for the ones the native reader does not
+    support.
+
+    :param doc: The prov document.
+    """
+    def convert(value):
+        if isinstance(value, prov.model.QualifiedName):
+            return QName(value.namespace.uri, value.namespace.prefix,
+                         value.localpart)
+        return value
+
+    def records(container):
+        result = []
+        for record in container._records:
+            record_type = prov.model.PROV_N_MAP[record.get_type()]
+            reference_attributes = REFERENCE_ATTRIBUTES.get(record_type, ())
+            builder = _RecordBuilder(record_type, convert(record.identifier))
+            # Specific types are already part of the prov:type's.
+            builder.asserted = None
+            for name, value in record.attributes:
+                if name == prov.model.PROV_TYPE:
+                    _add_value(builder.prov_types, convert(value))
+                elif name == prov.model.PROV_LABEL:
+                    _add_value(builder.labels, value)
+                elif isinstance(name, prov.model.QualifiedName):
+                    if name.namespace.uri == SEIS_PROV_NAMESPACE:
+                        _add_value(builder.attributes,
+                                   (name.localpart, convert(value)))
+                    elif str(name) in reference_attributes and \
+                            value is not None:
+                        builder.references.append((str(name),
+                                                   convert(value)))
+            result.append(builder.finish())
+        return result
+
+    return NativeDocument(
+        dict((_i.prefix, _i.uri) for _i in doc.namespaces), records(doc),
+        [(convert(_i.identifier), records(_i)) for _i in doc.bundles])
+
+
+def read_document(source):
+    """
+    Read a document with the native reader if possible and with the prov
+    package otherwise.
+
+    :param source: Filename or open file of a PROV-XML or PROV-JSON
+        document, a :class:`prov.model.ProvDocument`, or a
+        :class:`NativeDocument` which is returned as is.
+    """
+    if isinstance(source, NativeDocument):
+        return source
+    if isinstance(source, prov.model.ProvDocument):
+        return from_prov_document(source)
+
+    if isinstance(source, six.string_types):
+        with io.open(source, "rb") as fh:
+            fileformat, parsed = _parse_file(fh)
+    else:
+        fileformat, parsed = _parse_file(source)
+    if fileformat is None:
+        raise ValueError("Not a PROV-XML or PROV-JSON document.")
+    try:
+        return read(fileformat, parsed)
+    except UnsupportedDocument:
+        return from_prov_document(_read_prov_document(fileformat, parsed))
+
+
+def seis_prov_type(record, prefix):
+    """
+    The SEIS-PROV type of a record resolved like the validation does, e.g.
+    ``"waveform_trace"``. ``None`` if the record has no id in the SEIS-PROV
+    namespace or no prov:type naming a SEIS-PROV type. The type is not
+    checked against the definitions.
+
+    :param record: The :class:`NativeRecord`.
+    :param prefix: The prefix of the SEIS-PROV namespace, see
+        :attr:`NativeDocument.seis_prov_prefix`.
+    """
+    identifier = record.identifier
+    if record.record_type not in ELEMENT_TYPES or \
+            not isinstance(identifier, QName) or \
+            identifier.namespace != SEIS_PROV_NAMESPACE:
+        return None
+    for t in record.prov_types:
+        if isinstance(t, six.string_types):
+            if prefix is not None and t.startswith(prefix + ":"):
+                return t[len(prefix) + 1:]
+        elif isinstance(t, QName):
+            if t.namespace == SEIS_PROV_NAMESPACE:
+                return t.localpart
+            if t.uri in _AGENT_TYPES:
+                return _AGENT_TYPES[t.uri]
+    return None
+
+
+def _check_record(record, plan, prefix):
+    """
+    Check a single record like
+    :func:`~seis_prov_validate.validator._validate_record` does. Raises an
+    :class:`UnsupportedDocument` exception for everything that is not valid
+    or might be treated differently.
+
+    Returns the local part of the record's id if it is a SEIS-PROV record,
+    otherwise ``None``.
+    """
+    identifier = record.identifier
+    id_in_ns = identifier is not None and \
+        identifier.namespace == SEIS_PROV_NAMESPACE
+
+    ns_prefix = prefix + ":"
+    prov_types = record.prov_types
+    type_in_ns = False
+    for t in prov_types:
+        if isinstance(t, six.string_types):
+            type_in_ns = type_in_ns or t.startswith(ns_prefix)
+        elif isinstance(t, QName):
+            type_in_ns = type_in_ns or t.namespace == SEIS_PROV_NAMESPACE
+        else:
+            raise UnsupportedDocument
+
+    if not id_in_ns and not type_in_ns:
+        return None
+    if len(prov_types) != 1:
+        if prov_types or id_in_ns:
+            raise UnsupportedDocument
+        return None
+
+    prov_type = prov_types[0]
+    if record.record_type not in ELEMENT_TYPES:
+        if identifier is None:
+            return None
+        raise UnsupportedDocument
+
+    if not id_in_ns:
+        raise UnsupportedDocument
+    if isinstance(prov_type, QName):
+        if prov_type.uri not in _AGENT_TYPES:
+            raise UnsupportedDocument
+        prov_type = _AGENT_TYPES[prov_type.uri]
+    elif type_in_ns:
+        prov_type = prov_type[len(ns_prefix):]
+    else:
+        raise UnsupportedDocument
+
+    definition = plan[_PLAN_KEYS[record.record_type]].get(prov_type)
+    if definition is None or \
+            definition.id_regex.match(identifier.localpart) is None:
+        raise UnsupportedDocument
+
+    if len(record.labels) != 1 or (definition.label != "*" and
+                                   definition.label != record.labels[0]):
+        raise UnsupportedDocument
+
+    names = set(_i[0] for _i in record.attributes)
+    if not definition.required.issubset(names):
+        raise UnsupportedDocument
+
+    for name, value in record.attributes:
+        this_def = definition.attributes.get(name)
+        if this_def is None:
+            if not definition.other_attributes_allowed:
+                raise UnsupportedDocument
+            continue
+        for checker in this_def.checkers:
+            try:
+                if checker(value) is True:
+                    break
+            except:
+                continue
+        else:
+            raise UnsupportedDocument
+        if this_def.pattern is not None and \
+                this_def.pattern.match(value) is None:
+            raise UnsupportedDocument
+
+    return identifier.localpart
+
+
+def validate_native_document(doc, plan):
+    """
+    Run the SEIS-PROV checks of a validation on a natively read document.
+
+    Only documents that pass all checks are validated natively, the
+    validation has to fall back to the prov package otherwise so the errors
+    are always the same. Returns ``False`` in that case. The warnings of
+    valid documents are logged as usual.
+
+    :param doc: The :class:`NativeDocument`.
+    :param plan: The compiled validation plan, see
+        :func:`~seis_prov_validate.validator._get_validation_plan`.
+    """
+    prefix = doc.seis_prov_prefix
+    if prefix is None:
+        _log_warning("The document is a valid W3C PROV document but not a "
+                     "single SEIS-PROV record has been found.")
+        return True
+
+    seis_prov_record = False
+    with _phase("records"):
+        try:
+            for records in [doc.records] + [_i[1] for _i in doc.bundles]:
+                for record in records:
+                    if _check_record(record, plan, prefix) is not None:
+                        seis_prov_record = True
+        except UnsupportedDocument:
+            return False
+
+    if not seis_prov_record:
+        _log_warning("The document is a valid W3C PROV document but not a "
+                     "single SEIS-PROV record has been found.")
+        return True
+
+    with _phase("identifiers"):
+        index = IdentifierIndex()
+        for name, uri in doc.namespaces.items():
+            index.add_namespace(name, uri)
+        for bundle, records in [(None, doc.records)] + doc.bundles:
+            if bundle is not None:
+                index.add_definition(bundle.namespace, bundle.localpart,
+                                     "bundle")
+                bundle = bundle.uri
+            for record in records:
+                if record.record_type in ELEMENT_TYPES:
+                    index.add_definition(
+                        record.identifier.namespace,
+                        record.identifier.localpart, record.record_type,
+                        bundle=bundle)
+                elif record.record_type in REFERENCE_ATTRIBUTES:
+                    index.add_relation(
+                        record.record_type,
+                        [(_i[0], (_i[1].namespace, _i[1].localpart))
+                         for _i in record.references], bundle=bundle)
+
+        if index.duplicates(namespace=SEIS_PROV_NAMESPACE):
+            return False
+
+        dangling = sorted(set(
+            index.get_name(_i[2]) for _i in index.dangling_references(
+                namespace=SEIS_PROV_NAMESPACE)))
+    if dangling:
+        _log_warning("The following ids in the SEIS-PROV namespace are "
+                     "referenced by relations but not defined in the "
+                     "document: %s" % ", ".join("'%s'" % _i
+                                                for _i in dangling))
+    return True
@@ -0,0 +1,356 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+HTTP validation service for tools not written in Python.
+
+Documents are POSTed to ``/validate`` and the result is returned as JSON.
+Validation options are passed as query parameters:
+
+    $ curl --data-binary @file.xml \\
+          "http://localhost:8642/validate?all_errors=1"
+    {"is_valid": false, "errors": [...], "warnings": [], "stats": null}
+
+The validations run in a pool of worker processes that is forked once at
+startup and keeps all schemas compiled. Validations not finished within the
+timeout, e.g. because their worker died, are answered with a 503 and the
+pool is replaced. ``/metrics`` returns the request counts, a histogram of
+the latencies, and the current queue depth as JSON. The service only
+listens on localhost.
+
+:copyright:
+    Lion Krischer (lion.krischer@googlemail.com), 2015
+:license:
+    BSD 3-Clause ("BSD New" or "BSD Simplified")
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import io
+import json
+import threading
+import time
+
+from six.moves import BaseHTTPServer, socketserver
+from six.moves.urllib.parse import parse_qsl, urlparse
+
+from .batch import _init_worker
+from .validator import _wall_time, validate
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8642
+
+# Larger request bodies are rejected.
+DEFAULT_MAX_SIZE = 100 * 1024 * 1024
+
+# Seconds a request waits for its validation including the time spent
+# waiting for a free worker.
+DEFAULT_TIMEOUT = 300.0
+
+# Seconds between checks whether the pool of a waiting request was replaced.
+_POLL_INTERVAL = 0.1
+
+# Upper bounds of the latency histogram buckets in seconds.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0)
+
+# Options clients can pass on to the validation and their types.
+OPTIONS = {"xsd_roundtrip": bool, "streaming": bool, "all_errors": bool,
+           "max_errors": int, "stats": bool}
+
+
+def _parse_options(query):
+    """
+    Convert the query parameters to validation options. Raises a
+    ``ValueError`` for unknown options or values.
+    """
+    options = {}
+    for key, value in parse_qsl(query, keep_blank_values=True):
+        if key not in OPTIONS:
+            raise ValueError("Unknown option '%s'." % key)
+        if OPTIONS[key] is bool:
+            if value.lower() in ("", "1", "true", "yes"):
+                options[key] = True
+            elif value.lower() in ("0", "false", "no"):
+                options[key] = False
+            else:
+                raise ValueError("Invalid value '%s' for option '%s'." % (
+                    value, key))
+        else:
+            try:
+                options[key] = int(value)
+            except ValueError:
+                raise ValueError("Invalid value '%s' for option '%s'." % (
+                    value, key))
+    return options
+
+
+def _validate_bytes(data, options):
+    """
+    Runs in the worker processes.
+    """
+    result = validate(io.BytesIO(data), **options)
+    return {"is_valid": result.is_valid, "errors": result.errors,
+            "warnings": result.warnings, "stats": result.stats}
+
+
+class _PoolError(Exception):
+    """
+    The worker pool could not finish a validation.
+    """
+    pass
+
+
+class _Metrics(object):
+    """
+    Request counts and latencies. Shared by all request threads.
+    """
+    def __init__(self, workers):
+        self.workers = workers
+        self.started = time.time()
+        self.requests = {}
+        self.results = {"valid": 0, "invalid": 0}
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+        self.in_flight = 0
+        self.pool_restarts = 0
+        self._lock = threading.Lock()
+
+    def count_request(self, path, status):
+        with self._lock:
+            key = "%s %i" % (path, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+    def start_validation(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def finish_validation(self, latency, is_valid=None):
+        with self._lock:
+            self.in_flight -= 1
+            if is_valid is None:
+                return
+            self.results["valid" if is_valid else "invalid"] += 1
+            self.latency_sum += latency
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if latency <= bound:
+                    break
+            else:
+                i = len(LATENCY_BUCKETS)
+            self.buckets[i] += 1
+
+    def count_pool_restart(self):
+        with self._lock:
+            self.pool_restarts += 1
+
+    def to_dict(self):
+        with self._lock:
+            # Cumulative like Prometheus histograms.
+            buckets = []
+            count = 0
+            for bound, value in zip(LATENCY_BUCKETS + ("+Inf",),
+                                    self.buckets):
+                count += value
+                buckets.append({"le": bound, "count": count})
+            return {
+                "uptime": time.time() - self.started,
+                "workers": self.workers,
+                "requests": dict(self.requests),
+                "results": dict(self.results),
+                "latency": {"buckets": buckets, "count": count,
+                            "sum": self.latency_sum},
+                "in_flight": self.in_flight,
+                # Validations waiting for a free worker.
+                "queue_depth": max(0, self.in_flight - self.workers),
+                "pool_restarts": self.pool_restarts}
+
+
+class _RequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    server_version = "seis-prov-validate"
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/metrics":
+            self._respond(200, self.server.metrics.to_dict())
+        else:
+            self._respond(404, {"error": "Not found."})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/validate":
+            self._respond(404, {"error": "Not found."})
+            return
+        try:
+            options = _parse_options(url.query)
+        except ValueError as e:
+            self._respond(400, {"error": str(e)})
+            return
+        if "Content-Length" not in self.headers:
+            self._respond(411, {"error": "Content-Length is required."})
+            return
+        try:
+            length = int(self.headers["Content-Length"])
+        except ValueError:
+            length = -1
+        if length < 0:
+            self._respond(400, {"error": "Invalid Content-Length."})
+            return
+        if length > self.server.max_size:
+            self._respond(413, {"error": "Documents are limited to %i "
+                                         "bytes." % self.server.max_size})
+            return
+        data = self.rfile.read(length)
+
+        if self.server.cache is not None:
+            options["cache"] = self.server.cache
+
+        metrics = self.server.metrics
+        metrics.start_validation()
+        start = _wall_time()
+        is_valid = None
+        try:
+            response = self.server.run(data, options)
+            status, is_valid = 200, response["is_valid"]
+        except _PoolError as e:
+            status, response = 503, {"error": str(e)}
+        except Exception as e:
+            status, response = 500, {"error": "Validation failed: %s" % e}
+        finally:
+            metrics.finish_validation(_wall_time() - start, is_valid)
+        self._respond(status, response)
+
+    def _respond(self, status, response):
+        self.server.metrics.count_request(urlparse(self.path).path, status)
+        body = json.dumps(response).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            BaseHTTPServer.BaseHTTPRequestHandler.log_message(
+                self, format, *args)
+
+
+class ValidationService(socketserver.ThreadingMixIn,
+                        BaseHTTPServer.HTTPServer):
+    """
+    HTTP validation service.
+
+    The worker processes are forked before the service starts listening and
+    compile all schemas right away so the first requests are as fast as all
+    others. Each connection is handled by its own thread waiting for a
+    worker.
+
+    :param port: The port to listen on. 0 picks a free one, see
+        :attr:`port`.
+    :param workers: The number of worker processes. 0 or ``None`` uses all
+        available cores.
+    :param cache: A :class:`~seis_prov_validate.cache.ResultCache` used for
+        all validations.
+    :param max_size: Maximum size of a document in bytes.
+    :param host: The host to listen on.
+    :param quiet: Do not log the requests.
+    :param timeout: Seconds a request waits for its validation. ``None``
+        waits forever.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port=DEFAULT_PORT, workers=None, cache=None,
+                 max_size=DEFAULT_MAX_SIZE, host=DEFAULT_HOST, quiet=False,
+                 timeout=DEFAULT_TIMEOUT):
+        import multiprocessing
+
+        if not workers:
+            workers = multiprocessing.cpu_count()
+        self.workers = workers
+        self.cache = cache
+        self.max_size = max_size
+        self.quiet = quiet
+        self.timeout = timeout
+        self.metrics = _Metrics(workers)
+        self._pool_lock = threading.Lock()
+        self.pool = self._create_pool()
+        try:
+            BaseHTTPServer.HTTPServer.__init__(self, (host, port),
+                                               _RequestHandler)
+        except:
+            self.pool.terminate()
+            self.pool.join()
+            raise
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def _create_pool(self):
+        import multiprocessing
+        return multiprocessing.Pool(processes=self.workers,
+                                    initializer=_init_worker)
+
+    def _restart_pool(self, pool):
+        """
+        Replace the pool unless another request already did. Requests still
+        waiting for the old pool fail.
+        """
+        with self._pool_lock:
+            if self.pool is not pool:
+                return
+            self.pool = self._create_pool()
+        self.metrics.count_pool_restart()
+        pool.terminate()
+        pool.join()
+
+    def run(self, data, options):
+        """
+        Validate a document in one of the workers. Raises a ``_PoolError``
+        if the validation did not finish in time or the pool was replaced
+        meanwhile.
+        """
+        pool = self.pool
+        result = pool.apply_async(_validate_bytes, (data, options))
+        start = _wall_time()
+        while True:
+            result.wait(_POLL_INTERVAL)
+            if result.ready():
+                return result.get()
+            if self.pool is not pool:
+                raise _PoolError("The worker pool was restarted.")
+            if self.timeout is not None and \
+                    _wall_time() - start > self.timeout:
+                self._restart_pool(pool)
+                raise _PoolError("Validation did not finish within %g "
+                                 "seconds." % self.timeout)
+
+    def server_close(self):
+        BaseHTTPServer.HTTPServer.server_close(self)
+        with self._pool_lock:
+            pool = self.pool
+        pool.terminate()
+        pool.join()
+
+
+def serve(port=DEFAULT_PORT, workers=None, cache=None,
+          timeout=DEFAULT_TIMEOUT):
+    """
+    Run the HTTP validation service until it is interrupted.
+
+    :param port: The port to listen on.
+    :param workers: The number of worker processes. 0 or ``None`` uses all
+        available cores.
+    :param cache: A :class:`~seis_prov_validate.cache.ResultCache` used for
+        all validations.
+    :param timeout: Seconds a request waits for its validation.
+    """
+    server = ValidationService(port, workers=workers, cache=cache,
+                               timeout=timeout)
+    print("Validation service listening on http://%s:%i/validate" % (
+        server.server_address[0], server.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,626 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Streaming validation of SEIS-PROV files.
+
+The records are validated one by one as they are read from the file and
+discarded afterwards so the memory usage does not depend on the size of the
+file. Only the identifiers of all records and the references between them
+are kept for the checks across records.
+
+:copyright:
+    Lion Krischer (lion.krischer@googlemail.com), 2015
+:license:
+    BSD 3-Clause ("BSD New" or "BSD Simplified")
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import codecs
+import json
+import re
+
+from lxml import etree
+import six
+import prov.constants
+import prov.model
+from prov.serializers.provjson import (decode_json_container,
+                                       decode_json_document)
+# Reading single PROV-XML records requires helpers of the prov package that
+# are not part of its public API. They are the same in all versions from 1.4
+# to 3.x, newer versions are thus excluded in setup.py.
+from prov.serializers.provxml import (
+    FULL_PROV_RECORD_IDS_MAP, _extract_attributes, xml_qname_to_QualifiedName)
+
+from .identifier_index import IdentifierIndex
+from .validator import (SEIS_PROV_NAMESPACE, _get_stats,
+                        _get_validation_plan, _get_xsd_schema, _log_error,
+                        _log_warning, _check_record, _phase,
+                        _validate_against_xsd_scheme, _validate_identifiers)
+
+_PROV_NS = prov.constants.PROV.uri
+_DOCUMENT_TAG = "{%s}document" % _PROV_NS
+_BUNDLE_TAG = "{%s}bundleContent" % _PROV_NS
+_OTHER_TAG = "{%s}other" % _PROV_NS
+_ID_ATTRIB = "{%s}id" % _PROV_NS
+_XSI_TYPE_ATTRIB = "{http://www.w3.org/2001/XMLSchema-instance}type"
+
+# The prov package caches all qualified names in their namespaces. The
+# document records are created in is thus replaced after this many records to
+# keep the memory usage constant.
+_CONTAINER_SIZE = 1000
+
+# Number of bytes read from PROV-JSON files at once.
+_JSON_CHUNK_SIZE = 65536
+# Number of PROV-JSON records that are converted and validated against the
+# PROV-XML schema together.
+_JSON_BATCH_SIZE = 100
+
+_JSON_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class _StreamState(object):
+    """
+    Everything that has to be kept while streaming through a document.
+    """
+    def __init__(self):
+        with _phase("schemas"):
+            self.plan = _get_validation_plan()
+        self.stats = _get_stats()
+        self.index = IdentifierIndex()
+        # Records are created in the context of this document but never
+        # added to it. It only collects the namespaces.
+        self.container = prov.model.ProvDocument()
+        self.container_count = 0
+        self.ns = None
+        self.record_count = 0
+        self.seis_prov_record_count = 0
+        # Records that have to be validated if the SEIS-PROV namespace
+        # becomes active later on.
+        self.pending = []
+
+    def find_namespace(self):
+        """
+        The SEIS-PROV namespace only becomes active once a record uses it -
+        this mirrors the behaviour of a complete prov document.
+        """
+        if self.ns is None:
+            for ns in self.container.namespaces:
+                if ns.uri == SEIS_PROV_NAMESPACE:
+                    self.ns = ns
+                    break
+        return self.ns
+
+    def add_record(self, record, bundle, seis_prov_prefixes=()):
+        """
+        Add a record and validate it.
+
+        :param record: The prov record.
+        :param bundle: The identifier of the bundle of the record.
+        :param seis_prov_prefixes: The prefixes bound to the SEIS-PROV
+            namespace at the record's position in the file.
+        """
+        if bundle is None:
+            self.record_count += 1
+        if self.stats is not None:
+            self.stats.records += 1
+        self.index.add_record(record, bundle=bundle)
+
+        if self.ns is None:
+            if self.find_namespace() is None:
+                # A string prov:type with a SEIS-PROV prefix only matters if
+                # the namespace is used by any record in the document.
+                if _has_prefixed_type(record, seis_prov_prefixes):
+                    self.pending.append(record)
+                return
+            pending, self.pending = self.pending, []
+            for r in pending:
+                self.validate_record(r)
+        self.validate_record(record)
+
+        self.container_count += 1
+        if self.container_count >= _CONTAINER_SIZE:
+            self.reset_container()
+
+    def add_bundle(self, bundle_id):
+        """
+        Add the definition of a bundle.
+
+        :param bundle_id: The qualified name of the bundle.
+        """
+        self.index.add_definition(bundle_id.namespace.uri,
+                                  bundle_id.localpart, "bundle")
+        if self.stats is not None:
+            self.stats.bundles += 1
+
+    def reset_container(self):
+        for ns in self.container.namespaces:
+            self.index.add_namespace(ns.prefix, ns.uri)
+        self.container = prov.model.ProvDocument()
+        self.container_count = 0
+
+    def validate_record(self, record):
+        with _phase("records"):
+            if _check_record(record, self.plan, self.ns) is not None:
+                self.seis_prov_record_count += 1
+
+    def finalize(self):
+        """
+        All checks that can only be performed once all records are known.
+        """
+        if not self.record_count:
+            _log_error("File does not contain a single provenance record.")
+
+        ns = self.find_namespace()
+        if ns is None or not self.seis_prov_record_count:
+            _log_warning("The document is a valid W3C PROV document but not a "
+                         "single SEIS-PROV record has been found.")
+            return
+
+        with _phase("identifiers"):
+            self.reset_container()
+            _validate_identifiers(self.index, ns=self.ns)
+
+
+def _has_prefixed_type(record, prefixes):
+    """
+    Check if any prov:type of a record is a string starting with one of the
+    given prefixes.
+    """
+    for t in record.get_asserted_types():
+        if isinstance(t, prov.model.Literal):
+            t = t.value
+        if isinstance(t, six.string_types) and \
+                any(t.startswith("%s:" % _i) for _i in prefixes):
+            return True
+    return False
+
+
+def _check_schema_errors(error_log):
+    """
+    Raise if the schema validation during parsing found a problem.
+
+    Errors are only raised by lxml once a larger chunk of the file has been
+    parsed. Checking the log before each record ensures schema errors are
+    reported first, like in the complete validation.
+    """
+    errors = error_log.filter_domains([etree.ErrorDomains.SCHEMASV])
+    if errors:
+        _log_error("SEIS-PROV document did not pass validation against the "
+                   "PROV-XML schema:\n\t%s" % "\n\t".join(
+                       str(i) for i in errors))
+
+
+def _xml_element_to_record(element, container):
+    """
+    Convert a single PROV-XML element to a prov record without adding it
+    to any document. Follows what the prov package does when reading a
+    complete file.
+    """
+    qname = etree.QName(element)
+    if qname.namespace != _PROV_NS:
+        raise prov.Error("Non PROV element discovered in document or bundle.")
+
+    rec_id = element.attrib.get(_ID_ATTRIB, None)
+    rec_id = xml_qname_to_QualifiedName(element, rec_id) \
+        if rec_id is not None else None
+
+    attributes = _extract_attributes(element)
+
+    # Map the record type to its base type.
+    q_prov_name = FULL_PROV_RECORD_IDS_MAP[qname.localname]
+    rec_type = prov.constants.PROV_BASE_CLS[q_prov_name]
+
+    if _XSI_TYPE_ATTRIB in element.attrib:
+        attributes.append((
+            prov.constants.PROV_TYPE,
+            xml_qname_to_QualifiedName(element,
+                                       element.attrib[_XSI_TYPE_ATTRIB])))
+
+    record = prov.model.PROV_REC_CLS[rec_type](
+        container,
+        container.valid_qualified_name(rec_id) if rec_id else None,
+        attributes)
+
+    # Add the actual type in case a base type has been used.
+    if rec_type != q_prov_name:
+        record.add_asserted_type(q_prov_name)
+    return record
+
+
+def _has_doctype(file_object):
+    """
+    Check if a PROV-XML file has a document type declaration. Only reads
+    the file up to the root element and restores the position of the file
+    object afterwards.
+
+    :param file_object: Open file or file-like object.
+    """
+    position = file_object.tell()
+    try:
+        for _, element in etree.iterparse(
+                file_object, events=("start",), resolve_entities=False,
+                no_network=True):
+            return bool(element.getroottree().docinfo.doctype)
+    except etree.XMLSyntaxError:
+        pass
+    finally:
+        file_object.seek(position, 0)
+    return False
+
+
+def validate_xml_stream(file_object):
+    """
+    Validate a PROV-XML file while reading it.
+
+    The file is validated against the PROV-XML schema while it is being
+    parsed and each record is checked against the SEIS-PROV definitions as
+    soon as it has been read.
+
+    Errors are reported in the order in which they appear in the file so
+    the first reported error might differ from the one reported by a
+    complete validation.
+
+    :param file_object: Open file or file-like object.
+    """
+    state = _StreamState()
+    with _phase("xsd"):
+        schema = _get_xsd_schema()
+    # Do not pass resolve_entities=False - in combination with a schema
+    # lxml then silently ignores syntax errors. The schema validation is
+    # part of the parsing.
+    parser = etree.iterparse(
+        file_object, events=("start", "end"), schema=schema,
+        remove_comments=True, no_network=True)
+
+    # Depth of the current element. The root document is at depth 1.
+    depth = 0
+    # Depth at which records are found. Changes within bundles.
+    record_depth = 2
+    bundle = None
+    seen_root = False
+
+    try:
+        for event, element in parser:
+            if event == "start":
+                depth += 1
+                if depth == 1:
+                    seen_root = True
+                    if element.tag != _DOCUMENT_TAG:
+                        break
+                elif depth == 2 and element.tag == _BUNDLE_TAG:
+                    bundle_id = element.attrib.get(_ID_ATTRIB)
+                    if bundle_id is None:
+                        _log_error("Could not parse the file: The bundle in "
+                                   "line %i does not have an id." %
+                                   element.sourceline)
+                    try:
+                        bundle_id = xml_qname_to_QualifiedName(element,
+                                                               bundle_id)
+                    except Exception as e:
+                        _log_error("Could not parse the file with the prov "
+                                   "Python library due to: the following "
+                                   "PROV error message: %s" % (repr(e)))
+                    bundle = bundle_id.uri
+                    state.add_bundle(bundle_id)
+                    record_depth = 3
+                continue
+
+            depth -= 1
+            if depth == 1 and element.tag == _BUNDLE_TAG:
+                bundle = None
+                record_depth = 2
+            elif depth != record_depth - 1:
+                continue
+            elif element.tag != _OTHER_TAG:
+                _check_schema_errors(parser.error_log)
+                try:
+                    with _phase("prov"):
+                        record = _xml_element_to_record(element,
+                                                        state.container)
+                except Exception as e:
+                    _log_error("Could not parse the file with the prov Python "
+                               "library due to: the following PROV error "
+                               "message: %s" % (repr(e)))
+                prefixes = () if state.ns is not None else [
+                    k for k, v in element.nsmap.items()
+                    if v == SEIS_PROV_NAMESPACE]
+                state.add_record(record, bundle, prefixes)
+
+            # Free everything that has been processed.
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+    except etree.XMLSyntaxError:
+        if not parser.error_log.filter_domains(
+                [etree.ErrorDomains.SCHEMASV]):
+            _log_error("File is neither a valid JSON nor a valid XML file.")
+        # Cannot be a provenance document if the root element is wrong.
+        if not seen_root:
+            _log_error("File does not contain a single provenance record.")
+        _check_schema_errors(parser.error_log)
+
+    state.finalize()
+
+
+class _JSONStreamReader(object):
+    """
+    Minimal incremental reader for JSON files.
+
+    Only the structure of objects is read step by step - all other values
+    are decoded in one go with the JSON decoder of the standard library.
+    """
+    def __init__(self, file_object, chunk_size=_JSON_CHUNK_SIZE):
+        self._file = file_object
+        self._chunk_size = chunk_size
+        self._text_decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        self._json_decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def _read(self, size):
+        data = self._file.read(size)
+        if not data:
+            self._eof = True
+        text = self._text_decoder.decode(data, final=self._eof)
+        # Drop everything that has already been processed.
+        self._buffer = self._buffer[self._pos:] + text
+        self._pos = 0
+
+    def peek(self):
+        """
+        Returns the next non-whitespace character or an empty string at the
+        end of the file.
+        """
+        while True:
+            self._pos = _JSON_WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if self._eof:
+                return ""
+            self._read(self._chunk_size)
+
+    def _expect(self, char):
+        if self.peek() != char:
+            raise ValueError("Expecting '%s' at position %i." % (
+                char, self._pos))
+        self._pos += 1
+
+    def decode_value(self):
+        """
+        Decode the next complete JSON value.
+        """
+        self.peek()
+        # Double the amount read each time to stay linear for large values.
+        size = self._chunk_size
+        while True:
+            try:
+                value, end = self._json_decoder.raw_decode(
+                    self._buffer, self._pos)
+            except ValueError:
+                if self._eof:
+                    raise
+                self._read(size)
+                size *= 2
+                continue
+            # Numbers at the end of the buffer might continue in the file.
+            if end == len(self._buffer) and not self._eof:
+                self._read(size)
+                size *= 2
+                continue
+            self._pos = end
+            return value
+
+    def iter_object(self):
+        """
+        Iterate over the keys of the next JSON object. The value of each key
+        has to be consumed before the iteration continues.
+        """
+        self._expect("{")
+        if self.peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            if self.peek() != '"':
+                raise ValueError("Expecting property name at position %i." %
+                                 self._pos)
+            key = self.decode_value()
+            self._expect(":")
+            yield key
+            char = self.peek()
+            self._pos += 1
+            if char == "}":
+                return
+            elif char != ",":
+                raise ValueError("Expecting ',' delimiter at position %i." %
+                                 (self._pos - 1))
+
+    def finish(self):
+        """
+        Make sure nothing but whitespace follows.
+        """
+        if self.peek():
+            raise ValueError("Extra data at position %i." % self._pos)
+
+
+def _iter_json_container(reader, bundle=None):
+    """
+    Walk through a PROV-JSON document or bundle.
+
+    Yields ``(kind, bundle, value)`` tuples with ``kind`` being one of
+    ``"prefix"``, ``"bundle"`` (at the start of each bundle), ``"record"``
+    (``value`` is a ``(record type, identifier, content)`` tuple), or
+    ``"unknown"`` (``value`` is a ``(key, content)`` tuple).
+    """
+    for key in reader.iter_object():
+        if key == "prefix":
+            yield "prefix", bundle, reader.decode_value()
+        elif key == "bundle" and bundle is None:
+            for bundle_id in reader.iter_object():
+                yield "bundle", bundle_id, None
+                for _i in _iter_json_container(reader, bundle=bundle_id):
+                    yield _i
+        elif key in prov.constants.PROV_RECORD_IDS_MAP:
+            for rec_id in reader.iter_object():
+                yield "record", bundle, (key, rec_id, reader.decode_value())
+        else:
+            yield "unknown", bundle, (key, reader.decode_value())
+
+
+def _iter_json_stream(file_object):
+    """
+    Iterate over a PROV-JSON file, see :func:`_iter_json_container`.
+    Invalid JSON files result in an error.
+    """
+    reader = _JSONStreamReader(file_object)
+    try:
+        if reader.peek() != "{":
+            # Not a PROV-JSON document. Let prov judge it.
+            value = reader.decode_value()
+            reader.finish()
+            yield "unknown", None, (None, value)
+            return
+        for _i in _iter_json_container(reader):
+            yield _i
+        reader.finish()
+    except ValueError:
+        _log_error("File is neither a valid JSON nor a valid XML file.")
+
+
+class _JSONBatch(object):
+    """
+    PROV-JSON records of one document or bundle that are converted to prov
+    records together.
+    """
+    def __init__(self, prefixes, bundle=None, bundle_uri=None):
+        self.prefixes = prefixes
+        self.bundle = bundle
+        self.bundle_uri = bundle_uri
+        self.content = {}
+        self.count = 0
+
+    def add(self, rec_type, rec_id, content):
+        records = self.content.setdefault(rec_type, {})
+        if rec_id in records:
+            # Multiple records with the same identifier.
+            if not isinstance(records[rec_id], list):
+                records[rec_id] = [records[rec_id]]
+            records[rec_id].extend(
+                content if isinstance(content, list) else [content])
+        else:
+            records[rec_id] = content
+        self.count += 1
+
+    def decode(self):
+        """
+        Convert the records and validate them against the PROV-XML schema.
+        """
+        doc = prov.model.ProvDocument()
+        content = dict(self.content)
+        content["prefix"] = dict(self.prefixes)
+        try:
+            with _phase("prov"):
+                decode_json_container(content, doc)
+        except Exception as e:
+            _log_error("Could not parse the file with the prov Python library "
+                       "due to: the following PROV error message: %s" % (
+                           repr(e)))
+        _validate_against_xsd_scheme(doc)
+        return doc._records
+
+
+def validate_json_stream(file_object):
+    """
+    Validate a PROV-JSON file while reading it.
+
+    The file is read twice: once to collect the namespace prefixes which
+    can appear anywhere in a document or bundle and once to validate the
+    records. Records are converted and checked against the PROV-XML schema
+    in small batches and each record is checked against the SEIS-PROV
+    definitions as soon as it has been read.
+
+    Errors are reported in the order in which they appear in the file so
+    the first reported error might differ from the one reported by a
+    complete validation.
+
+    :param file_object: Open and seekable file or file-like object.
+    """
+    start = file_object.tell()
+
+    # First pass: The prefixes of the document and all bundles.
+    prefixes = {None: {}}
+    for kind, bundle, value in _iter_json_stream(file_object):
+        if kind == "prefix" and isinstance(value, dict):
+            prefixes.setdefault(bundle, {}).update(value)
+
+    state = _StreamState()
+    for bundle_prefixes in prefixes.values():
+        for prefix, uri in bundle_prefixes.items():
+            state.index.add_namespace(prefix, uri)
+    # Unlike in PROV-XML, all prefixes of the root document are always
+    # registered.
+    for prefix, uri in prefixes[None].items():
+        if uri == SEIS_PROV_NAMESPACE:
+            state.ns = prov.model.Namespace(prefix, uri)
+            break
+    # Used to resolve the bundle identifiers.
+    root = prov.model.ProvDocument()
+    for prefix, uri in prefixes[None].items():
+        if prefix != "default":
+            root.add_namespace(prefix, uri)
+
+    def flush(batch):
+        for record in batch.decode():
+            state.add_record(record, batch.bundle_uri)
+
+    def new_batch(bundle):
+        if bundle is None:
+            return _JSONBatch(prefixes[None])
+        bundle_prefixes = dict(prefixes[None])
+        bundle_prefixes.update(prefixes.get(bundle, {}))
+        return _JSONBatch(bundle_prefixes, bundle, bundle_uris[bundle])
+
+    # Second pass: Validate all records.
+    file_object.seek(start, 0)
+    bundle_uris = {}
+    batch = new_batch(None)
+    for kind, bundle, value in _iter_json_stream(file_object):
+        if kind == "record":
+            if bundle != batch.bundle:
+                flush(batch)
+                batch = new_batch(bundle)
+            batch.add(*value)
+            if batch.count >= _JSON_BATCH_SIZE:
+                flush(batch)
+                batch = new_batch(bundle)
+        elif kind == "bundle":
+            try:
+                bundle_id = root.valid_qualified_name(bundle)
+            except Exception as e:
+                _log_error("Could not parse the file with the prov Python "
+                           "library due to: the following PROV error "
+                           "message: %s" % (repr(e)))
+            # Ids with undeclared prefixes.
+            if bundle_id is None:
+                _log_error("Could not parse the file: The bundle '%s' does "
+                           "not have a valid identifier." % bundle)
+            bundle_uris[bundle] = bundle_id.uri
+            state.add_bundle(bundle_id)
+        elif kind == "unknown" or (kind == "prefix" and
+                                   not isinstance(value, dict)):
+            # prov raises the appropriate error.
+            key, content = value if kind == "unknown" else (kind, value)
+            try:
+                if key is None:
+                    decode_json_document(content, prov.model.ProvDocument())
+                else:
+                    decode_json_container({key: content},
+                                          prov.model.ProvDocument())
+            except Exception as e:
+                _log_error("Could not parse the file with the prov Python "
+                           "library due to: the following PROV error "
+                           "message: %s" % (repr(e)))
+    flush(batch)
+
+    state.finalize()
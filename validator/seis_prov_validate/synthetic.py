@@ -0,0 +1,598 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Generator of synthetic SEIS-PROV documents.
+
+All records are built from the SEIS-PROV definitions: every attribute is set
+to the example value of its definition with the first of its types. The
+documents emulate the processing chains of the examples in the definition
+and can be made arbitrarily large. They are written to disk record by record
+so the memory usage does not depend on their size.
+
+Scenarios:
+
+* ``processing``: Waveform traces processed by ObsPy with a chain of
+  activities, e.g. detrend, lowpass filter, and decimate. Each activity is
+  associated with the software agent, uses the previous trace, and generates
+  the next one.
+* ``adjoint``: Synthetic waveform traces of a waveform simulation run by a
+  person with SPECFEM, processed with a chain of activities, and compared to
+  observed traces to calculate adjoint sources.
+* ``parameters``: The input parameters of one waveform simulation per trace,
+  each with a configurable number of parameters.
+
+Rule violations can be injected into a controlled fraction of the records to
+produce invalid documents with known errors.
+
+$ python -m seis_prov_validate.synthetic corpus.xml --traces 100000
+$ python -m seis_prov_validate.synthetic corpus.json --bundles 10 \
+      --violations label=0.01,pattern=0.01
+
+:copyright:
+    Lion Krischer (lion.krischer@googlemail.com), 2015
+:license:
+    BSD 3-Clause ("BSD New" or "BSD Simplified")
+"""
+from __future__ import (absolute_import, division, print_function,
+                        unicode_literals)
+
+import collections
+import io
+import itertools
+import json
+import random
+import shutil
+import tempfile
+from xml.sax.saxutils import escape
+
+from .validator import SEIS_PROV_NAMESPACE, _check_json_schema
+
+SCENARIOS = ("processing", "adjoint", "parameters")
+
+# The processing chain of the detailed processing chain example.
+DEFAULT_CHAIN = ("detrend", "lowpass_filter", "decimate")
+
+# All rule violations that can be injected.
+VIOLATIONS = ("label", "id", "missing_attribute", "additional_attribute",
+              "type", "pattern", "duplicate_id")
+
+# The element names of the agent types in PROV-XML and their prov:type in
+# PROV-JSON.
+_AGENT_TYPES = {
+    "person": ("person", "prov:Person"),
+    "software_agent": ("softwareAgent", "prov:SoftwareAgent"),
+    "organization": ("organization", "prov:Organization")}
+
+# The keys of the records in PROV-JSON containers.
+_JSON_KEYS = {
+    "person": "agent",
+    "softwareAgent": "agent",
+    "organization": "agent"}
+
+# Some input parameters of the adjoint source example.
+_INPUT_PARAMETERS = (
+    ("SIMULATION_TYPE", 1, "xsd:int"),
+    ("NCHUNKS", 1, "xsd:int"),
+    ("ANGULAR_WIDTH_XI_IN_DEGREES", 90.0, "xsd:double"),
+    ("ANGULAR_WIDTH_ETA_IN_DEGREES", 90.0, "xsd:double"),
+    ("NEX_XI", 240, "xsd:int"),
+    ("NEX_ETA", 240, "xsd:int"))
+
+_COMPONENTS = "ZNE"
+
+_SPECFEM = {
+    "software_name": "SPECFEM3D GLOBE", "software_version": "7.0.0",
+    "website": "http://geodynamics.org/cig/software/specfem3d", "doi": None}
+
+# Types and values of generated input parameters.
+_PARAMETER_TYPES = (("xsd:int", lambda i: i),
+                    ("xsd:double", lambda i: i + 0.5),
+                    ("xsd:string", lambda i: "value_%i" % i))
+
+
+class CorpusGenerator(object):
+    """
+    Generator of synthetic SEIS-PROV documents.
+
+    Records are ``(record_type, identifier, attributes, violation)`` tuples.
+    Identifiers are ``None`` for relations, attributes are lists of
+    ``(name, value, xsd_type)`` tuples with ``xsd_type`` being ``None`` for
+    ``prov:label``, ``prov:type``, and references to other records.
+    ``violation`` is the name of the injected violation or ``None``.
+
+    :param traces: The number of waveform traces.
+    :param scenario: The scenario, one of :data:`SCENARIOS`.
+    :param chain: The names of the activities applied to each trace.
+    :param bundles: The number of bundles the traces are distributed over.
+        All records are part of the document itself if zero.
+    :param violations: Dictionary mapping names of :data:`VIOLATIONS` to the
+        fraction of records they are injected into. Duplicate ids reuse ids
+        of the previous bundle and thus require bundles.
+    :param seed: Seed of the random numbers used to inject violations.
+    :param parameters: The number of parameters of each input parameters
+        record. Defaults to some of the parameters of the adjoint source
+        example.
+    """
+    def __init__(self, traces=1, scenario="processing", chain=DEFAULT_CHAIN,
+                 bundles=0, violations=None, seed=None, parameters=None):
+        if scenario not in SCENARIOS:
+            raise ValueError("Unknown scenario '%s'. Available: %s" % (
+                scenario, ", ".join(SCENARIOS)))
+        violations = dict(violations or {})
+        for name in violations:
+            if name not in VIOLATIONS:
+                raise ValueError("Unknown violation '%s'. Available: %s" % (
+                    name, ", ".join(VIOLATIONS)))
+
+        schema = _check_json_schema()
+        self.definitions = {}
+        for key in ("entities", "activities", "agents"):
+            self.definitions.update(schema[key])
+        for name in chain:
+            if name not in schema["activities"]:
+                raise ValueError("'%s' is not a SEIS-PROV activity." % name)
+
+        self.traces = traces
+        self.scenario = scenario
+        self.chain = tuple(chain)
+        self.bundles = bundles
+        self.violations = violations
+        self.seed = seed
+        self.parameters = parameters
+
+    def containers(self):
+        """
+        Yields ``(bundle_id, records)`` tuples. The document itself comes
+        first with a ``bundle_id`` of ``None`` and contains the agents shared
+        by all bundles.
+        """
+        self._random = random.Random(self.seed)
+        self._count = 0
+        # Ids of the current and the previous container for duplicate ids.
+        self._current, self._previous = {}, {}
+        shared = self._shared()
+        if not self.bundles:
+            yield None, itertools.chain(shared,
+                                        self._records(0, self.traces))
+            return
+
+        yield None, iter(shared)
+        per_bundle, remainder = divmod(self.traces, self.bundles)
+        start = 0
+        for i in range(self.bundles):
+            count = per_bundle + (1 if i < remainder else 0)
+            yield "seis_prov:bundle_%i" % i, self._records(start, count)
+            start += count
+
+    def write(self, filename, format=None):
+        """
+        Write a document to a file. Returns a dictionary with the number of
+        records each violation has been injected into.
+
+        :param filename: The filename.
+        :param format: ``"xml"`` or ``"json"``. Determined from the file
+            extension if not given.
+        """
+        if format is None:
+            format = "json" if filename.lower().endswith(".json") else "xml"
+        writer = {"xml": write_xml, "json": write_json}[format]
+        with io.open(filename, "wt", encoding="utf-8") as fh:
+            return writer(fh, self.containers())
+
+    def _identifier(self, step, name):
+        self._count += 1
+        return "seis_prov:sp%03i_%s_%09x" % (
+            step, self.definitions[name]["two_letter_code"], self._count)
+
+    def _record(self, name, step, values=None, extra=()):
+        """
+        A SEIS-PROV record with the example values of its definition.
+
+        :param name: The name of the definition.
+        :param step: The step of the record in its processing chain.
+        :param values: Dictionary of values overwriting the example values.
+        :param extra: Additional attributes.
+        """
+        definition = self.definitions[name]
+        values = values or {}
+        attributes = []
+        for attribute in definition["attributes"]:
+            value = values.get(attribute["name"],
+                               attribute.get("example_value"))
+            if value is None:
+                continue
+            attributes.append(("seis_prov:%s" % attribute["name"], value,
+                               attribute["types"][0]))
+        attributes.extend(extra)
+
+        if definition["type"] == "agent":
+            rec_type = _AGENT_TYPES[name][0]
+            # Agents are labeled with their names.
+            label = [_i[1] for _i in attributes if _i[0] in (
+                "seis_prov:name", "seis_prov:software_name")][0]
+            attributes.insert(0, ("prov:label", label, None))
+        else:
+            rec_type = definition["type"]
+            attributes[:0] = [
+                ("prov:label", definition["label"], None),
+                ("prov:type", "seis_prov:%s" % name, None)]
+
+        record = [rec_type, self._identifier(step, name), attributes, None]
+        self._inject(record, definition)
+        return tuple(record)
+
+    def _inject(self, record, definition):
+        """
+        Inject at most one of the requested violations into a record.
+        """
+        identifier, attributes = record[1], record[2]
+        names = [_i[0] for _i in attributes]
+        for violation in VIOLATIONS:
+            fraction = self.violations.get(violation)
+            if not fraction or self._random.random() >= fraction:
+                continue
+
+            if violation == "label":
+                if definition["label"] == "*":
+                    continue
+                attributes[0] = ("prov:label", "Wrong Label", None)
+            elif violation == "id":
+                record[1] = identifier + "_"
+            elif violation == "missing_attribute":
+                required = ["seis_prov:%s" % _i["name"]
+                            for _i in definition["attributes"]
+                            if _i["required"]]
+                if not required:
+                    continue
+                del attributes[names.index(required[0])]
+            elif violation == "additional_attribute":
+                if definition.get("other_seis_prov_attributes_allowed"):
+                    continue
+                attributes.append(("seis_prov:undefined_attribute",
+                                   "value", "xsd:string"))
+            elif violation == "type":
+                # Only the types of defined attributes are checked.
+                defined = set("seis_prov:%s" % _i["name"]
+                              for _i in definition["attributes"])
+                candidates = [_i for _i, attr in enumerate(attributes)
+                              if attr[0] in defined and
+                              attr[2] not in (None, "xsd:string",
+                                              "xsd:anyURI")]
+                if not candidates:
+                    continue
+                index = candidates[0]
+                attributes[index] = (attributes[index][0], "invalid",
+                                     "xsd:string")
+            elif violation == "pattern":
+                patterns = set("seis_prov:%s" % _i["name"]
+                               for _i in definition["attributes"]
+                               if _i.get("pattern"))
+                candidates = [_i for _i, attr in enumerate(attributes)
+                              if attr[0] in patterns]
+                if not candidates:
+                    continue
+                index = candidates[0]
+                attributes[index] = (attributes[index][0], "invalid",
+                                     attributes[index][2])
+            elif violation == "duplicate_id":
+                # Ids of the previous container as PROV-JSON cannot have
+                # duplicate ids in a single one.
+                if not self._previous.get(definition["name"]):
+                    continue
+                record[1] = self._previous[definition["name"]].pop()
+            record[3] = violation
+            break
+        if "duplicate_id" in self.violations:
+            self._current.setdefault(definition["name"], []).append(
+                record[1])
+
+    def _trace(self, step, index, description):
+        component = _COMPONENTS[index % len(_COMPONENTS)]
+        return self._record("waveform_trace", step, values={
+            "seed_id": "XX.S%04i..BH%s" % (index % 10000, component),
+            "component": component,
+            "description": description})
+
+    def _input_parameters(self, step):
+        if self.parameters is None:
+            parameters = _INPUT_PARAMETERS
+        else:
+            parameters = [
+                ("PARAMETER_%i" % i, _PARAMETER_TYPES[i % 3][1](i),
+                 _PARAMETER_TYPES[i % 3][0]) for i in range(self.parameters)]
+        return self._record("input_parameters", step, extra=[
+            ("seis_prov:%s" % _i[0], _i[1], _i[2]) for _i in parameters])
+
+    def _chain(self, trace, step, index, agent, description):
+        """
+        Apply the processing chain to a trace. Returns the records, the final
+        trace, and its step.
+        """
+        records = []
+        for name in self.chain:
+            activity = self._record(name, step + 1)
+            records.append(activity)
+            records.append(("wasAssociatedWith", None, [
+                ("prov:activity", activity[1], None),
+                ("prov:agent", agent, None)], None))
+            records.append(("used", None, [
+                ("prov:activity", activity[1], None),
+                ("prov:entity", trace[1], None)], None))
+            step += 2
+            trace = self._trace(step, index, description)
+            records.append(trace)
+            records.append(("wasGeneratedBy", None, [
+                ("prov:entity", trace[1], None),
+                ("prov:activity", activity[1], None)], None))
+        return records, trace, step
+
+    def _shared(self):
+        """
+        The agents and inputs shared by all traces. Part of the document
+        itself.
+        """
+        if self.scenario == "parameters":
+            return [self._record("software_agent", 0, values=_SPECFEM)]
+        self._obspy = self._record("software_agent", 0)
+        if self.scenario == "processing":
+            return [self._obspy]
+
+        me = self._record("person", 0, values={
+            "name": "Hans Mustermann", "email": "hans.mustermann@email.com"})
+        other = self._record("person", 0)
+        self._specfem = self._record("software_agent", 0, values=_SPECFEM)
+        self._pyadjoint = self._record("software_agent", 0, values={
+            "software_name": "pyadjoint", "software_version": "0.0.1dev",
+            "website": "http://krischer.github.io/pyadjoint", "doi": None})
+        model = self._record("earth_model", 0)
+        parameters = self._input_parameters(0)
+        constants = self._record("file", 0)
+        self._inputs = (model, parameters, constants)
+        return [me, other, self._specfem, self._obspy, self._pyadjoint,
+                model, parameters, constants,
+                ("actedOnBehalfOf", None, [
+                    ("prov:delegate", self._specfem[1], None),
+                    ("prov:responsible", me[1], None)], None),
+                ("wasAttributedTo", None, [
+                    ("prov:entity", model[1], None),
+                    ("prov:agent", other[1], None)], None)]
+
+    def _records(self, start, count):
+        """
+        The records of the traces ``start`` to ``start + count``.
+        """
+        self._current, self._previous = {}, self._current
+        if self.scenario == "processing":
+            for index in range(start, start + count):
+                trace = self._trace(1, index, "Raw Data")
+                yield trace
+                for record in self._chain(trace, 1, index, self._obspy[1],
+                                          "Raw Data")[0]:
+                    yield record
+            return
+        elif self.scenario == "parameters":
+            for index in range(start, start + count):
+                yield self._input_parameters(1)
+            return
+
+        # A single waveform simulation per container.
+        simulation = self._record("waveform_simulation", 1)
+        yield simulation
+        yield "wasAssociatedWith", None, [
+            ("prov:activity", simulation[1], None),
+            ("prov:agent", self._specfem[1], None)], None
+        for entity in self._inputs:
+            yield "used", None, [("prov:activity", simulation[1], None),
+                                 ("prov:entity", entity[1], None)], None
+
+        for index in range(start, start + count):
+            synthetic = self._trace(1, index, "Synthetic Data")
+            yield synthetic
+            yield "wasGeneratedBy", None, [
+                ("prov:entity", synthetic[1], None),
+                ("prov:activity", simulation[1], None)], None
+            records, synthetic, step = self._chain(
+                synthetic, 1, index, self._obspy[1], "Synthetic Data")
+            for record in records:
+                yield record
+            observed = self._trace(1, index, "Observed Data")
+            yield observed
+
+            step += 1
+            calculation = self._record("calculate_adjoint_source", step)
+            yield calculation
+            yield "wasAssociatedWith", None, [
+                ("prov:activity", calculation[1], None),
+                ("prov:agent", self._pyadjoint[1], None)], None
+            for trace in (synthetic, observed):
+                yield "used", None, [("prov:activity", calculation[1], None),
+                                     ("prov:entity", trace[1], None)], None
+            adjoint_source = self._record("adjoint_source", step + 1)
+            yield adjoint_source
+            yield "wasGeneratedBy", None, [
+                ("prov:entity", adjoint_source[1], None),
+                ("prov:activity", calculation[1], None)], None
+
+
+def _xml_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return escape("%s" % value)
+
+
+def write_xml(fh, containers):
+    """
+    Write a PROV-XML document to an open text file. Returns a dictionary
+    with the number of records each violation has been injected into.
+
+    :param fh: The open file.
+    :param containers: The containers of the document as yielded by
+        :meth:`CorpusGenerator.containers`.
+    """
+    injected = collections.Counter()
+    fh.write('<prov:document xmlns:prov="http://www.w3.org/ns/prov#" '
+             'xmlns:seis_prov="%s" '
+             'xmlns:xsd="http://www.w3.org/2001/XMLSchema" '
+             'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">\n'
+             % SEIS_PROV_NAMESPACE)
+    for bundle, records in containers:
+        indent = "  "
+        if bundle is not None:
+            fh.write('  <prov:bundleContent prov:id="%s">\n' % bundle)
+            indent = "    "
+        for rec_type, identifier, attributes, violation in records:
+            if violation:
+                injected[violation] += 1
+            if identifier:
+                fh.write('%s<prov:%s prov:id="%s">\n' % (indent, rec_type,
+                                                         identifier))
+            else:
+                fh.write('%s<prov:%s>\n' % (indent, rec_type))
+            for name, value, xsd_type in attributes:
+                if name == "prov:type":
+                    fh.write('%s  <prov:type xsi:type="xsd:string">%s'
+                             '</prov:type>\n' % (indent, value))
+                elif xsd_type is None and name != "prov:label":
+                    fh.write('%s  <%s prov:ref="%s"/>\n' % (indent, name,
+                                                            value))
+                elif xsd_type in (None, "xsd:string"):
+                    fh.write('%s  <%s>%s</%s>\n' % (
+                        indent, name, _xml_value(value), name))
+                else:
+                    fh.write('%s  <%s xsi:type="%s">%s</%s>\n' % (
+                        indent, name, xsd_type, _xml_value(value), name))
+            fh.write('%s</prov:%s>\n' % (indent, rec_type))
+        if bundle is not None:
+            fh.write('  </prov:bundleContent>\n')
+    fh.write('</prov:document>\n')
+    return dict(injected)
+
+
+def _json_record(rec_type, attributes):
+    content = {}
+    if rec_type in _JSON_KEYS:
+        content["prov:type"] = {
+            "$": [_i[1] for _i in _AGENT_TYPES.values()
+                  if _i[0] == rec_type][0],
+            "type": "prov:QUALIFIED_NAME"}
+    for name, value, xsd_type in attributes:
+        if xsd_type in (None, "xsd:string"):
+            content[name] = value
+        elif xsd_type == "xsd:double":
+            content[name] = {"$": value, "type": xsd_type}
+        else:
+            content[name] = {"$": "%s" % value, "type": xsd_type}
+    return json.dumps(content, sort_keys=True)
+
+
+def _write_json_container(fh, records, injected):
+    """
+    Write the records of a container. They are grouped by their type in
+    PROV-JSON so each group is first written to its own temporary file.
+    """
+    groups = collections.OrderedDict()
+    try:
+        for i, (rec_type, identifier, attributes, violation) in \
+                enumerate(records):
+            if violation:
+                injected[violation] += 1
+            key = _JSON_KEYS.get(rec_type, rec_type)
+            if key not in groups:
+                groups[key] = tempfile.TemporaryFile(mode="w+t")
+            else:
+                groups[key].write(",\n")
+            groups[key].write("%s: %s" % (
+                json.dumps(identifier or "_:id%i" % i),
+                _json_record(rec_type, attributes)))
+
+        fh.write('"prefix": {"seis_prov": "%s"}' % SEIS_PROV_NAMESPACE)
+        for key, group in groups.items():
+            fh.write(',\n"%s": {\n' % key)
+            group.seek(0, 0)
+            shutil.copyfileobj(group, fh)
+            fh.write("\n}")
+    finally:
+        for group in groups.values():
+            group.close()
+
+
+def write_json(fh, containers):
+    """
+    Write a PROV-JSON document to an open text file. Returns a dictionary
+    with the number of records each violation has been injected into.
+
+    :param fh: The open file.
+    :param containers: The containers of the document as yielded by
+        :meth:`CorpusGenerator.containers`.
+    """
+    injected = collections.Counter()
+    bundles = 0
+    fh.write("{\n")
+    for bundle, records in containers:
+        if bundle is None:
+            _write_json_container(fh, records, injected)
+            continue
+        fh.write(',\n"bundle": {\n' if not bundles else ",\n")
+        bundles += 1
+        fh.write("%s: {\n" % json.dumps(bundle))
+        _write_json_container(fh, records, injected)
+        fh.write("\n}")
+    if bundles:
+        fh.write("\n}")
+    fh.write("\n}\n")
+    return dict(injected)
+
+
+def _parse_violations(value):
+    violations = {}
+    for item in value.split(","):
+        name, _, fraction = item.partition("=")
+        violations[name.strip()] = float(fraction)
+    return violations
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Generate synthetic SEIS-PROV documents.")
+    parser.add_argument("filename", help="The output file. Written as "
+                        "PROV-JSON if it ends with '.json', otherwise as "
+                        "PROV-XML.")
+    parser.add_argument("--traces", type=int, default=1000,
+                        help="The number of waveform traces.")
+    parser.add_argument("--scenario", choices=SCENARIOS,
+                        default="processing", help="The scenario.")
+    parser.add_argument("--chain", default=",".join(DEFAULT_CHAIN),
+                        help="Comma separated names of the activities "
+                        "applied to each trace.")
+    parser.add_argument("--bundles", type=int, default=0,
+                        help="The number of bundles.")
+    parser.add_argument("--violations", type=_parse_violations,
+                        help="Comma separated violations and the fraction "
+                        "of records to inject them into, e.g. "
+                        "'label=0.01,pattern=0.05'. Available: %s" %
+                        ", ".join(VIOLATIONS))
+    parser.add_argument("--seed", type=int,
+                        help="Seed of the injected violations.")
+    parser.add_argument("--parameters", type=int,
+                        help="The number of parameters of each input "
+                        "parameters record.")
+    args = parser.parse_args(argv)
+
+    try:
+        generator = CorpusGenerator(
+            traces=args.traces, scenario=args.scenario,
+            chain=[_i for _i in args.chain.split(",") if _i],
+            bundles=args.bundles, violations=args.violations, seed=args.seed,
+            parameters=args.parameters)
+    except ValueError as e:
+        parser.error(str(e))
+    injected = generator.write(args.filename)
+    for name in VIOLATIONS:
+        if name in injected:
+            print("Injected '%s' into %i records." % (name, injected[name]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Test cases for the asyncio validation API.
+
+:copyright:
+    Lion Krischer (lion.krischer@googlemail.com), 2015
+:license:
+    BSD 3-Clause ("BSD New" or "BSD Simplified")
+"""
+import concurrent.futures
+import inspect
+import io
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+if sys.version_info < (3, 6):
+    pytest.skip("Requires Python >= 3.6.", allow_module_level=True)
+
+import asyncio  # NOQA
+
+from seis_prov_validate import aio  # NOQA
+from seis_prov_validate.batch import find_files  # NOQA
+from seis_prov_validate.validator import validate  # NOQA
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(
+    inspect.getfile(inspect.currentframe()))), "test_data")
+
+
+def _run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+async def _collect(generator):
+    return [_i async for _i in generator]
+
+
+@pytest.mark.parametrize("executor", [None, "threads", "processes"])
+def test_validate_async(executor):
+    valid = os.path.join(DATA_DIR, "valid_files", "waveform_trace_min.xml")
+    invalid = os.path.join(DATA_DIR, "invalid_files",
+                           "waveform_with_extra_attribute.xml")
+    if executor == "threads":
+        executor = concurrent.futures.ThreadPoolExecutor(2)
+    elif executor == "processes":
+        executor = concurrent.futures.ProcessPoolExecutor(2)
+
+    with io.open(invalid, "rb") as fh:
+        data = fh.read()
+
+    async def run():
+        with io.open(valid, "rb") as fh:
+            return await asyncio.gather(
+                aio.validate_async(valid, executor=executor),
+                aio.validate_async(fh, executor=executor),
+                aio.validate_async(data, executor=executor,
+                                   all_errors=True))
+
+    try:
+        results = _run(run())
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    assert results[0].is_valid
+    assert results[1].is_valid
+    assert results[2].errors == validate(io.BytesIO(data)).errors
+
+
+def test_validate_async_does_not_block():
+    filename = os.path.join(DATA_DIR, "valid_files", "waveform_trace_max.xml")
+    ticks = []
+
+    async def tick():
+        for _ in range(5):
+            ticks.append(time.time())
+            await asyncio.sleep(0)
+
+    async def run():
+        return await asyncio.gather(
+            aio.validate_async(filename, stats=True), tick())
+
+    result = _run(run())[0]
+    assert result.is_valid
+    # The loop kept running while the file was validated.
+    assert len(ticks) == 5
+    assert result.stats["records"] > 0
+
+
+def test_validate_many_async():
+    files = find_files([DATA_DIR])
+    results = _run(_collect(aio.validate_many_async(files, concurrency=3)))
+    assert sorted(_i[0] for _i in results) == sorted(files)
+    for filename, result in results:
+        assert result.is_valid is ("valid_files" in filename.split(os.sep))
+
+
+def test_validate_many_async_bounds_concurrency(monkeypatch):
+    lock = threading.Lock()
+    state = {"current": 0, "max": 0}
+    original = aio._validate
+
+    def _validate(file_or_object, kwargs):
+        with lock:
+            state["current"] += 1
+            state["max"] = max(state["max"], state["current"])
+        time.sleep(0.01)
+        try:
+            return original(file_or_object, kwargs)
+        finally:
+            with lock:
+                state["current"] -= 1
+
+    monkeypatch.setattr(aio, "_validate", _validate)
+    files = find_files([os.path.join(DATA_DIR, "valid_files")])
+
+    async def arrive():
+        # Files can also arrive asynchronously.
+        for filename in files:
+            await asyncio.sleep(0)
+            yield filename
+
+    executor = concurrent.futures.ThreadPoolExecutor(8)
+    try:
+        results = _run(_collect(aio.validate_many_async(
+            arrive(), executor=executor, concurrency=2)))
+    finally:
+        executor.shutdown()
+    assert len(results) == len(files)
+    assert all(_i[1].is_valid for _i in results)
+    assert state["max"] == 2
+
+    # A shared semaphore bounds independent calls.
+    state["max"] = 0
+
+    async def run():
+        limit = asyncio.Semaphore(3)
+        return await asyncio.gather(*[
+            aio.validate_async(_i, limit=limit) for _i in files])
+
+    assert all(_i.is_valid for _i in _run(run()))
+    assert state["max"] == 3
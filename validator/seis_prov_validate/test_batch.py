@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Test cases for the batch validation.
+
+:copyright:
+    Lion Krischer (lion.krischer@googlemail.com), 2015
+:license:
+    BSD 3-Clause ("BSD New" or "BSD Simplified")
+"""
+import inspect
+import os
+
+import pytest
+
+from seis_prov_validate.batch import find_files, validate_many
+from seis_prov_validate.validator import main
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(
+    inspect.getfile(inspect.currentframe()))), "test_data")
+
+
+def test_find_files():
+    valid_dir = os.path.join(DATA_DIR, "valid_files")
+    files = find_files([valid_dir])
+    assert files == sorted(files)
+    assert len(files) == len(os.listdir(valid_dir))
+
+    # Text files are not picked up from directories.
+    files = find_files([DATA_DIR])
+    assert len(files) == len(os.listdir(valid_dir)) + \
+        len(os.listdir(os.path.join(DATA_DIR, "invalid_files"))) - 1
+
+    # Globs are expanded, everything else is passed through.
+    files = find_files([os.path.join(valid_dir, "waveform_trace_*.xml"),
+                        "does_not_exist.xml"])
+    assert [os.path.basename(_i) for _i in files] == [
+        "waveform_trace_max.xml", "waveform_trace_min.xml",
+        "does_not_exist.xml"]
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_validate_many(jobs):
+    files = find_files([DATA_DIR])
+    results = dict(validate_many(files, jobs=jobs))
+    assert sorted(results.keys()) == sorted(files)
+    for filename, result in results.items():
+        assert result.is_valid is ("valid_files" in filename.split(os.sep))
+
+
+def test_main_with_multiple_files(capsys):
+    filenames = [
+        os.path.join(DATA_DIR, "valid_files", "waveform_trace_min.xml"),
+        os.path.join(DATA_DIR, "valid_files", "waveform_trace_max.json")]
+    main(filenames + ["-j", "2"])
+    out = capsys.readouterr()[0].splitlines()
+    assert sorted(out[:2]) == sorted(
+        "%s: VALID SEIS-PROV FILE!" % _i for _i in filenames)
+    assert out[-1] == "Validated 2 files: 2 valid, 0 invalid."
+
+    with pytest.raises(SystemExit) as e:
+        main(filenames + [os.path.join(DATA_DIR, "invalid_files")])
+    assert e.value.code == 1
+    invalid_count = len(
+        os.listdir(os.path.join(DATA_DIR, "invalid_files"))) - 1
+    out = capsys.readouterr()[0].splitlines()
+    assert out[-1] == "Validated %i files: 2 valid, %i invalid." % (
+        invalid_count + 2, invalid_count)
+
+
+def test_main_with_single_file(capsys):
+    main([os.path.join(DATA_DIR, "valid_files", "waveform_trace_min.xml")])
+    assert capsys.readouterr()[0] == "VALID SEIS-PROV FILE!\n"
+
+
+def test_main_without_files(tmpdir, capsys):
+    for path in (str(tmpdir), str(tmpdir.join("*.xml"))):
+        with pytest.raises(SystemExit) as e:
+            main([path])
+        assert e.value.code == 2
+        out, err = capsys.readouterr()
+        assert out == ""
+        assert err == "No SEIS-PROV files found.\n"
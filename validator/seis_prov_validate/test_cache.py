@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Test cases for the result cache.
+
+:copyright:
+    Lion Krischer (lion.krischer@googlemail.com), 2015
+:license:
+    BSD 3-Clause ("BSD New" or "BSD Simplified")
+"""
+import inspect
+import io
+import os
+import pickle
+
+import pytest
+
+from seis_prov_validate.batch import validate_many
+from seis_prov_validate.cache import ResultCache, file_hash
+from seis_prov_validate.validator import main, validate
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(
+    inspect.getfile(inspect.currentframe()))), "test_data")
+
+VALID_FILE = os.path.join(DATA_DIR, "valid_files", "dangling_reference.xml")
+INVALID_FILE = os.path.join(DATA_DIR, "invalid_files", "no_label.xml")
+
+# Default options of a validation.
+OPTIONS = {"xsd_roundtrip": False, "streaming": False, "all_errors": False,
+           "max_errors": None}
+
+
+def test_results_are_cached(tmpdir):
+    cache = ResultCache(str(tmpdir))
+    expected = validate(VALID_FILE)
+    result = validate(VALID_FILE, cache=cache)
+    assert len(cache) == 1
+    assert (result.errors, result.warnings) == \
+        (expected.errors, expected.warnings)
+
+    # Replace the stored result to make sure it is actually used.
+    key = cache.key(VALID_FILE, **OPTIONS)
+    cache.put(key, ["cached"], [])
+    assert validate(VALID_FILE, cache=cache).errors == ["cached"]
+
+    # Different options and files have their own results.
+    assert validate(VALID_FILE, streaming=True, cache=cache).errors == []
+    assert validate(INVALID_FILE, cache=cache).errors == \
+        validate(INVALID_FILE).errors
+    assert len(cache) == 3
+
+    # Files that do not exist are not cached.
+    assert validate("does_not_exist.xml", cache=cache).errors == [
+        "Path 'does_not_exist.xml' does not exist."]
+    assert len(cache) == 3
+
+
+def test_stats_of_cached_results(tmpdir):
+    cache = ResultCache(str(tmpdir))
+    stats = validate(VALID_FILE, cache=cache, stats=True).stats
+    assert stats["cached"] is False
+    assert "records" in stats["phases"]
+    assert stats["phases"]["cache"]["calls"] == 2
+
+    stats = validate(VALID_FILE, cache=cache, stats=True).stats
+    assert stats["cached"] is True
+    assert list(stats["phases"]) == ["cache"]
+    assert stats["records"] == 0
+
+
+def test_file_objects(tmpdir):
+    cache = ResultCache(str(tmpdir))
+    with io.open(VALID_FILE, "rb") as fh:
+        data = fh.read()
+    with io.BytesIO(data) as buf:
+        buf.read(10)
+        buf.seek(0, 0)
+        assert validate(buf, cache=cache).is_valid is True
+    assert file_hash(io.BytesIO(data)) == file_hash(VALID_FILE)
+    # Same contents, same result.
+    key = cache.key(VALID_FILE, **OPTIONS)
+    assert cache.get(key) is not None
+
+
+def test_identical_files_at_different_paths(tmpdir):
+    cache = ResultCache(str(tmpdir.join("cache")))
+    with io.open(VALID_FILE, "rb") as fh:
+        data = fh.read()
+    # Not valid against the PROV-XML schema - lxml adds the filename to the
+    # messages.
+    data = data.replace(b"<prov:label>", b"<prov:bogus/><prov:label>", 1)
+    filenames = []
+    for name in ("a", "b"):
+        tmpdir.mkdir(name).join("file.xml").write_binary(data)
+        filenames.append(str(tmpdir.join(name, "file.xml")))
+
+    results = [validate(_i, cache=cache) for _i in filenames]
+    assert len(cache) == 1
+    for filename, result in zip(filenames, results):
+        assert result.errors == validate(filename).errors
+        assert filename + ":" in result.errors[0]
+    with io.BytesIO(data) as buf:
+        assert "<string>:" in validate(buf, cache=cache).errors[0]
+
+
+def test_schema_change_invalidates_cache(tmpdir):
+    cache = ResultCache(str(tmpdir))
+    validate(VALID_FILE, cache=cache)
+
+    cache = ResultCache(str(tmpdir))
+    cache.schema_hash = "something else"
+    key = cache.key(VALID_FILE, **OPTIONS)
+    assert cache.get(key) is None
+
+
+def test_least_recently_used_results_are_removed(tmpdir):
+    cache = ResultCache(str(tmpdir), max_size=250)
+    for i in range(5):
+        cache.put("key_%i" % i, ["e" * 10], [])
+    assert len(cache) == 5
+
+    # Access the first one so the second one is the oldest.
+    assert cache.get("key_0") == (["e" * 10], [])
+    cache.put("large", ["e" * 100], [])
+    assert cache.get("key_1") is None
+    assert cache.get("key_0") is not None
+    assert cache.get("large") is not None
+
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_cache_in_multiple_processes(tmpdir):
+    cache = pickle.loads(pickle.dumps(ResultCache(str(tmpdir))))
+    filenames = [VALID_FILE, INVALID_FILE]
+    results = dict(validate_many(filenames, jobs=2, cache=cache))
+    assert results[VALID_FILE].is_valid is True
+    assert results[INVALID_FILE].is_valid is False
+    assert len(cache) == 2
+
+
+def test_main_with_cache(tmpdir, capsys):
+    cache_dir = str(tmpdir.join("cache"))
+    for _ in range(2):
+        with pytest.raises(SystemExit):
+            main([INVALID_FILE, "--cache", cache_dir])
+        out = capsys.readouterr()[0]
+        assert "Record 'seis_prov:sp001_wf_c17dd1f'" in out
+    assert len(ResultCache(cache_dir)) == 1
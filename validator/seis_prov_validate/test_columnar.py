@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Test cases for the columnar export.
+
+:copyright:
+    Lion Krischer (lion.krischer@googlemail.com), 2015
+:license:
+    BSD 3-Clause ("BSD New" or "BSD Simplified")
+"""
+import datetime
+import glob
+import inspect
+import io
+import os
+
+import numpy as np
+import prov.model
+import pytest
+
+from seis_prov_validate import columnar
+from seis_prov_validate.synthetic import CorpusGenerator
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(
+    inspect.getfile(inspect.currentframe()))), "test_data")
+
+VALID_FILES = sorted(glob.glob(os.path.join(DATA_DIR, "valid_files", "*")))
+
+
+def _as_lists(tables):
+    return dict((name, dict((_k, _v.tolist())
+                            for _k, _v in table.columns.items()))
+                for name, table in tables.items())
+
+
+@pytest.mark.parametrize("filename", VALID_FILES)
+def test_same_tables_as_prov_documents(filename):
+    tables = columnar.to_tables(filename)
+    fileformat = "xml" if filename.endswith(".xml") else "json"
+    doc = prov.model.ProvDocument.deserialize(filename, format=fileformat)
+    assert _as_lists(tables) == _as_lists(columnar.to_tables(doc))
+    with io.open(filename, "rb") as fh:
+        assert _as_lists(tables) == _as_lists(columnar.to_tables(fh))
+
+
+def test_tables_of_corpora(tmpdir):
+    filenames = []
+    for i, fileformat in enumerate(("xml", "json")):
+        filenames.append(str(tmpdir.join("corpus.%s" % fileformat)))
+        CorpusGenerator(traces=5, bundles=i, seed=0).write(filenames[-1])
+    tables = columnar.to_tables(filenames)
+
+    traces = tables["waveform_trace"]
+    assert list(traces.columns)[:4] == ["document", "bundle", "id", "label"]
+    assert traces.types["start_time"] == ("xsd:dateTime",)
+    assert traces.columns["document"].dtype == np.int64
+    assert traces.columns["sampling_rate"].dtype == np.float64
+    assert traces.columns["number_of_samples"].dtype == np.int64
+    assert traces.columns["start_time"].dtype == np.dtype("datetime64[us]")
+    assert traces.columns["seed_id"].dtype == object
+    assert set(traces.columns["document"].tolist()) == set([0, 1])
+    # Only the second corpus has bundles.
+    bundles = traces.columns["bundle"]
+    assert bundles.mask[traces.columns["document"] == 0].all()
+    assert not bundles.mask[traces.columns["document"] == 1].any()
+
+    # Vectorized access to the attributes.
+    assert (traces.columns["sampling_rate"].compressed() > 0).all()
+    assert traces.columns["number_of_samples"].sum() > 0
+    assert len(set(len(_i) for _i in tables["lowpass_filter"].columns.values(
+        ))) == 1
+
+
+def test_values_not_fitting_their_columns():
+    doc = prov.model.ProvDocument()
+    doc.add_namespace("seis_prov", "http://seisprov.org/seis_prov/0.1/#")
+    doc.entity("seis_prov:sp001_wf_aaaaaaa", other_attributes=(
+        ("prov:label", "Waveform Trace"),
+        ("prov:type", "seis_prov:waveform_trace"),
+        ("seis_prov:sampling_rate", "fast"),
+        ("seis_prov:number_of_samples", 10),
+        ("seis_prov:start_time", datetime.datetime(
+            2015, 1, 1, 1, tzinfo=datetime.timezone(
+                datetime.timedelta(hours=1))))))
+    doc.entity("seis_prov:sp001_wf_bbbbbbb", other_attributes=(
+        ("prov:label", "Waveform Trace"),
+        ("prov:type", "seis_prov:waveform_trace"),
+        ("seis_prov:sampling_rate", 2.0)))
+    # Not a SEIS-PROV record.
+    doc.entity("seis_prov:sp001_wf_ccccccc", other_attributes=(
+        ("prov:type", "seis_prov:something_else"),))
+
+    traces = columnar.to_tables(doc)["waveform_trace"]
+    assert len(traces) == 2
+    assert traces.columns["sampling_rate"].tolist() == [None, 2.0]
+    assert traces.columns["number_of_samples"].tolist() == [10, None]
+    # Stored as UTC.
+    assert traces.columns["start_time"][0] == np.datetime64(
+        "2015-01-01T00:00:00")
+
+
+def test_arrow_and_parquet(tmpdir):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet
+
+    filename = str(tmpdir.join("corpus.xml"))
+    CorpusGenerator(traces=5, seed=0).write(filename)
+    tables = columnar.to_tables(filename)
+
+    traces = tables["waveform_trace"]
+    table = traces.to_arrow()
+    assert table.num_rows == len(traces)
+    assert table.schema.field("sampling_rate").type == pa.float64()
+    assert table.schema.field("start_time").type == pa.timestamp("us")
+    assert pa.types.is_dictionary(table.schema.field("seed_id").type)
+    assert table.column("bundle").null_count == len(traces)
+
+    filenames = columnar.write_parquet(tables, str(tmpdir.join("out")))
+    assert len(filenames) == len(tables)
+    assert pyarrow.parquet.read_table(os.path.join(
+        str(tmpdir), "out", "waveform_trace.parquet")).equals(table)
+
+    columnar.main([filename, "--output", str(tmpdir.join("cli"))])
+    assert sorted(os.listdir(str(tmpdir.join("cli")))) == sorted(
+        os.path.basename(_i) for _i in filenames)
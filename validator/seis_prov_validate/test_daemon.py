@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Test cases for the validation daemon.
+
+:copyright:
+    Lion Krischer (lion.krischer@googlemail.com), 2015
+:license:
+    BSD 3-Clause ("BSD New" or "BSD Simplified")
+"""
+import glob
+import inspect
+import json
+import os
+import socket
+import stat
+import threading
+
+import pytest
+
+from seis_prov_validate.daemon import (DaemonClient, DaemonNotRunning,
+                                       DaemonServer, ping)
+from seis_prov_validate.validator import main, validate
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(
+    inspect.getfile(inspect.currentframe()))), "test_data")
+
+FILES = sorted(glob.glob(os.path.join(DATA_DIR, "*", "*.*")))
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "getuid"),
+                                reason="Requires Unix domain sockets.")
+
+
+@pytest.fixture
+def server(tmpdir):
+    server = DaemonServer(str(tmpdir.join("daemon.sock")), threads=2)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    server.shutdown()
+    thread.join()
+    server.server_close()
+
+
+def test_validate_with_daemon(server):
+    assert stat.S_IMODE(os.stat(server.socket_path).st_mode) & 0o077 == 0
+
+    with DaemonClient(server.socket_path) as client:
+        for filename in FILES:
+            result = client.validate(filename)
+            expected = validate(filename)
+            assert result.errors == expected.errors
+            assert result.warnings == expected.warnings
+
+        result = client.validate(
+            os.path.join(DATA_DIR, "invalid_files", "no_label.xml"),
+            all_errors=True, max_errors=1)
+        assert result.warnings == ["Validation stopped after 1 errors."]
+
+        stats = client.validate(FILES[-1], stats=True).stats
+        assert stats["records"] == validate(FILES[-1], stats=True).stats[
+            "records"]
+        assert client.validate(FILES[-1]).stats is None
+
+    # Multiple clients at once.
+    clients = [DaemonClient(server.socket_path) for _ in range(3)]
+    for client in clients:
+        assert client.validate(FILES[-1]).is_valid is True
+        client.close()
+
+
+def test_invalid_requests(server):
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.connect(server.socket_path)
+    fh = connection.makefile("rwb")
+    for line in (b"no json", b"[1, 2]", b"{}", b'{"filename": 1}',
+                 b'{"filename": "a.xml", "options": []}'):
+        fh.write(line + b"\n")
+        fh.flush()
+        assert json.loads(fh.readline().decode("utf-8")) == {
+            "errors": ["Invalid request."], "warnings": []}
+    # The connection is still usable.
+    fh.write(json.dumps({"filename": FILES[-1]}).encode("utf-8") + b"\n")
+    fh.flush()
+    assert json.loads(fh.readline().decode("utf-8"))["errors"] == \
+        validate(FILES[-1]).errors
+    fh.close()
+    connection.close()
+
+
+def test_daemon_already_running(server):
+    assert ping(server.socket_path) is True
+    with pytest.raises(ValueError):
+        DaemonServer(server.socket_path)
+
+
+def test_shutdown(tmpdir):
+    socket_path = str(tmpdir.join("daemon.sock"))
+    # Stale socket files are removed.
+    with open(socket_path, "w") as fh:
+        fh.write("")
+    server = DaemonServer(socket_path, threads=1)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+
+    with DaemonClient(socket_path) as client:
+        client.shutdown()
+    thread.join()
+    server.server_close()
+    assert not os.path.exists(socket_path)
+    assert ping(socket_path) is False
+    with pytest.raises(DaemonNotRunning):
+        DaemonClient(socket_path)
+
+
+def test_main_with_daemon(server, capsys):
+    filename = os.path.join(DATA_DIR, "invalid_files", "no_label.xml")
+    with pytest.raises(SystemExit) as e:
+        main([filename, "--daemon", "--socket", server.socket_path])
+    assert e.value.code == 1
+    assert capsys.readouterr()[0].strip() == str(validate(filename))
+
+    main([os.path.join(DATA_DIR, "valid_files"), "--daemon", "--socket",
+          server.socket_path])
+    assert "0 invalid." in capsys.readouterr()[0]
+
+
+def test_main_without_daemon(tmpdir, capsys):
+    with pytest.raises(SystemExit) as e:
+        main([FILES[0], "--daemon", "--socket",
+              str(tmpdir.join("daemon.sock"))])
+    assert e.value.code == 2
+    assert "No validation daemon" in capsys.readouterr()[1]
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Test cases for the structural diff.
+
+:copyright:
+    Lion Krischer (lion.krischer@googlemail.com), 2015
+:license:
+    BSD 3-Clause ("BSD New" or "BSD Simplified")
+"""
+import glob
+import inspect
+import io
+import os
+
+import prov.model
+import pytest
+
+from seis_prov_validate.diff import diff, main
+from seis_prov_validate.synthetic import CorpusGenerator
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(
+    inspect.getfile(inspect.currentframe()))), "test_data")
+
+# Files with the same document serialized as PROV-XML and PROV-JSON.
+PAIRS = [(_i, _i[:-4] + ".json") for _i in sorted(glob.glob(
+    os.path.join(DATA_DIR, "valid_files", "*.xml")))
+    if os.path.exists(_i[:-4] + ".json")]
+
+
+@pytest.fixture(scope="module")
+def corpus(tmpdir_factory):
+    filename = str(tmpdir_factory.mktemp("diff").join("corpus.xml"))
+    CorpusGenerator(traces=3, bundles=2, seed=0).write(filename)
+    return filename
+
+
+def _modified(corpus, tmpdir, modify):
+    doc = prov.model.ProvDocument.deserialize(corpus, format="xml")
+    modify(doc)
+    filename = str(tmpdir.join("modified.json"))
+    doc.serialize(filename, format="json")
+    return filename
+
+
+def _elements(container):
+    return [_i for _i in container._records if isinstance(
+        _i, (prov.model.ProvEntity, prov.model.ProvActivity,
+             prov.model.ProvAgent))]
+
+
+@pytest.mark.parametrize("xml_file, json_file", PAIRS)
+def test_serializations_are_identical(xml_file, json_file):
+    result = diff(xml_file, json_file)
+    assert result.is_identical
+    assert result.format() == []
+
+
+def test_changed_records_and_edges(corpus, tmpdir):
+    def modify(doc):
+        bundle = sorted(doc.bundles, key=lambda x: x.identifier.uri)[0]
+        # Remove a generated entity together with its generation.
+        generation = [_i for _i in bundle._records if isinstance(
+            _i, prov.model.ProvGeneration)][0]
+        removed = generation.formal_attributes[0][1]
+        bundle._records = [
+            _i for _i in bundle._records
+            if _i is not generation and _i.identifier != removed]
+        entity = [_i for _i in _elements(bundle)
+                  if _i.get_attribute("prov:label") ==
+                  set(["Waveform Trace"])][0]
+        entity.add_attributes({"seis_prov:sampling_rate": 40.0,
+                               "prov:label": "Other"})
+        doc.entity("seis_prov:sp100_wf_aaaaaaa")
+        doc.wasDerivedFrom("seis_prov:sp100_wf_aaaaaaa", entity.identifier)
+
+    modified = _modified(corpus, tmpdir, modify)
+    result = diff(corpus, modified)
+    assert not result.is_identical
+    assert [str(_i.identifier) for _i in result.added] == [
+        "seis_prov:sp100_wf_aaaaaaa"]
+    assert len(result.removed) == 1
+    assert result.renamed == []
+
+    assert len(result.changed) == 1
+    changes = dict((_i[0], _i[1:]) for _i in result.changed[0].changes)
+    assert sorted(changes) == ["prov:label", "sampling_rate"]
+    assert changes["sampling_rate"][1] == (20.0, 40.0)
+    assert sorted(changes["prov:label"][1]) == ["Other", "Waveform Trace"]
+
+    assert [_i.relation for _i in result.removed_edges] == [
+        "wasGeneratedBy"]
+    assert [_i.relation for _i in result.added_edges] == ["wasDerivedFrom"]
+    assert dict(result.added_edges[0].references)[
+        "prov:generatedEntity"] == result.added[0].identifier
+
+    lines = result.format()
+    assert lines[0].startswith("- entity seis_prov:")
+    assert lines[1] == "+ entity seis_prov:sp100_wf_aaaaaaa"
+    assert "    sampling_rate: 20.0 -> 20.0, 40.0" in lines
+
+    # The other direction.
+    reverse = diff(modified, corpus)
+    assert len(reverse.added) == len(result.removed)
+    assert len(reverse.removed) == len(result.added)
+    assert reverse.added_edges == result.removed_edges
+
+
+def test_renamed_records(corpus, tmpdir):
+    with io.open(corpus, "rb") as fh:
+        data = fh.read()
+    doc = prov.model.ProvDocument.deserialize(corpus, format="xml")
+    old = [_i.identifier for _i in _elements(list(doc.bundles)[0])][-2:]
+    for i, name in enumerate(old):
+        data = data.replace(name.localpart.encode(),
+                            ("sp999_wf_renamed%i" % i).encode())
+    renamed = str(tmpdir.join("renamed.xml"))
+    with io.open(renamed, "wb") as fh:
+        fh.write(data)
+
+    result = diff(corpus, renamed)
+    assert [(str(_i.identifier), str(_j.identifier))
+            for _i, _j in result.renamed] == [
+        (str(old[0]), "seis_prov:sp999_wf_renamed0"),
+        (str(old[1]), "seis_prov:sp999_wf_renamed1")]
+    assert not (result.added or result.removed or result.changed)
+    # References to renamed records are not reported as changed edges.
+    assert result.added_edges == result.removed_edges == []
+
+    result = diff(corpus, renamed, detect_renames=False)
+    assert len(result.added) == len(result.removed) == 2
+    assert result.renamed == []
+    assert len(result.added_edges) == len(result.removed_edges) > 0
+
+
+def test_main(corpus, tmpdir, capsys):
+    with pytest.raises(SystemExit) as e:
+        main([corpus, corpus])
+    assert e.value.code == 0
+    assert capsys.readouterr()[0] == "The documents are identical.\n"
+
+    modified = _modified(corpus, tmpdir, lambda doc: doc.entity(
+        "seis_prov:sp100_wf_aaaaaaa"))
+    with pytest.raises(SystemExit) as e:
+        main([corpus, modified])
+    assert e.value.code == 1
+    out = capsys.readouterr()[0].splitlines()
+    assert out[0] == "+ entity seis_prov:sp100_wf_aaaaaaa"
+    assert out[-1] == ("1 added, 0 removed, 0 renamed, 0 changed, "
+                       "0 added edges, 0 removed edges.")
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Test cases for the validation of documents embedded in HDF5 files.
+
+:copyright:
+    Lion Krischer (lion.krischer@googlemail.com), 2015
+:license:
+    BSD 3-Clause ("BSD New" or "BSD Simplified")
+"""
+import inspect
+import io
+import os
+
+import pytest
+
+from seis_prov_validate.batch import find_files
+from seis_prov_validate.validator import main, validate
+
+h5py = pytest.importorskip("h5py")
+np = pytest.importorskip("numpy")
+
+from seis_prov_validate.hdf5 import (iter_documents, list_documents,  # NOQA
+                                     validate_hdf5)
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(
+    inspect.getfile(inspect.currentframe()))), "test_data")
+
+
+def _name(filename):
+    return os.path.basename(filename).replace(".", "_")
+
+
+def _write_asdf(filename, files):
+    """
+    Store the files as provenance documents the way ASDF files do.
+    """
+    with h5py.File(filename, "w") as f:
+        group = f.create_group("Provenance")
+        for filename in files:
+            with io.open(filename, "rb") as fh:
+                data = np.frombuffer(fh.read(), dtype=np.dtype("byte"))
+            group.create_dataset(_name(filename), data=data)
+
+
+@pytest.fixture
+def asdf_file(tmpdir):
+    files = find_files([DATA_DIR])
+    filename = str(tmpdir.join("test.h5"))
+    _write_asdf(filename, files)
+    return filename, files
+
+
+def test_iter_documents(asdf_file):
+    filename, files = asdf_file
+    names = list_documents(filename)
+    assert names == sorted(_name(_i) for _i in files)
+
+    contents = {}
+    for name, data in iter_documents(filename):
+        contents[name] = data.tobytes()
+    for filename in files:
+        with io.open(filename, "rb") as fh:
+            assert contents[_name(filename)] == fh.read()
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_validate_hdf5(asdf_file, jobs):
+    filename, files = asdf_file
+    result = validate_hdf5(filename, jobs=jobs)
+    assert list(result.results) == list_documents(filename)
+    assert not result.is_valid
+    for filename in files:
+        with io.open(filename, "rb") as fh:
+            expected = validate(io.BytesIO(fh.read()))
+        got = result.results[_name(filename)]
+        assert got.errors == expected.errors
+        assert got.warnings == expected.warnings
+    assert sorted(result.invalid) == sorted(
+        _name(_i) for _i in files if "invalid_files" in _i.split(os.sep))
+
+
+def test_datasets_that_are_no_documents(tmpdir):
+    filename = str(tmpdir.join("test.h5"))
+    with h5py.File(filename, "w") as f:
+        f.create_dataset("Provenance/floats", data=np.zeros(10))
+        f.create_group("Provenance/group")
+        f.create_dataset("Provenance/empty", data=np.zeros(0, dtype="i1"))
+    result = validate_hdf5(filename)
+    assert list(result.results) == ["empty", "floats", "group"]
+    assert not result.results["empty"].is_valid
+    assert "cannot be a serialized SEIS-PROV document" in \
+        result.results["floats"].errors[0]
+    assert "cannot be a serialized SEIS-PROV document" in \
+        result.results["group"].errors[0]
+
+    # Files without provenance do not contain any documents.
+    result = validate_hdf5(filename, group="Other")
+    assert result.results == {}
+    assert result.is_valid
+
+
+def test_main_with_hdf5(tmpdir, capsys):
+    filename = str(tmpdir.join("valid.h5"))
+    valid_files = find_files([os.path.join(DATA_DIR, "valid_files")])
+    _write_asdf(filename, valid_files[:2])
+    main(["--hdf5", str(tmpdir)])
+    out = capsys.readouterr()[0].splitlines()
+    assert out[:2] == ["%s:Provenance/%s: VALID SEIS-PROV FILE!" % (
+        filename, _i) for _i in sorted(_name(_i) for _i in valid_files[:2])]
+    assert out[-1] == "Validated 2 documents in 1 files: 2 valid, 0 invalid."
+
+    invalid_filename = str(tmpdir.join("invalid.h5"))
+    _write_asdf(invalid_filename, [os.path.join(
+        DATA_DIR, "invalid_files", "waveform_with_extra_attribute.xml")])
+    with open(str(tmpdir.join("broken.h5")), "wb") as fh:
+        fh.write(b"no hdf5")
+    with pytest.raises(SystemExit) as e:
+        main(["--hdf5", str(tmpdir), "-j", "2"])
+    assert e.value.code == 1
+    out = capsys.readouterr()[0].splitlines()
+    assert out[0].startswith("%s: Could not read HDF5 file" %
+                             str(tmpdir.join("broken.h5")))
+    assert out[-2:] == [
+        "Validated 3 documents in 2 files: 2 valid, 1 invalid.",
+        "1 files could not be read."]
+
+
+def test_main_with_hdf5_without_files(tmpdir, capsys):
+    with pytest.raises(SystemExit) as e:
+        main(["--hdf5", str(tmpdir)])
+    assert e.value.code == 2
+    assert capsys.readouterr()[1] == "No HDF5 files found.\n"
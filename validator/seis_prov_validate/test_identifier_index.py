@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Test cases for the identifier index.
+
+:copyright:
+    Lion Krischer (lion.krischer@googlemail.com), 2015
+:license:
+    BSD 3-Clause ("BSD New" or "BSD Simplified")
+"""
+import prov.model
+
+from seis_prov_validate.identifier_index import (
+    IdentifierIndex, IncrementalIdentifierIndex, record_entry)
+from seis_prov_validate.validator import SEIS_PROV_NAMESPACE
+
+NS = SEIS_PROV_NAMESPACE
+
+
+def _get_document():
+    doc = prov.model.ProvDocument()
+    doc.add_namespace("seis_prov", NS)
+    doc.add_namespace("ex", "http://example.com#")
+    trace = doc.entity("seis_prov:sp001_wf_a34a8bf")
+    detrend = doc.activity("seis_prov:sp002_dt_b3a8f7a")
+    doc.usage(detrend, trace)
+    doc.generation("seis_prov:sp003_wf_c83f8a0", detrend)
+    doc.association(detrend, "ex:some_agent")
+
+    bundle = doc.bundle("seis_prov:bundle")
+    bundle.entity("seis_prov:sp001_wf_a34a8bf")
+    bundle.entity("ex:other")
+    return doc
+
+
+def test_definitions_and_relations():
+    index = IdentifierIndex.from_document(_get_document())
+    assert len(index) == 4
+    assert (NS, "sp001_wf_a34a8bf") in index
+    assert (NS, "sp003_wf_c83f8a0") not in index
+    assert index.definitions((NS, "sp001_wf_a34a8bf")) == [
+        ("entity", None), ("entity", NS + "bundle")]
+    assert index.definitions((NS, "bundle")) == [("bundle", None)]
+    assert [_i[0] for _i in index.relations] == [
+        "used", "wasGeneratedBy", "wasAssociatedWith"]
+    assert index.get_name((NS, "sp002_dt_b3a8f7a")) == \
+        "seis_prov:sp002_dt_b3a8f7a"
+
+
+def test_duplicates_across_bundles():
+    index = IdentifierIndex.from_document(_get_document())
+    assert index.duplicates() == [(NS, "sp001_wf_a34a8bf")]
+    assert index.duplicates(namespace="http://example.com#") == []
+
+
+def test_dangling_references():
+    index = IdentifierIndex.from_document(_get_document())
+    assert index.dangling_references() == [
+        ("wasGeneratedBy", "prov:entity", (NS, "sp003_wf_c83f8a0")),
+        ("wasAssociatedWith", "prov:agent",
+         ("http://example.com#", "some_agent"))]
+    assert index.dangling_references(namespace=NS) == [
+        ("wasGeneratedBy", "prov:entity", (NS, "sp003_wf_c83f8a0"))]
+
+
+def test_manually_filled_index():
+    index = IdentifierIndex()
+    index.add_definition(NS, "a", "entity")
+    index.add_definition(NS, "a", "activity", bundle="b")
+    index.add_relation("used", [("prov:entity", (NS, "a")),
+                                ("prov:activity", (NS, "c"))])
+    assert index.duplicates() == [(NS, "a")]
+    assert index.dangling_references() == [
+        ("used", "prov:activity", (NS, "c"))]
+    assert index.get_name((NS, "c")) == NS + "c"
+
+
+def test_incremental_index():
+    doc = _get_document()
+    index = IncrementalIdentifierIndex.from_document(doc)
+    full = IdentifierIndex.from_document(doc)
+    assert index.duplicates() == full.duplicates()
+    assert sorted(index.dangling_references()) == sorted(
+        full.dangling_references())
+    assert sorted(index.relations) == sorted(full.relations)
+
+    # Removing the duplicate and the generation resolves both problems.
+    bundle = list(doc.bundles)[0]
+    index.remove_entry(record_entry(bundle._records[0]),
+                       bundle=bundle.identifier.uri)
+    index.remove_entry(record_entry(doc._records[3]))
+    assert index.duplicates() == []
+    assert index.dangling_references(namespace=NS) == []
+    assert index.definitions((NS, "sp001_wf_a34a8bf")) == [("entity", None)]
+
+    index.add_definition(NS, "sp003_wf_c83f8a0", "entity")
+    index.add_entry(record_entry(doc._records[3]))
+    index.remove_definition(NS, "sp003_wf_c83f8a0", "entity")
+    assert index.dangling_references(namespace=NS) == [
+        ("wasGeneratedBy", "prov:entity", (NS, "sp003_wf_c83f8a0"))]
+    assert (NS, "sp003_wf_c83f8a0") not in index
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Test cases for the id minting.
+
+:copyright:
+    Lion Krischer (lion.krischer@googlemail.com), 2015
+:license:
+    BSD 3-Clause ("BSD New" or "BSD Simplified")
+"""
+import pytest
+
+from seis_prov_validate.identifiers import (IdentifierMinter,
+                                            mint_from_content,
+                                            two_letter_code)
+from seis_prov_validate.validator import _get_validation_plan
+
+PLANS = dict((name, plan) for plans in _get_validation_plan().values()
+             for name, plan in plans.items())
+
+
+@pytest.mark.parametrize("name", sorted(PLANS))
+def test_ids_are_valid(name):
+    regex = PLANS[name].id_regex
+    assert two_letter_code(name) == regex.pattern.split("_")[1]
+    for length in (7, 12):
+        minter = IdentifierMinter(seed=name, length=length)
+        for step in (0, 1, 999, 99999):
+            assert regex.match(minter.mint(name, step=step))
+            for identifier in minter.mint_many(name, 100, step=step):
+                assert regex.match(identifier)
+        assert regex.match(mint_from_content(name, "a", length=length))
+
+
+def test_bulk_minting_is_deterministic():
+    minter = IdentifierMinter(seed=1)
+    ids = [minter.mint("waveform_trace") for _ in range(5)]
+    assert minter.count == 5
+    assert minter.mint_many("waveform_trace", 5).tolist() != ids
+    assert IdentifierMinter(seed=1).mint_many(
+        "waveform_trace", 5).tolist() == ids
+    assert IdentifierMinter(seed=1, start=2).mint("waveform_trace") == ids[2]
+    assert IdentifierMinter(seed=2).mint_many(
+        "waveform_trace", 5).tolist() != ids
+    assert IdentifierMinter(seed="1").mint("waveform_trace") == ids[0]
+
+    assert mint_from_content("detrend", b"abc") == \
+        mint_from_content("detrend", "abc")
+    assert mint_from_content("detrend", "abc") != \
+        mint_from_content("detrend", "abd")
+
+
+@pytest.mark.parametrize("length", [7, 12])
+def test_no_collisions_across_workers(length):
+    minters = [IdentifierMinter(seed=3, worker=_i, workers=4, length=length)
+               for _i in range(4)]
+    ids = []
+    for minter in minters:
+        ids.extend(minter.mint_many("file", 50000).tolist())
+        ids.extend(minter.mint("file") for _ in range(10))
+    assert len(set(ids)) == len(ids) == 4 * 50010
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        two_letter_code("something")
+    with pytest.raises(ValueError):
+        IdentifierMinter().mint("waveform_trace", step=100000)
+    with pytest.raises(ValueError):
+        IdentifierMinter(length=6)
+    with pytest.raises(ValueError):
+        IdentifierMinter(worker=2, workers=2)
+    with pytest.raises(ValueError):
+        mint_from_content("file", "a", length=13)
+
+    minter = IdentifierMinter(length=7, worker=1, workers=3)
+    assert minter.capacity == (2 ** 36 - 2) // 3 + 1
+    minter = IdentifierMinter(length=7, start=2 ** 36 - 2)
+    assert len(minter.mint_many("file", 2)) == 2
+    with pytest.raises(ValueError):
+        minter.mint("file")
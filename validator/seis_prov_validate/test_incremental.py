@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Test cases for the incremental validation.
+
+:copyright:
+    Lion Krischer (lion.krischer@googlemail.com), 2015
+:license:
+    BSD 3-Clause ("BSD New" or "BSD Simplified")
+"""
+import prov.model
+import pytest
+
+from seis_prov_validate.incremental import ValidationSession
+from seis_prov_validate.synthetic import CorpusGenerator
+from seis_prov_validate.validator import validate_document
+
+
+def _read_corpus(tmpdir, **kwargs):
+    filename = str(tmpdir.join("corpus.json"))
+    CorpusGenerator(traces=4, bundles=2, seed=0, **kwargs).write(filename)
+    return prov.model.ProvDocument.deserialize(filename, format="json")
+
+
+def _grow(full, steps):
+    """
+    Yields a document growing in the given number of steps to the full
+    document together with the number of records added in each step.
+    """
+    doc = prov.model.ProvDocument()
+    for ns in full.namespaces:
+        doc.add_namespace(ns)
+    containers = [(full, doc)] + [(_i, doc.bundle(_i.identifier))
+                                  for _i in full.bundles]
+    records = [(target, _i) for source, target in containers
+               for _i in source._records]
+    step = len(records) // steps + 1
+    for i in range(0, len(records), step):
+        for target, record in records[i:i + step]:
+            target.add_record(record)
+        yield doc, len(records[i:i + step])
+
+
+def _assert_same_result(session, doc, **kwargs):
+    result = session.validate(doc, **kwargs)
+    expected = validate_document(doc, **kwargs)
+    assert result.errors == expected.errors
+    assert result.warnings == expected.warnings
+    return result
+
+
+@pytest.mark.parametrize("violations", [
+    None, {"label": 0.1, "missing_attribute": 0.1, "pattern": 0.1},
+    {"duplicate_id": 0.2}])
+def test_growing_document(tmpdir, violations):
+    full = _read_corpus(tmpdir, violations=violations)
+    session = ValidationSession()
+    for doc, added in _grow(full, steps=7):
+        _assert_same_result(session, doc, all_errors=True)
+        if violations and "duplicate_id" in violations:
+            # Records identical to earlier ones are not checked again.
+            assert 0 < session.checked_records <= added
+        else:
+            assert session.checked_records == added
+
+        # Nothing has to be checked if the document did not change.
+        _assert_same_result(session, doc)
+        _assert_same_result(session, doc, all_errors=True, max_errors=2)
+        assert session.checked_records == 0
+
+    if violations is None:
+        assert session.validate(full).is_valid
+
+
+def test_changed_and_removed_records(tmpdir):
+    doc = _read_corpus(tmpdir)
+    session = ValidationSession()
+    assert session.validate(doc, all_errors=True).is_valid
+
+    bundle = list(doc.bundles)[0]
+    entities = [_i for _i in bundle._records
+                if isinstance(_i, prov.model.ProvEntity)]
+
+    # Changing a record only checks that record.
+    record = entities[0]
+    record.add_attributes({"prov:label": "Something Else"})
+    result = _assert_same_result(session, doc, all_errors=True)
+    assert len(result.errors) == 1
+    assert session.checked_records == 1
+
+    # Removing records updates the checks across records.
+    generation = [_i for _i in bundle._records
+                  if isinstance(_i, prov.model.ProvGeneration)][0]
+    entity = generation.formal_attributes[0][1]
+    bundle._records = [
+        _i for _i in bundle._records
+        if _i.identifier != entity or _i is generation]
+    result = _assert_same_result(session, doc, all_errors=True)
+    assert session.checked_records == 0
+    assert "not defined in the document: '%s'" % entity in \
+        result.warnings[0]
+
+    # A copy of an existing entity is a duplicate.
+    copy = entities[-1]
+    doc.add_record(copy)
+    result = _assert_same_result(session, doc, all_errors=True)
+    assert "used more than once: '%s'" % copy.identifier.localpart in \
+        result.errors[-1]
+    assert session.checked_records == 0
+
+
+def test_changed_namespace():
+    doc = prov.model.ProvDocument()
+    doc.add_namespace("seis_prov", "http://seisprov.org/seis_prov/0.1/#")
+    doc.entity("seis_prov:sp001_wf_aaaaaaa", other_attributes=(
+        ("prov:label", "Waveform Trace"),
+        ("prov:type", "seis_prov:waveform_trace")))
+    session = ValidationSession()
+    assert session.validate(doc, stats=True).stats["records"] == 1
+    assert session.checked_records == 1
+
+    other = prov.model.ProvDocument()
+    other.add_namespace("sp", "http://seisprov.org/seis_prov/0.1/#")
+    other.entity("sp:sp001_wf_aaaaaaa", other_attributes=(
+        ("prov:label", "Waveform Trace"),
+        ("prov:type", "sp:waveform_trace")))
+    _assert_same_result(session, other)
+    assert session.checked_records == 1
+
+    with pytest.raises(TypeError):
+        session.validate("file.xml")
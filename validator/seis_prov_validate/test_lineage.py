@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Test cases for the lineage queries.
+
+:copyright:
+    Lion Krischer (lion.krischer@googlemail.com), 2015
+:license:
+    BSD 3-Clause ("BSD New" or "BSD Simplified")
+"""
+import glob
+import inspect
+import os
+
+import prov.model
+import pytest
+
+from seis_prov_validate.lineage import LineageGraph
+from seis_prov_validate.synthetic import CorpusGenerator
+from seis_prov_validate.validator import SEIS_PROV_NAMESPACE
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(
+    inspect.getfile(inspect.currentframe()))), "test_data")
+
+VALID_FILES = sorted(glob.glob(os.path.join(DATA_DIR, "valid_files", "*")))
+
+
+def _names(nodes):
+    return [_i.name for _i in nodes]
+
+
+@pytest.fixture(scope="module")
+def corpus(tmpdir_factory):
+    filename = str(tmpdir_factory.mktemp("lineage").join("corpus.xml"))
+    CorpusGenerator(traces=3, scenario="adjoint", bundles=1,
+                    seed=0).write(filename)
+    return filename
+
+
+@pytest.mark.parametrize("filename", VALID_FILES)
+def test_same_graph_for_prov_documents(filename):
+    graph = LineageGraph(filename)
+    fileformat = "xml" if filename.endswith(".xml") else "json"
+    other = LineageGraph(prov.model.ProvDocument.deserialize(
+        filename, format=fileformat))
+    assert _names(graph.nodes) == _names(other.nodes)
+    for node in graph.nodes:
+        assert _names(graph.ancestors(node)) == \
+            _names(other.ancestors(node))
+        assert _names(graph.descendants(node)) == \
+            _names(other.descendants(node))
+
+
+def test_ancestors_and_descendants(corpus):
+    graph = LineageGraph(corpus)
+    source = graph.node(graph.nodes[-1])
+    assert source.seis_prov_type == "adjoint_source"
+    assert source.record_type == "entity"
+    assert source.label == "Adjoint Source"
+
+    ancestors = graph.ancestors(source)
+    types = set(_i.seis_prov_type for _i in ancestors)
+    assert set(["waveform_trace", "waveform_simulation", "detrend",
+                "calculate_adjoint_source", "software_agent", "person",
+                "earth_model", "input_parameters"]).issubset(types)
+    # Only the lineage of this trace.
+    assert len(graph.ancestors(source, types="calculate_adjoint_source")) \
+        == 1
+
+    # Filters.
+    agents = graph.ancestors(source, record_types="agent")
+    assert agents and all(_i.record_type == "agent" for _i in agents)
+    assert _names(graph.ancestors(source, types=["person"])) == _names(
+        [_i for _i in agents if _i.seis_prov_type == "person"])
+    raw = graph.ancestors(source, types="waveform_trace",
+                          attributes={"description": "Observed Data"})
+    assert len(raw) == 1
+    assert graph.ancestors(source, attributes={
+        "sampling_rate": lambda x: x > 1E6}) == []
+    activity = graph.parents(source)[0]
+    assert _names(graph.parents(source)) == [activity.name]
+    assert activity.seis_prov_type == "calculate_adjoint_source"
+    assert graph.children(activity) == [source]
+
+    # All adjoint sources derive from the single simulation.
+    simulation = graph.ancestors(source, types="waveform_simulation")[0]
+    assert len(graph.descendants(simulation, types="adjoint_source")) == 3
+    for node in graph.descendants(simulation):
+        assert simulation in graph.ancestors(node)
+
+    # Different ways to refer to the same element.
+    localpart = source.identifier[len(SEIS_PROV_NAMESPACE):]
+    for identifier in (source.identifier, source.name, localpart):
+        assert identifier in graph
+        assert graph.node(identifier) is source
+    assert "sp000_wf_unknown" not in graph
+    with pytest.raises(KeyError):
+        graph.ancestors("sp000_wf_unknown")
+    with pytest.raises(ValueError):
+        LineageGraph(corpus, relations=["hadMember"])
+
+
+def test_cached_closures(corpus):
+    graph = LineageGraph(corpus, cache_size=4)
+    nodes = graph.nodes
+    expected = graph.ancestors(nodes[-1])
+    assert graph.cache_info() == (0, 1, 4, 1)
+    assert graph.ancestors(nodes[-1]) == expected
+    assert graph.cache_info().hits == 1
+
+    # Least recently used closures are evicted.
+    for node in nodes[:4]:
+        graph.descendants(node)
+    info = graph.cache_info()
+    assert info.currsize == 4
+    assert info.misses == 5
+    assert graph.ancestors(nodes[-1]) == expected
+    assert graph.cache_info().misses == 6
+
+    # Closures reused for other nodes give the same results.
+    uncached = LineageGraph(corpus, cache_size=0)
+    for node in reversed(nodes):
+        assert _names(graph.ancestors(node)) == \
+            _names(uncached.ancestors(node))
+    assert uncached.cache_info().currsize == 0
+
+    graph.clear_cache()
+    assert graph.cache_info() == (0, 0, 4, 0)
+
+
+def test_cycles_and_undefined_elements():
+    doc = prov.model.ProvDocument()
+    doc.add_namespace("seis_prov", SEIS_PROV_NAMESPACE)
+    doc.add_namespace("ex", "http://example.com/#")
+    a = doc.entity("seis_prov:sp001_wf_aaaaaaa", other_attributes=(
+        ("prov:label", "Waveform Trace"),
+        ("prov:type", "seis_prov:waveform_trace")))
+    b = doc.entity("ex:b")
+    doc.wasDerivedFrom(a, b)
+    doc.wasDerivedFrom(b, a)
+    doc.wasDerivedFrom(b, "ex:undefined")
+
+    graph = LineageGraph(doc)
+    assert _names(graph.ancestors("sp001_wf_aaaaaaa")) == ["ex:b",
+                                                           "ex:undefined"]
+    assert _names(graph.ancestors("ex:b")) == ["seis_prov:sp001_wf_aaaaaaa",
+                                               "ex:undefined"]
+    assert graph.node("ex:undefined").record_type is None
+    assert graph.node("ex:b").seis_prov_type is None
+    assert _names(graph.descendants("ex:undefined")) == [
+        "seis_prov:sp001_wf_aaaaaaa", "ex:b"]
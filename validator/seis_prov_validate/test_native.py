@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Test cases for the native reader.
+
+:copyright:
+    Lion Krischer (lion.krischer@googlemail.com), 2015
+:license:
+    BSD 3-Clause ("BSD New" or "BSD Simplified")
+"""
+import glob
+import inspect
+import io
+import os
+
+import prov.model
+import pytest
+
+from seis_prov_validate import native
+from seis_prov_validate.synthetic import CorpusGenerator, VIOLATIONS
+from seis_prov_validate.validator import (
+    SEIS_PROV_NAMESPACE, Validator, _ValidationContext, _get_validation_plan,
+    _get_validator, _parse_file, _read_prov_document, validate)
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(
+    inspect.getfile(inspect.currentframe()))), "test_data")
+
+FILES = sorted(glob.glob(os.path.join(DATA_DIR, "*", "*.*")))
+VALID_FILES = sorted(glob.glob(os.path.join(DATA_DIR, "valid_files", "*")))
+
+
+def _parse(filename):
+    with io.open(filename, "rb") as fh:
+        return _parse_file(fh)
+
+
+def _assert_same_result(filename, **kwargs):
+    result = validate(filename, native=True, **kwargs)
+    expected = validate(filename, native=False, **kwargs)
+    assert result.errors == expected.errors
+    assert result.warnings == expected.warnings
+    return result
+
+
+def _prov_records(doc):
+    """
+    The records of a prov document in the form of the native reader.
+    """
+    def value(v):
+        if isinstance(v, prov.model.QualifiedName):
+            return v.uri
+        return v
+
+    containers = [doc] + sorted(doc.bundles, key=lambda x: x.identifier.uri)
+    records = []
+    for container in containers:
+        for record in container._records:
+            attributes = list(record.attributes)
+            records.append((
+                prov.model.PROV_N_MAP[record.get_type()],
+                record.identifier.uri if record.identifier else None,
+                sorted(str(value(v)) for k, v in attributes
+                       if k == prov.model.PROV_TYPE),
+                sorted(v for k, v in attributes
+                       if k == prov.model.PROV_LABEL),
+                sorted((k.localpart, str(value(v))) for k, v in attributes
+                       if isinstance(k, prov.model.QualifiedName) and
+                       k.namespace.uri == SEIS_PROV_NAMESPACE)))
+    return records
+
+
+def _native_records(doc):
+    def value(v):
+        return v.uri if isinstance(v, native.QName) else v
+
+    bundles = sorted(doc.bundles, key=lambda x: x[0].uri)
+    return [(r.record_type, r.identifier.uri if r.identifier else None,
+             sorted(str(value(_i)) for _i in r.prov_types),
+             sorted(r.labels),
+             sorted((_i[0], str(value(_i[1]))) for _i in r.attributes))
+            for records in [doc.records] + [_i[1] for _i in bundles]
+            for r in records]
+
+
+@pytest.mark.parametrize("filename", VALID_FILES)
+def test_read_valid_files(filename):
+    fileformat, parsed = _parse(filename)
+    doc = native.read(fileformat, parsed)
+    # The prov package modifies the parsed JSON objects.
+    expected = _read_prov_document(*_parse(filename))
+    assert _native_records(doc) == _prov_records(expected)
+    assert _native_records(native.from_prov_document(expected)) == \
+        _prov_records(expected)
+    assert doc.seis_prov_prefix == ([
+        _i.prefix for _i in expected.namespaces
+        if _i.uri == SEIS_PROV_NAMESPACE] or [None])[0]
+
+    if fileformat == "xml":
+        # All valid files are validated without the prov package.
+        with _ValidationContext(_get_validator()):
+            assert native.validate_native_document(
+                doc, _get_validation_plan()) is True
+
+
+@pytest.mark.parametrize("filename", FILES)
+def test_same_results(filename):
+    _assert_same_result(filename)
+    _assert_same_result(filename, all_errors=True)
+    _assert_same_result(filename, xsd_roundtrip=True)
+
+
+@pytest.mark.parametrize("filename", [_i for _i in FILES
+                                      if _i.endswith(".xml")])
+def test_xsd_validation_runs_once(filename, monkeypatch):
+    from seis_prov_validate import validator
+
+    calls = []
+    original = validator._validate_against_xsd_scheme
+
+    def counting(*args, **kwargs):
+        calls.append(args)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(validator, "_validate_against_xsd_scheme", counting)
+    expected = validate(filename, native=False, all_errors=True)
+    del calls[:]
+    result = validate(filename, native=True, all_errors=True)
+    assert result.errors == expected.errors
+    assert len(calls) <= 1
+
+
+@pytest.mark.parametrize("violation", (None,) + VIOLATIONS)
+@pytest.mark.parametrize("fileformat", ["xml", "json"])
+def test_same_results_for_corpora(tmpdir, violation, fileformat):
+    for bundles, scenario in ((0, "processing"), (2, "adjoint")):
+        filename = str(tmpdir.join("corpus.%s" % fileformat))
+        CorpusGenerator(
+            traces=3, scenario=scenario, bundles=bundles, seed=bundles,
+            violations={violation: 0.3} if violation else None).write(
+                filename)
+        result = _assert_same_result(filename, all_errors=True)
+        if violation is None:
+            assert result.is_valid
+
+
+def test_relations_and_references():
+    fileformat, parsed = _parse(os.path.join(
+        DATA_DIR, "valid_files", "dangling_reference.xml"))
+    doc = native.read(fileformat, parsed)
+    relations = [_i for _i in doc.records if _i.references]
+    assert relations
+    for relation in relations:
+        assert relation.record_type not in ("entity", "activity", "agent")
+        for attribute, identifier in relation.references:
+            assert attribute.startswith("prov:")
+            assert isinstance(identifier, native.QName)
+
+    result = _assert_same_result(os.path.join(
+        DATA_DIR, "valid_files", "dangling_reference.xml"))
+    assert "not defined in the document" in result.warnings[0]
+
+
+def test_unsupported_documents():
+    filename = os.path.join(DATA_DIR, "valid_files",
+                            "waveform_trace_min.xml")
+    with io.open(filename, "rb") as fh:
+        data = fh.read()
+    # A namespace declared on a nested element.
+    data = data.replace(
+        b"<prov:entity ",
+        b'<prov:entity xmlns:other="http://example.com/#" ', 1)
+    fileformat, parsed = _parse_file(io.BytesIO(data))
+    with pytest.raises(native.UnsupportedDocument):
+        native.read(fileformat, parsed)
+    result = validate(io.BytesIO(data), native=True)
+    assert result.is_valid
+    assert result.errors == validate(io.BytesIO(data), native=False).errors
+
+    # Can be switched off.
+    validator = Validator(native=False)
+    assert validator.native is False
+    assert validator.validate(io.BytesIO(data)).is_valid
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Test cases for the HTTP validation service.
+
+:copyright:
+    Lion Krischer (lion.krischer@googlemail.com), 2015
+:license:
+    BSD 3-Clause ("BSD New" or "BSD Simplified")
+"""
+import glob
+import inspect
+import io
+import json
+import multiprocessing
+import os
+import threading
+
+import pytest
+from six.moves.http_client import HTTPConnection
+from six.moves.urllib.error import HTTPError
+from six.moves.urllib.request import Request, urlopen
+
+from seis_prov_validate import service as service_module
+from seis_prov_validate.service import ValidationService
+from seis_prov_validate.validator import validate
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(
+    inspect.getfile(inspect.currentframe()))), "test_data")
+
+FILES = sorted(glob.glob(os.path.join(DATA_DIR, "*", "*.*")))
+
+
+@pytest.fixture(scope="module")
+def service():
+    server = ValidationService(0, workers=2, max_size=128 * 1024,
+                               quiet=True)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    server.shutdown()
+    thread.join()
+    server.server_close()
+
+
+def _request(service, path, data=None):
+    url = "http://127.0.0.1:%i%s" % (service.port, path)
+    try:
+        response = urlopen(Request(url, data=data), timeout=60)
+    except HTTPError as e:
+        response = e
+    with response:
+        return response.getcode(), json.loads(response.read().decode("utf-8"))
+
+
+def test_validate(service):
+    for filename in FILES:
+        with io.open(filename, "rb") as fh:
+            data = fh.read()
+        status, response = _request(service, "/validate", data)
+        assert status == 200
+        expected = validate(io.BytesIO(data))
+        assert response["is_valid"] is expected.is_valid
+        assert response["errors"] == expected.errors
+        assert response["warnings"] == expected.warnings
+        assert response["stats"] is None
+
+    with io.open(os.path.join(DATA_DIR, "invalid_files", "no_label.xml"),
+                 "rb") as fh:
+        data = fh.read()
+    status, response = _request(
+        service, "/validate?all_errors=true&max_errors=1&stats", data)
+    assert status == 200
+    assert response["warnings"] == ["Validation stopped after 1 errors."]
+    assert response["stats"]["records"] > 0
+
+
+def test_invalid_requests(service):
+    assert _request(service, "/validate?unknown=1", b"")[0] == 400
+    assert _request(service, "/validate?stats=maybe", b"")[0] == 400
+    assert _request(service, "/other", b"")[0] == 404
+    assert _request(service, "/other")[0] == 404
+    status, response = _request(service, "/validate",
+                                b" " * (128 * 1024 + 1))
+    assert status == 413
+    assert "limited to" in response["error"]
+
+    for length in ("abc", "-1", ""):
+        connection = HTTPConnection("127.0.0.1", service.port, timeout=60)
+        connection.putrequest("POST", "/validate")
+        connection.putheader("Content-Length", length)
+        connection.endheaders()
+        response = connection.getresponse()
+        assert response.status == 400
+        assert json.loads(response.read().decode("utf-8")) == {
+            "error": "Invalid Content-Length."}
+        connection.close()
+
+
+def test_metrics(service):
+    _, before = _request(service, "/metrics")
+    with io.open(FILES[-1], "rb") as fh:
+        data = fh.read()
+
+    threads = [threading.Thread(target=_request,
+                                args=(service, "/validate", data))
+               for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    status, metrics = _request(service, "/metrics")
+    assert status == 200
+    assert metrics["workers"] == 2
+    assert metrics["in_flight"] == 0
+    assert metrics["queue_depth"] == 0
+    assert metrics["requests"]["/validate 200"] == \
+        before["requests"].get("/validate 200", 0) + 6
+    assert metrics["requests"]["/metrics 200"] >= 1
+    assert metrics["results"]["valid"] == before["results"]["valid"] + 6
+
+    buckets = metrics["latency"]["buckets"]
+    assert buckets[-1]["le"] == "+Inf"
+    assert buckets[-1]["count"] == metrics["latency"]["count"] == \
+        metrics["results"]["valid"] + metrics["results"]["invalid"]
+    counts = [_i["count"] for _i in buckets]
+    assert counts == sorted(counts)
+    assert metrics["latency"]["sum"] > before["latency"]["sum"]
+
+
+def _crash_on_request(file_object, **kwargs):
+    if file_object.read() == b"crash":
+        os._exit(1)
+    file_object.seek(0, 0)
+    return validate(file_object, **kwargs)
+
+
+@pytest.mark.skipif(
+    getattr(multiprocessing, "get_start_method", lambda: "fork")() !=
+    "fork", reason="The workers must inherit the patched validation.")
+def test_dead_worker(monkeypatch):
+    monkeypatch.setattr(service_module, "validate", _crash_on_request)
+    server = ValidationService(0, workers=1, quiet=True, timeout=1.0)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        status, response = _request(server, "/validate", b"crash")
+        assert status == 503
+        assert "1 seconds" in response["error"]
+
+        # The pool has been replaced and validations work again.
+        with io.open(FILES[-1], "rb") as fh:
+            data = fh.read()
+        status, response = _request(server, "/validate", data)
+        assert status == 200
+        assert response["is_valid"] is validate(io.BytesIO(data)).is_valid
+
+        _, metrics = _request(server, "/metrics")
+        assert metrics["in_flight"] == 0
+        assert metrics["pool_restarts"] == 1
+        assert metrics["requests"]["/validate 503"] == 1
+        assert metrics["latency"]["count"] == 1
+    finally:
+        server.shutdown()
+        thread.join()
+        server.server_close()
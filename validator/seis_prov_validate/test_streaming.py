@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Test cases for the streaming validation.
+
+:copyright:
+    Lion Krischer (lion.krischer@googlemail.com), 2015
+:license:
+    BSD 3-Clause ("BSD New" or "BSD Simplified")
+"""
+import glob
+import inspect
+import io
+import json
+import os
+
+import pytest
+
+from seis_prov_validate.streaming import _JSONStreamReader
+from seis_prov_validate.validator import validate
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(
+    inspect.getfile(inspect.currentframe()))), "test_data")
+
+VALID_XML_FILES = sorted(
+    glob.glob(os.path.join(DATA_DIR, "valid_files", "*.xml")))
+INVALID_XML_FILES = sorted(
+    glob.glob(os.path.join(DATA_DIR, "invalid_files", "*.xml")))
+VALID_JSON_FILES = sorted(
+    glob.glob(os.path.join(DATA_DIR, "valid_files", "*.json")))
+INVALID_JSON_FILES = sorted(
+    glob.glob(os.path.join(DATA_DIR, "invalid_files", "*.json")))
+
+# Invalid files for which the streaming validation reports a different, but
+# equally correct, first error.
+DIFFERENT_ERRORS = [
+    "wrong_type_in_attribute_negative_instead_of_positive_integer.xml",
+    "wrong_type_in_attribute_str_instead_of_float.xml"]
+
+
+@pytest.mark.parametrize("filename", VALID_XML_FILES)
+def test_valid_xml_files(filename):
+    result = validate(filename, streaming=True)
+    expected = validate(filename)
+    assert result.is_valid is True
+    assert result.warnings == expected.warnings
+
+
+@pytest.mark.parametrize("filename", INVALID_XML_FILES)
+def test_invalid_xml_files(filename):
+    result = validate(filename, streaming=True)
+    assert result.is_valid is False
+    if os.path.basename(filename) not in DIFFERENT_ERRORS:
+        expected = validate(filename)
+        assert result.errors == expected.errors
+        assert result.warnings == expected.warnings
+
+
+def _waveform_traces(count, bundles=0):
+    header = (
+        '<prov:document xmlns:prov="http://www.w3.org/ns/prov#" '
+        'xmlns:seis_prov="http://seisprov.org/seis_prov/0.1/#" '
+        'xmlns:xsd="http://www.w3.org/2001/XMLSchema" '
+        'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">\n')
+    record = (
+        '  <prov:entity prov:id="seis_prov:sp%03i_wf_%07i">\n'
+        '    <prov:label>Waveform Trace</prov:label>\n'
+        '    <prov:type xsi:type="xsd:string">seis_prov:waveform_trace'
+        '</prov:type>\n'
+        '    <seis_prov:sampling_rate xsi:type="xsd:double">%i.0'
+        '</seis_prov:sampling_rate>\n'
+        '  </prov:entity>\n')
+    parts = [header]
+    parts.extend(record % (_i % 1000, _i, _i + 1) for _i in range(count))
+    for b in range(bundles):
+        parts.append('  <prov:bundleContent prov:id="seis_prov:b%i">\n' % b)
+        parts.extend(record % (_i % 1000, (b + 1) * count + _i, _i + 1)
+                     for _i in range(count))
+        parts.append('  </prov:bundleContent>\n')
+    parts.append('</prov:document>\n')
+    return "".join(parts).encode("utf-8")
+
+
+def test_many_records_and_bundles():
+    with io.BytesIO(_waveform_traces(2000, bundles=3)) as buf:
+        result = validate(buf, streaming=True)
+    assert result.errors == []
+    assert result.warnings == []
+
+
+def test_records_after_bundle():
+    data = _waveform_traces(5, bundles=2)
+    # Move the records of the document itself behind the bundles.
+    header, rest = data.split(b"  <prov:entity ", 1)
+    records, bundles = (b"  <prov:entity " + rest).split(
+        b"  <prov:bundleContent ", 1)
+    bundles, footer = (b"  <prov:bundleContent " + bundles).rsplit(
+        b"</prov:document>", 1)
+    data = header + bundles + records + b"</prov:document>" + footer
+    assert data.index(b"</prov:bundleContent>") < data.index(
+        b"sp000_wf_0000000")
+
+    expected = validate(io.BytesIO(data), stats=True)
+    assert expected.is_valid
+    with io.BytesIO(data) as buf:
+        result = validate(buf, streaming=True, stats=True)
+    assert result.errors == []
+    assert result.warnings == []
+    assert result.stats["records"] == expected.stats["records"] == 15
+    assert result.stats["bundles"] == 2
+
+    # Ids are checked across the bundles and these records.
+    data = data.replace(b"sp004_wf_0000004", b"sp000_wf_0000005")
+    with io.BytesIO(data) as buf:
+        result = validate(buf, streaming=True)
+    assert result.errors == [
+        "One or more ids have been used more than once: 'sp000_wf_0000005'"]
+    assert result.errors == validate(io.BytesIO(data)).errors
+
+
+def test_bundle_without_id():
+    data = _waveform_traces(3, bundles=2).replace(
+        b'<prov:bundleContent prov:id="seis_prov:b1"',
+        b"<prov:bundleContent")
+    assert not validate(io.BytesIO(data)).is_valid
+    with io.BytesIO(data) as buf:
+        result = validate(buf, streaming=True, all_errors=True)
+    assert len(result.errors) == 1
+    assert result.errors[0].startswith(
+        "Could not parse the file: The bundle in line ")
+    assert result.errors[0].endswith(" does not have an id.")
+
+
+def test_error_in_late_record():
+    data = _waveform_traces(2000).replace(
+        b"<prov:label>Waveform Trace</prov:label>\n"
+        b"    <prov:type xsi:type=\"xsd:string\">seis_prov:waveform_trace"
+        b"</prov:type>\n    <seis_prov:sampling_rate xsi:type=\"xsd:double\">"
+        b"1999.0",
+        b"<prov:label>Random</prov:label>\n"
+        b"    <prov:type xsi:type=\"xsd:string\">seis_prov:waveform_trace"
+        b"</prov:type>\n    <seis_prov:sampling_rate xsi:type=\"xsd:double\">"
+        b"1999.0")
+    with io.BytesIO(data) as buf:
+        result = validate(buf, streaming=True)
+    assert result.errors == [
+        "Record 'seis_prov:sp998_wf_0001998' has label 'Random' instead of "
+        "'Waveform Trace'."]
+
+
+def test_document_type_declaration():
+    # Entities used to crash the schema validating parser.
+    data = _waveform_traces(3, bundles=1)
+    data = b'<!DOCTYPE document [<!ENTITY e "Trace">]>\n' + \
+        data.replace(b"Waveform Trace", b"Waveform &e;", 1)
+    expected = validate(io.BytesIO(data))
+    assert len(expected.errors) == 1
+    assert "has label 'Waveform '" in expected.errors[0]
+    with io.BytesIO(data) as buf:
+        assert validate(buf, streaming=True).errors == expected.errors
+
+    data = b"<!DOCTYPE document>\n" + _waveform_traces(3)
+    with io.BytesIO(data) as buf:
+        assert validate(buf, streaming=True).is_valid
+
+
+def test_truncated_file():
+    data = _waveform_traces(100)[:-200]
+    with io.BytesIO(data) as buf:
+        result = validate(buf, streaming=True)
+    assert result.errors == [
+        "File is neither a valid JSON nor a valid XML file."]
+
+
+@pytest.mark.parametrize("filename", VALID_JSON_FILES)
+def test_valid_json_files(filename):
+    result = validate(filename, streaming=True)
+    expected = validate(filename)
+    assert result.is_valid is True
+    assert result.warnings == expected.warnings
+
+
+@pytest.mark.parametrize("filename", INVALID_JSON_FILES)
+def test_invalid_json_files(filename):
+    result = validate(filename, streaming=True)
+    expected = validate(filename)
+    assert result.is_valid is False
+    assert result.errors == expected.errors
+    assert result.warnings == expected.warnings
+
+
+def test_json_reader_small_chunks():
+    data = {"prefix": {"a": "http://example.org/#"},
+            "entity": {"a:1": {"prov:label": "\u00fc" * 20, "b": [1.5, 2]},
+                       "a:2": {}},
+            "number": 123456789}
+    buf = io.BytesIO(b"\xef\xbb\xbf" + json.dumps(data).encode("utf-8"))
+    reader = _JSONStreamReader(buf, chunk_size=3)
+    result = {}
+    for key in reader.iter_object():
+        if key == "entity":
+            result[key] = {}
+            for rec_id in reader.iter_object():
+                result[key][rec_id] = reader.decode_value()
+        else:
+            result[key] = reader.decode_value()
+    reader.finish()
+    assert result == data
+
+
+def _waveform_traces_json(count, bundles=0):
+    def records(offset):
+        return {
+            "seis_prov:sp%03i_wf_%07i" % (_i % 1000, offset + _i): {
+                "prov:label": "Waveform Trace",
+                "prov:type": "seis_prov:waveform_trace",
+                "seis_prov:sampling_rate": {"$": _i + 1.0,
+                                            "type": "xsd:double"}}
+            for _i in range(count)}
+
+    doc = {"prefix": {"seis_prov": "http://seisprov.org/seis_prov/0.1/#"},
+           "entity": records(0)}
+    if bundles:
+        doc["bundle"] = {"seis_prov:b%i" % _i: {
+            "entity": records((_i + 1) * count)} for _i in range(bundles)}
+    # Sorted keys put the prefixes after the records.
+    return json.dumps(doc, sort_keys=True).encode("utf-8")
+
+
+def test_many_json_records_and_bundles():
+    data = _waveform_traces_json(2000, bundles=3)
+    with io.BytesIO(data) as buf:
+        result = validate(buf, streaming=True)
+    assert result.errors == []
+    assert result.warnings == []
+
+
+def test_duplicate_ids_in_json_bundles():
+    data = _waveform_traces_json(10, bundles=1).replace(
+        b"sp000_wf_0000010", b"sp000_wf_0000000")
+    with io.BytesIO(data) as buf:
+        result = validate(buf, streaming=True)
+    assert result.errors == [
+        "One or more ids have been used more than once: 'sp000_wf_0000000'"]
+
+
+def test_json_bundle_with_undeclared_prefix():
+    data = json.dumps({"bundle": {"nope:x": {"entity": {"nope:a": {}}}}})
+    assert not validate(io.BytesIO(data.encode())).is_valid
+    with io.BytesIO(data.encode()) as buf:
+        result = validate(buf, streaming=True)
+    assert result.errors == [
+        "Could not parse the file: The bundle 'nope:x' does not have a "
+        "valid identifier."]
+
+
+def test_error_in_late_json_record():
+    data = json.loads(_waveform_traces_json(2000).decode("utf-8"))
+    data["entity"]["seis_prov:sp998_wf_0001998"]["prov:label"] = "Random"
+    with io.BytesIO(json.dumps(data).encode("utf-8")) as buf:
+        result = validate(buf, streaming=True)
+    assert result.errors == [
+        "Record 'seis_prov:sp998_wf_0001998' has label 'Random' instead of "
+        "'Waveform Trace'."]
+
+
+def test_truncated_json_file():
+    data = _waveform_traces_json(100)[:-200]
+    with io.BytesIO(data) as buf:
+        result = validate(buf, streaming=True)
+    assert result.errors == [
+        "File is neither a valid JSON nor a valid XML file."]
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Test cases for the synthetic document generator.
+
+:copyright:
+    Lion Krischer (lion.krischer@googlemail.com), 2015
+:license:
+    BSD 3-Clause ("BSD New" or "BSD Simplified")
+"""
+import io
+
+import pytest
+
+from seis_prov_validate.synthetic import (CorpusGenerator, SCENARIOS,
+                                          VIOLATIONS, main)
+from seis_prov_validate.validator import validate
+
+
+@pytest.mark.parametrize("scenario", SCENARIOS)
+@pytest.mark.parametrize("format", ["xml", "json"])
+@pytest.mark.parametrize("bundles", [0, 3])
+def test_generated_documents_are_valid(tmpdir, scenario, format, bundles):
+    filename = str(tmpdir.join("corpus.%s" % format))
+    generator = CorpusGenerator(traces=7, scenario=scenario,
+                                bundles=bundles)
+    assert generator.write(filename) == {}
+
+    for streaming in (False, True):
+        result = validate(filename, streaming=streaming)
+        assert result.is_valid, str(result)
+        assert result.warnings == []
+
+
+def test_processing_chain(tmpdir):
+    filename = str(tmpdir.join("corpus.xml"))
+    CorpusGenerator(traces=2, chain=["taper", "bandpass_filter"]).write(
+        filename)
+    with io.open(filename, "rt") as fh:
+        content = fh.read()
+    assert content.count("<prov:softwareAgent ") == 1
+    assert content.count('"xsd:string">seis_prov:waveform_trace<') == 6
+    assert content.count('"xsd:string">seis_prov:taper<') == 2
+    assert content.count('"xsd:string">seis_prov:bandpass_filter<') == 2
+    assert content.count("<prov:wasAssociatedWith>") == 4
+    assert content.count("<prov:used>") == 4
+    assert content.count("<prov:wasGeneratedBy>") == 4
+    assert validate(filename).is_valid
+
+
+@pytest.mark.parametrize("format", ["xml", "json"])
+def test_input_parameters(tmpdir, format):
+    filename = str(tmpdir.join("corpus.%s" % format))
+    CorpusGenerator(traces=3, scenario="parameters", bundles=2,
+                    parameters=100).write(filename)
+    with io.open(filename, "rt") as fh:
+        content = fh.read()
+    assert content.count("seis_prov:PARAMETER_") == 3 * 100 * (
+        2 if format == "xml" else 1)
+    assert validate(filename).is_valid
+
+
+@pytest.mark.parametrize("violation", VIOLATIONS)
+@pytest.mark.parametrize("format", ["xml", "json"])
+@pytest.mark.parametrize("scenario", SCENARIOS)
+def test_injected_violations(tmpdir, violation, format, scenario):
+    filename = str(tmpdir.join("corpus.%s" % format))
+    total = 0
+    for seed in (1, 2, 12345):
+        generator = CorpusGenerator(traces=10, scenario=scenario, bundles=2,
+                                    violations={violation: 0.2}, seed=seed)
+        injected = generator.write(filename)
+        assert set(injected) <= set([violation])
+        count = injected.get(violation, 0)
+        total += count
+
+        for streaming in (False, True):
+            result = validate(filename, streaming=streaming,
+                              all_errors=True)
+            if violation == "duplicate_id" and count:
+                # All duplicates are reported at once.
+                assert len(result.errors) == 1
+                assert result.errors[0].count("'sp") == count
+            else:
+                assert len(result.errors) == count
+
+    # The parameters scenario has no defined attributes with a type or a
+    # pattern.
+    if scenario != "parameters" or violation not in ("type", "pattern"):
+        assert total > 0
+
+
+def test_seed(tmpdir):
+    violations = {"label": 0.1, "pattern": 0.1, "type": 0.1}
+    contents = []
+    for i in range(2):
+        filename = str(tmpdir.join("corpus_%i.json" % i))
+        CorpusGenerator(traces=5, violations=violations, seed=1).write(
+            filename)
+        with io.open(filename, "rb") as fh:
+            contents.append(fh.read())
+    assert contents[0] == contents[1]
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        CorpusGenerator(scenario="unknown")
+    with pytest.raises(ValueError):
+        CorpusGenerator(chain=["waveform_trace"])
+    with pytest.raises(ValueError):
+        CorpusGenerator(violations={"unknown": 0.5})
+
+
+def test_main(tmpdir, capsys):
+    filename = str(tmpdir.join("corpus.json"))
+    main([filename, "--traces", "5", "--bundles", "2", "--violations",
+          "label=1.0", "--seed", "0"])
+    assert capsys.readouterr()[0].startswith("Injected 'label' into ")
+    result = validate(filename, all_errors=True)
+    assert result.errors
+    assert all("has label 'Wrong Label'" in _i for _i in result.errors)
@@ -22,9 +22,17 @@ import inspect
 import io
 import os
 import pytest
+import subprocess
 import sys
+import threading
+import warnings
 
-from seis_prov_validate.validator import validate
+from seis_prov_validate.synthetic import CorpusGenerator
+from seis_prov_validate.validator import (PHASES, format_stats, main,
+                                          validate, validate_document,
+                                          Validator,
+                                          _check_json_schema,
+                                          _get_validation_plan)
 
 # Most generic way to get the data folder path.
 DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(
@@ -78,6 +86,15 @@ def test_valid_files_from_an_open_file(filename):
         assert validate(fh).is_valid is True
 
 
+@pytest.mark.parametrize("filename", sorted(VALID_FILES.values()))
+def test_valid_files_with_xsd_roundtrip(filename):
+    """
+    Validating against the PROV-XML schema after a serialization round trip
+    must give the same result as validating the original tree.
+    """
+    assert validate(filename, xsd_roundtrip=True).is_valid is True
+
+
 @pytest.mark.parametrize("filename", sorted(INVALID_FILES.values()))
 def test_invalid_files(filename):
     """
@@ -86,6 +103,15 @@ def test_invalid_files(filename):
     assert validate(filename).is_valid is False
 
 
+@pytest.mark.parametrize("filename", sorted(INVALID_FILES.values()))
+def test_invalid_files_with_xsd_roundtrip(filename):
+    """
+    Make sure all files that should be invalid are invalid if the XSD
+    validation is performed after a serialization round trip.
+    """
+    assert validate(filename, xsd_roundtrip=True).is_valid is False
+
+
 @pytest.mark.parametrize("filename", sorted(INVALID_FILES.values()))
 def test_invalid_files_from_bytesio(filename):
     """
@@ -373,11 +399,13 @@ def test_wrong_type_in_attr_string_instead_of_float():
     assert "could not convert string to float" in result.errors[0].lower()
 
 
-def test_wrong_type_in_attr_string_negative_instead_of_positive_integer():
+@pytest.mark.parametrize("xsd_roundtrip", [False, True])
+def test_wrong_type_in_attr_string_negative_instead_of_positive_integer(
+        xsd_roundtrip):
     filename = os.path.join(
         DATA_DIR, "invalid_files",
         "wrong_type_in_attribute_negative_instead_of_positive_integer.xml")
-    result = validate(filename)
+    result = validate(filename, xsd_roundtrip=xsd_roundtrip)
     assert result.is_valid is False
     assert result.warnings == []
     assert len(result.errors) == 1
@@ -416,6 +444,360 @@ def test_duplicate_id():
     ]
 
 
+def test_duplicate_id_in_different_bundles():
+    filename = INVALID_FILES["duplicate_ids_in_bundles.xml"]
+    result = validate(filename)
+    assert result.is_valid is False
+    assert result.warnings == []
+    assert result.errors == [
+        "One or more ids have been used more than once: 'sp001_wf_c17dd1f'"
+    ]
+
+
+def test_dangling_reference():
+    """
+    Referencing records that are not defined is valid but triggers a warning.
+    """
+    filename = VALID_FILES["dangling_reference.xml"]
+    result = validate(filename)
+    assert result.is_valid is True
+    assert result.errors == []
+    assert result.warnings == [
+        "The following ids in the SEIS-PROV namespace are referenced by "
+        "relations but not defined in the document: "
+        "'seis_prov:sp001_wf_490dfadf3'"]
+
+
+def test_validation_plan():
+    """
+    The compiled validation plan must mirror the JSON definitions.
+    """
+    plan = _get_validation_plan()
+    assert sorted(len(_i) for _i in plan.values()) == [3, 7, 24]
+
+    waveform_trace = [_i for _i in plan.values()
+                      if "waveform_trace" in _i][0]["waveform_trace"]
+    assert waveform_trace.label == "Waveform Trace"
+    assert waveform_trace.id_regex.match("sp001_wf_c17dd1f")
+    assert not waveform_trace.id_regex.match("sp001_dt_c17dd1f")
+    assert waveform_trace.required == frozenset()
+    assert waveform_trace.other_attributes_allowed is False
+    assert waveform_trace.attributes["seed_id"].pattern.match(
+        "BW.FURT..EHZ")
+    assert waveform_trace.attributes["sampling_rate"].types == \
+        ("xsd:double",)
+
+
+def test_json_schema_is_valid():
+    """
+    The JSON schema is only checked in debug mode so make sure it is valid.
+    """
+    schema = _check_json_schema(check=True)
+    assert sorted(schema) == [
+        "_metainformation", "activities", "agents", "entities"]
+
+
+def test_lazy_imports():
+    """
+    Importing the package must not import any of the slow dependencies.
+    """
+    output = subprocess.check_output([
+        sys.executable, "-c",
+        "import sys, seis_prov_validate; print(sorted(_i for _i in "
+        "('argparse', 'jsonschema', 'lxml', 'prov') if _i in sys.modules))"],
+        cwd=os.path.dirname(os.path.dirname(DATA_DIR)))
+    assert output.decode().strip() == "[]"
+
+
+def test_input_parameters_with_many_attributes():
+    """
+    Input parameters can have an arbitrary number of attributes in the
+    SEIS-PROV namespace.
+    """
+    attributes = "\n".join(
+        '    <seis_prov:param_%i xsi:type="xsd:int">%i</seis_prov:param_%i>'
+        % (_i, _i, _i) for _i in range(500))
+    data = (
+        '<prov:document xmlns:prov="http://www.w3.org/ns/prov#" '
+        'xmlns:seis_prov="http://seisprov.org/seis_prov/0.1/#" '
+        'xmlns:xsd="http://www.w3.org/2001/XMLSchema" '
+        'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">\n'
+        '  <prov:entity prov:id="seis_prov:sp001_in_c17dd1f">\n'
+        '    <prov:label>Input Parameters</prov:label>\n'
+        '    <prov:type xsi:type="xsd:string">seis_prov:input_parameters'
+        '</prov:type>\n%s\n'
+        '  </prov:entity>\n'
+        '</prov:document>' % attributes)
+    with io.BytesIO(data.encode("utf-8")) as buf:
+        result = validate(buf)
+    assert result.errors == []
+    assert result.is_valid is True
+
+
+def test_validator_object():
+    """
+    A validator can be reused and its defaults can be overwritten per call.
+    """
+    validator = Validator(xsd_roundtrip=True)
+    filename = VALID_FILES["dangling_reference.xml"]
+    for _ in range(3):
+        result = validator.validate(filename)
+        assert result.is_valid is True
+        assert len(result.warnings) == 1
+        assert result.warnings == validate(filename).warnings
+    assert validator.validate(filename, streaming=True).warnings == \
+        result.warnings
+
+    # Warnings filters are not touched.
+    filters = list(warnings.filters)
+    validator.validate(INVALID_FILES["no_label.xml"])
+    assert warnings.filters == filters
+
+
+def test_validator_from_multiple_threads():
+    """
+    A single validator must give the same results when used from many
+    threads at once.
+    """
+    filenames = sorted(VALID_FILES.values()) + sorted(INVALID_FILES.values())
+    expected = [(_i.errors, _i.warnings) for _i in
+                (validate(_j) for _j in filenames)]
+
+    validator = Validator()
+    results = {}
+
+    def run(index):
+        results[index] = [
+            (_i.errors, _i.warnings) for _i in
+            (validator.validate(_j) for _j in filenames)]
+
+    threads = [threading.Thread(target=run, args=(_i,)) for _i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 4
+    for value in results.values():
+        assert value == expected
+
+
+@pytest.mark.parametrize("filename", sorted(INVALID_FILES.values()))
+def test_all_errors_starts_with_first_error(filename):
+    """
+    Collecting all errors must find the same first error.
+    """
+    result = validate(filename, all_errors=True)
+    assert result.errors[0] == validate(filename).errors[0]
+
+
+def _broken_waveform_traces():
+    """
+    Document with one valid and three invalid waveform traces.
+    """
+    record = (
+        '  <prov:entity prov:id="seis_prov:%s">\n'
+        '    <prov:label>%s</prov:label>\n'
+        '    <prov:type xsi:type="xsd:string">seis_prov:waveform_trace'
+        '</prov:type>\n'
+        '    <seis_prov:sampling_rate xsi:type="xsd:%s">%s'
+        '</seis_prov:sampling_rate>\n'
+        '  </prov:entity>\n')
+    return (
+        '<prov:document xmlns:prov="http://www.w3.org/ns/prov#" '
+        'xmlns:seis_prov="http://seisprov.org/seis_prov/0.1/#" '
+        'xmlns:xsd="http://www.w3.org/2001/XMLSchema" '
+        'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">\n' +
+        record % ("sp001_wf_aaaaaaa", "Waveform Trace", "double", "1.0") +
+        record % ("sp001_wf_bbbbbbb", "Random", "string", "a") +
+        record % ("sp001_dt_ccccccc", "Waveform Trace", "double", "1.0") +
+        record % ("sp001_wf_aaaaaaa", "Waveform Trace", "double", "1.0") +
+        '</prov:document>').encode("utf-8")
+
+
+def test_all_errors():
+    """
+    All errors of all records are collected in one go.
+    """
+    errors = [
+        "Record 'seis_prov:sp001_wf_bbbbbbb' has label 'Random' instead of "
+        "'Waveform Trace'.",
+        "Attribute 'sampling_rate' has an invalid type '<class 'str'>'. "
+        "Valid types: xsd:double",
+        "The local part of the identifier 'seis_prov:sp001_dt_ccccccc' does "
+        "not match the regular expression '^sp\\d{3,5}_wf_[a-z0-9]{7,12}$' "
+        "as is required by the standard.",
+        "One or more ids have been used more than once: 'sp001_wf_aaaaaaa'"]
+
+    with io.BytesIO(_broken_waveform_traces()) as buf:
+        assert validate(buf).errors == errors[:1]
+    for streaming in (False, True):
+        with io.BytesIO(_broken_waveform_traces()) as buf:
+            result = validate(buf, all_errors=True, streaming=streaming)
+        assert result.errors == errors
+        assert result.warnings == []
+
+    with io.BytesIO(_broken_waveform_traces()) as buf:
+        result = validate(buf, all_errors=True, max_errors=2)
+    assert result.errors == errors[:2]
+    assert result.warnings == ["Validation stopped after 2 errors."]
+
+    # Only used together with all errors.
+    with io.BytesIO(_broken_waveform_traces()) as buf:
+        assert validate(buf, max_errors=2).errors == errors[:1]
+
+
+@pytest.mark.parametrize("format", ["xml", "json"])
+@pytest.mark.parametrize("streaming", [False, True])
+def test_stats(tmpdir, format, streaming):
+    filename = str(tmpdir.join("corpus.%s" % format))
+    CorpusGenerator(traces=3, bundles=2).write(filename)
+
+    assert validate(filename, streaming=streaming).stats is None
+
+    result = validate(filename, streaming=streaming, stats=True)
+    assert result.is_valid
+    stats = result.stats
+    # 1 agent and 16 records per trace.
+    assert stats["records"] == 49
+    assert stats["bundles"] == 2
+    assert stats["cached"] is False
+    assert stats["peak_memory"] > 0
+
+    expected = ["schemas", "parse", "prov", "xsd", "records", "identifiers"]
+    if streaming:
+        expected.insert(1, "sniff")
+    assert list(stats["phases"]) == expected
+    assert list(stats["phases"]) == [_i for _i in PHASES
+                                     if _i in stats["phases"]]
+    for phase in stats["phases"].values():
+        assert phase["wall_time"] >= 0.0
+        assert phase["cpu_time"] >= 0.0
+        assert phase["peak_memory"] > 0
+        assert phase["calls"] >= 1
+    # Phases are not counted twice.
+    assert sum(_i["wall_time"] for _i in stats["phases"].values()) <= \
+        stats["wall_time"]
+    if streaming:
+        assert stats["phases"]["records"]["calls"] == 49
+    else:
+        assert stats["phases"]["records"]["calls"] == 1
+
+    # Only traced while collecting statistics.
+    tracemalloc = pytest.importorskip("tracemalloc")
+    assert not tracemalloc.is_tracing()
+
+
+def test_stats_of_invalid_files():
+    filename = INVALID_FILES["no_label.xml"]
+    result = validate(filename, stats=True)
+    assert result.errors == validate(filename).errors
+    assert "records" in result.stats["phases"]
+    assert "identifiers" not in result.stats["phases"]
+    assert result.stats["records"] == 1
+
+
+def test_main_with_stats(capsys):
+    filename = VALID_FILES["waveform_trace_min.xml"]
+    main([filename, "--stats"])
+    output = capsys.readouterr()[0].splitlines()
+    assert output[0] == "VALID SEIS-PROV FILE!"
+    assert output[1].split() == ["Phase", "Wall", "[ms]", "CPU", "[ms]",
+                                 "Memory", "[MB]", "Calls"]
+    assert output[-2].split()[0] == "total"
+    assert output[-1] == "1 records in the document and 0 bundles."
+
+    stats = validate(filename, stats=True).stats
+    assert format_stats(stats).splitlines()[-1] == output[-1]
+
+
+@pytest.mark.parametrize("filename", sorted(
+    list(VALID_FILES.values()) + list(INVALID_FILES.values())))
+def test_validate_document(filename):
+    """
+    Documents in memory give the same results as the files they are read
+    from.
+    """
+    import prov.model
+    try:
+        doc = prov.model.ProvDocument.deserialize(
+            filename, format="json" if filename.endswith(".json") else "xml")
+    except Exception:
+        pytest.skip("Cannot be read with the prov package.")
+
+    expected = validate(filename, xsd_roundtrip=True)
+    result = validate_document(doc, xsd=True)
+    assert result.errors == expected.errors
+    assert result.warnings == expected.warnings
+    if expected.is_valid:
+        assert validate_document(doc).is_valid
+
+
+def test_validate_document_without_xsd():
+    import prov.model
+    doc = prov.model.ProvDocument()
+    doc.add_namespace("seis_prov", "http://seisprov.org/seis_prov/0.1/#")
+    doc.entity("seis_prov:sp001_wf_aaaaaaa", other_attributes=(
+        ("prov:label", "Detrend"),
+        ("prov:type", "seis_prov:waveform_trace"),
+        ("seis_prov:sampling_rate", "a")))
+
+    result = validate_document(doc, all_errors=True, stats=True)
+    assert result.errors == [
+        "Record 'seis_prov:sp001_wf_aaaaaaa' has label 'Detrend' instead "
+        "of 'Waveform Trace'.",
+        "Attribute 'sampling_rate' has an invalid type '<class 'str'>'. "
+        "Valid types: xsd:double"]
+    assert list(result.stats["phases"]) == [
+        "schemas", "records", "identifiers"]
+    assert result.stats["records"] == 1
+
+    assert Validator().validate_document(doc).errors == result.errors[:1]
+
+    with pytest.raises(TypeError):
+        validate_document(VALID_FILES["waveform_trace_min.xml"])
+
+
+# Internal entities are not resolved, the label thus only is 'Waveform '.
+ENTITY_DOCUMENT = b"""<?xml version="1.0"?>
+<!DOCTYPE document [<!ENTITY trace "Trace">]>
+<prov:document xmlns:prov="http://www.w3.org/ns/prov#"
+    xmlns:seis_prov="http://seisprov.org/seis_prov/0.1/#"
+    xmlns:xsd="http://www.w3.org/2001/XMLSchema"
+    xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">
+  <prov:entity prov:id="seis_prov:sp001_wf_c17dd1f">
+    <prov:label>Waveform &trace;</prov:label>
+    <prov:type xsi:type="xsd:string">seis_prov:waveform_trace</prov:type>
+  </prov:entity>
+</prov:document>
+"""
+
+
+def test_entity_references():
+    for kwargs in ({}, {"native": False}, {"xsd_roundtrip": True},
+                   {"all_errors": True}):
+        result = validate(io.BytesIO(ENTITY_DOCUMENT), **kwargs)
+        assert result.errors == [
+            "Record 'seis_prov:sp001_wf_c17dd1f' has label 'Waveform ' "
+            "instead of 'Waveform Trace'."]
+
+
+def test_failing_xsd_validation(monkeypatch):
+    from lxml import etree
+    from seis_prov_validate import validator
+
+    class Schema(object):
+        def validate(self, tree):
+            raise etree.XMLSchemaValidateError(
+                "Internal error in XML Schema validation.")
+
+    monkeypatch.setattr(validator, "_get_xsd_schema", Schema)
+    result = validate(VALID_FILES["waveform_trace_min.xml"])
+    assert result.errors == [
+        "SEIS-PROV document could not be validated against the PROV-XML "
+        "schema: Internal error in XML Schema validation."]
+
+
 if __name__ == "__main__":
     PATH = os.path.dirname(os.path.abspath(inspect.getfile(
                            inspect.currentframe())))
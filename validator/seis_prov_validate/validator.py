@@ -11,91 +11,269 @@ Validator for SEIS-PROV files.
 from __future__ import (absolute_import, division, print_function,
                         unicode_literals)
 
-import argparse
 import datetime
-import inspect
 import io
 import json
 import os
 import re
 import six
 from six.moves.urllib.parse import urlparse
+import threading
+import time
 import warnings
 import sys
 
-import jsonschema
-from lxml import etree
-import prov
-import prov.constants
-import prov.identifier
+# lxml, prov, and jsonschema take a lot longer to import than most
+# validations take. They are only imported where they are needed so short
+# running processes, e.g. ones that only hit the result cache, do not have to
+# pay for them.
 
 # Directory of the file.
-_DIR = os.path.dirname(
-    os.path.abspath(inspect.getfile(inspect.currentframe())))
+_DIR = os.path.dirname(os.path.abspath(__file__))
 
 _PROV_XML_SCHEMA = os.path.join(_DIR, "schemas", "prov.xsd")
 _SEIS_PROV_SCHEMA = os.path.join(_DIR, "schemas", "seis_prov.json")
 
 SEIS_PROV_NAMESPACE = "http://seisprov.org/seis_prov/0.1/#"
 
-# Caches to speed up repeated runs.
-__JSON_SCHEMA_CACHE = []
-__XSD_SCHEMA_CACHE = []
+# Number of bytes read at a time to determine the format of a file.
+_SNIFF_SIZE = 256
+_BOM = b"\xef\xbb\xbf"
 
-_PERSON = prov.identifier.QualifiedName(prov.constants.PROV, "Person")
-_SOFTWARE_AGENT = prov.identifier.QualifiedName(prov.constants.PROV,
-                                                "SoftwareAgent")
-_ORGANIZATION = prov.identifier.QualifiedName(prov.constants.PROV,
-                                              "Organization")
+# The validator used by the module level functions. Created on first use.
+_DEFAULT_VALIDATOR = []
+_DEFAULT_VALIDATOR_LOCK = threading.Lock()
 
+# The context of the validation currently running in each thread.
+_CONTEXT = threading.local()
 
-def _check_json_schema():
+# Stands in for the name of the validated file in cached messages.
+_SOURCE_PLACEHOLDER = "\x00source\x00"
+
+# Validations currently tracing memory allocations and whether tracing has
+# been started by them.
+_TRACING = {"count": 0, "started": False}
+_TRACING_LOCK = threading.Lock()
+
+# The phases of a validation in the order in which they usually run.
+PHASES = ("cache", "schemas", "sniff", "parse", "prov", "xsd", "records",
+          "identifiers")
+
+_wall_time = getattr(time, "perf_counter", time.time)
+# CPU time of the current thread if possible as validations can run in
+# parallel threads.
+_cpu_time = getattr(time, "thread_time", None) or \
+    getattr(time, "process_time", None) or time.clock
+
+# Set to any non-empty value to enable internal consistency checks.
+_DEBUG_ENVIRONMENT_VARIABLE = "SEIS_PROV_VALIDATE_DEBUG"
+
+# The prov:types of agents that can have ids in the SEIS-PROV namespace
+# without having a prov:type in it. Keyed by their URIs.
+_PROV_NAMESPACE = "http://www.w3.org/ns/prov#"
+_AGENT_TYPES = {
+    _PROV_NAMESPACE + "Person": "person",
+    _PROV_NAMESPACE + "SoftwareAgent": "software_agent",
+    _PROV_NAMESPACE + "Organization": "organization"}
+
+
+def _debug_mode():
     """
-    Validate the JSON schema itself to avoid silly errors. Only done once to
-    speedup successive calls.
+    True if the internal consistency checks are enabled.
     """
-    if not __JSON_SCHEMA_CACHE:
-        with io.open(_SEIS_PROV_SCHEMA, "rt") as fh:
-            schema = json.load(fh)
+    return bool(os.environ.get(_DEBUG_ENVIRONMENT_VARIABLE))
 
-        # Make sure the namespace in the scheme checks out to be identical
-        # to the one used here.
-        if schema["_metainformation"]["namespace"] != SEIS_PROV_NAMESPACE:
-            raise ValueError("Internal problem. The SEIS-PROV namespace in "
-                             "the schema is not equal to the expected one.")
 
+def _check_json_schema(check=None):
+    """
+    Read the JSON schema. In debug mode it is also validated itself to avoid
+    silly errors.
+
+    :param check: Force or skip the validation of the schema. Defaults to
+        the debug mode.
+    """
+    with io.open(_SEIS_PROV_SCHEMA, "rt") as fh:
+        schema = json.load(fh)
+
+    # Make sure the namespace in the scheme checks out to be identical
+    # to the one used here.
+    if schema["_metainformation"]["namespace"] != SEIS_PROV_NAMESPACE:
+        raise ValueError("Internal problem. The SEIS-PROV namespace in "
+                         "the schema is not equal to the expected one.")
+
+    if check is None:
+        check = _debug_mode()
+    if check:
+        import jsonschema
         jsonschema.Draft4Validator.check_schema(schema)
-        __JSON_SCHEMA_CACHE.append(schema)
+    return schema
+
+
+class _AttributePlan(object):
+    """
+    Compiled definition of a single SEIS-PROV attribute.
+    """
+    __slots__ = ["name", "types", "checkers", "pattern"]
 
-    return __JSON_SCHEMA_CACHE[0]
+    def __init__(self, definition):
+        self.name = definition["name"]
+        self.types = tuple(definition["types"])
+        for t in self.types:
+            if t not in TYPE_MAP:
+                raise NotImplementedError
+        self.checkers = tuple(TYPE_MAP[t] for t in self.types)
+        if "pattern" in definition:
+            if "xsd:string" not in self.types:
+                # This should not happen.
+                raise Exception
+            self.pattern = re.compile(definition["pattern"])
+        else:
+            self.pattern = None
 
 
-def _is_xml_file(file_object):
+class _RecordPlan(object):
     """
-    Helper function testing if a file is an XML file.
+    Compiled definition of a single SEIS-PROV record type.
 
-    :param file_object: Open file or file-like object to test.
+    Everything that does not depend on the actual record is computed once
+    so validating a record only requires dictionary lookups.
     """
-    try:
-        etree.parse(file_object)
-        return True
-    except:
-        return False
+    __slots__ = ["name", "label", "id_regex", "attributes", "required",
+                 "other_attributes_allowed"]
+
+    def __init__(self, definition):
+        self.name = definition["name"]
+        self.label = definition["label"]
+        self.id_regex = re.compile(
+            r"^sp\d{3,5}_" + definition["two_letter_code"] +
+            r"_[a-z0-9]{7,12}$")
+        self.attributes = dict(
+            (_i["name"], _AttributePlan(_i))
+            for _i in definition["attributes"])
+        self.required = frozenset(_i["name"]
+                                  for _i in definition["attributes"]
+                                  if _i["required"])
+        self.other_attributes_allowed = \
+            definition["other_seis_prov_attributes_allowed"]
+
+
+def _compile_validation_plan(json_schema):
+    """
+    Compile the JSON schema to a validation plan mapping each prov record
+    type to a dictionary of the SEIS-PROV types and their compiled
+    definitions.
+    """
+    import prov.model
 
+    return dict(
+        (rec_type, dict((name, _RecordPlan(definition))
+                        for name, definition in json_schema[key].items()))
+        for rec_type, key in (
+            (prov.model.PROV_ENTITY, "entities"),
+            (prov.model.PROV_ACTIVITY, "activities"),
+            (prov.model.PROV_AGENT, "agents")))
 
-def _is_json_file(file_object):
+
+def _get_validator():
+    """
+    The validator of the validation currently running in this thread or
+    the default validator if none is running.
     """
-    Helper function testing if a file is valid JSON file.
+    context = getattr(_CONTEXT, "current", None)
+    if context is not None:
+        return context.validator
+    if not _DEFAULT_VALIDATOR:
+        with _DEFAULT_VALIDATOR_LOCK:
+            if not _DEFAULT_VALIDATOR:
+                _DEFAULT_VALIDATOR.append(Validator())
+    return _DEFAULT_VALIDATOR[0]
+
+
+def _get_validation_plan():
+    """
+    The validation plan of the current validator.
+    """
+    return _get_validator().plan
+
+
+def _sniff_format(file_object):
+    """
+    Guess the serialization format from the leading bytes of a file.
+
+    Only looks at the first non-whitespace character so it is cheap even for
+    very large files. The position of the file object is restored afterwards.
 
     :param file_object: Open file or file-like object to test.
     """
-    # Has to be decoded to a string to work with json.
-    with io.StringIO(file_object.read().decode()) as fh:
+    original_position = file_object.tell()
+    try:
+        chunk = file_object.read(_SNIFF_SIZE)
+        if chunk.startswith(_BOM):
+            chunk = chunk[len(_BOM):]
+        # Skip leading whitespace no matter how long it is.
+        while chunk and not chunk.strip():
+            chunk = file_object.read(_SNIFF_SIZE)
+    finally:
+        file_object.seek(original_position, 0)
+
+    chunk = chunk.lstrip()
+    if not chunk:
+        return None
+    if chunk.startswith(b"<"):
+        return "xml"
+    # Anything else might still be JSON - let the JSON parser decide.
+    return "json"
+
+
+def _parse_file(file_object):
+    """
+    Detect the format of a file and parse it exactly once.
+
+    Returns a tuple of the detected format (``"xml"`` or ``"json"``) and the
+    parsed object (an lxml element tree or the decoded JSON object) or
+    ``(None, None)`` if the file is neither.
+
+    :param file_object: Open file or file-like object to parse.
+    """
+    fileformat = _sniff_format(file_object)
+
+    if fileformat == "xml":
+        from lxml import etree
+        parser = etree.XMLParser(resolve_entities=False, no_network=True,
+                                 remove_comments=True)
         try:
-            json.load(fh)
-            return True
-        except:
-            return False
+            return fileformat, etree.parse(file_object, parser=parser)
+        except Exception:
+            return None, None
+    elif fileformat == "json":
+        try:
+            # Has to be decoded to a string to work with all json versions.
+            return fileformat, json.loads(
+                file_object.read().decode("utf-8-sig"))
+        except Exception:
+            return None, None
+
+    return None, None
+
+
+def _read_prov_document(fileformat, parsed):
+    """
+    Convert an already parsed tree into a prov document without parsing the
+    file again.
+
+    :param fileformat: The format of the parsed tree, ``"xml"`` or ``"json"``.
+    :param parsed: An lxml element tree or a decoded PROV-JSON object.
+    """
+    import prov.model
+
+    doc = prov.model.ProvDocument()
+    if fileformat == "xml":
+        from prov.serializers.provxml import ProvXMLSerializer
+        ProvXMLSerializer().deserialize_subtree(parsed.getroot(), doc)
+    else:
+        from prov.serializers.provjson import decode_json_document
+        decode_json_document(parsed, doc)
+    return doc
 
 
 class SeisProvValidationException(Exception):
@@ -107,6 +285,14 @@ class SeisProvValidationWarning(UserWarning):
     pass
 
 
+class _ErrorLimitReached(SeisProvValidationException):
+    """
+    Raised to stop a validation once the maximum number of errors has been
+    collected.
+    """
+    pass
+
+
 def _log_error(message):
     """
     Print the message to stdout and exit with a non-zero exit code.
@@ -116,15 +302,256 @@ def _log_error(message):
 
 def _log_warning(message):
     """
-    Print the message to stdout
+    Collect the warning in the context of the running validation. Issued as
+    a normal Python warning outside of a validation.
     """
-    warnings.warn(message, SeisProvValidationWarning)
+    context = getattr(_CONTEXT, "current", None)
+    if context is None:
+        warnings.warn(message, SeisProvValidationWarning)
+    else:
+        context.warnings.append(message)
+
+
+def _log_record_error(message):
+    """
+    Error after which the validation of the current record can continue.
+    Collected if all errors are requested, otherwise identical to
+    :func:`_log_error`.
+    """
+    context = getattr(_CONTEXT, "current", None)
+    if context is None or not context.all_errors:
+        _log_error(message)
+    context.add_error(message)
+
+
+class _ValidationContext(object):
+    """
+    State of a single validation. Active in the thread running it while
+    being used as a context manager.
+
+    :param validator: The validator running the validation.
+    :param all_errors: Collect all errors instead of stopping at the first.
+    :param max_errors: Stop once this many errors have been collected.
+    :param stats: Collect the statistics of the validation.
+    """
+    def __init__(self, validator, all_errors=False, max_errors=None,
+                 stats=False):
+        self.validator = validator
+        self.all_errors = all_errors
+        self.max_errors = max_errors
+        self.errors = []
+        self.warnings = []
+        self.stats = _ValidationStats() if stats else None
+        # The name of the validated file in the messages if lxml added it.
+        self.source = None
+        self._previous = None
+
+    def add_error(self, message):
+        self.errors.append(message)
+        if self.max_errors is not None and \
+                len(self.errors) >= self.max_errors:
+            _log_warning("Validation stopped after %i errors." %
+                         self.max_errors)
+            raise _ErrorLimitReached(message)
+
+    def run(self, function, *args, **kwargs):
+        """
+        Run a validation function and collect the error it stops at.
+        """
+        try:
+            function(*args, **kwargs)
+        except _ErrorLimitReached:
+            pass
+        except SeisProvValidationException as e:
+            self.errors.append(e.message)
+
+    def result(self):
+        return SeisProvValidationResult(
+            errors=self.errors, warnings=self.warnings,
+            stats=self.stats.finish() if self.stats is not None else None)
+
+    def __enter__(self):
+        self._previous = getattr(_CONTEXT, "current", None)
+        _CONTEXT.current = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _CONTEXT.current = self._previous
+        self._previous = None
+        if self.stats is not None:
+            self.stats.finish()
+
+
+def _start_tracing():
+    """
+    Start tracing memory allocations if nobody else does. Returns False if
+    this is not possible.
+    """
+    try:
+        import tracemalloc
+    except ImportError:
+        return False
+    with _TRACING_LOCK:
+        if not _TRACING["count"] and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _TRACING["started"] = True
+        _TRACING["count"] += 1
+    return True
+
+
+def _stop_tracing():
+    import tracemalloc
+    with _TRACING_LOCK:
+        _TRACING["count"] -= 1
+        if not _TRACING["count"] and _TRACING["started"]:
+            tracemalloc.stop()
+            _TRACING["started"] = False
+
+
+class _ValidationStats(object):
+    """
+    Wall time, CPU time, and peak memory of the phases of a single
+    validation as well as the number of records and bundles.
+
+    A phase entered while another one is running pauses the outer phase so
+    no time is counted twice. Memory is traced with :mod:`tracemalloc`
+    which slows down the validation. Peak memory is relative to the memory
+    in use when the validation started. Per phase peaks are not available
+    before Python 3.9 and are only approximate if multiple validations
+    collect statistics at the same time.
+    """
+    def __init__(self):
+        self.records = 0
+        self.bundles = 0
+        self.cached = False
+        self.phases = {}
+        self._stack = []
+        self._result = None
+        self._tracing = _start_tracing()
+        self._baseline = self._peak_memory = None
+        if self._tracing:
+            import tracemalloc
+            self._baseline = tracemalloc.get_traced_memory()[0]
+            self._peak_memory = 0
+        self._start = self._last = (_wall_time(), _cpu_time())
+
+    def _peak(self):
+        """
+        Peak memory since the last call. ``None`` if not available.
+        """
+        if not self._tracing:
+            return None
+        import tracemalloc
+        peak = max(tracemalloc.get_traced_memory()[1] - self._baseline, 0)
+        self._peak_memory = max(self._peak_memory, peak)
+        if not hasattr(tracemalloc, "reset_peak"):
+            return None
+        tracemalloc.reset_peak()
+        return peak
+
+    def _switch(self):
+        """
+        Attribute everything since the last switch to the running phase.
+        """
+        now = (_wall_time(), _cpu_time())
+        peak = self._peak()
+        if self._stack:
+            phase = self.phases[self._stack[-1]]
+            phase["wall_time"] += now[0] - self._last[0]
+            phase["cpu_time"] += now[1] - self._last[1]
+            if peak is not None:
+                phase["peak_memory"] = max(phase["peak_memory"] or 0, peak)
+        self._last = now
+
+    def enter(self, name):
+        self._switch()
+        self._stack.append(name)
+        if name not in self.phases:
+            self.phases[name] = {"wall_time": 0.0, "cpu_time": 0.0,
+                                 "peak_memory": None, "calls": 0}
+        self.phases[name]["calls"] += 1
+
+    def exit(self):
+        self._switch()
+        self._stack.pop()
+
+    def finish(self):
+        """
+        Stop measuring. Returns the statistics as a dictionary of plain
+        types.
+        """
+        if self._result is not None:
+            return self._result
+        self._switch()
+        if self._tracing:
+            _stop_tracing()
+        self._result = {
+            "wall_time": self._last[0] - self._start[0],
+            "cpu_time": self._last[1] - self._start[1],
+            "peak_memory": self._peak_memory,
+            "records": self.records,
+            "bundles": self.bundles,
+            "cached": self.cached,
+            "phases": dict((_i, self.phases[_i]) for _i in PHASES
+                           if _i in self.phases)}
+        return self._result
+
+
+class _Phase(object):
+    __slots__ = ["stats", "name"]
+
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.stats.enter(self.name)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stats.exit()
+
+
+class _NoPhase(object):
+    __slots__ = []
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+_NO_PHASE = _NoPhase()
+
+
+def _get_stats():
+    """
+    The statistics of the running validation or ``None`` if they are not
+    collected.
+    """
+    context = getattr(_CONTEXT, "current", None)
+    return context.stats if context is not None else None
+
+
+def _phase(name):
+    """
+    Context manager measuring a phase, see :data:`PHASES`, of the running
+    validation. Does nothing if no statistics are collected.
+    """
+    stats = _get_stats()
+    if stats is None:
+        return _NO_PHASE
+    return _Phase(stats, name)
 
 
 class SeisProvValidationResult(object):
-    def __init__(self, errors, warnings):
+    def __init__(self, errors, warnings, stats=None):
         self.errors = errors
         self.warnings = warnings
+        # Dictionary with the wall time, CPU time, and peak memory of the
+        # whole validation and of each phase plus the number of records and
+        # bundles if requested.
+        self.stats = stats
 
     @property
     def is_valid(self):
@@ -141,35 +568,285 @@ class SeisProvValidationResult(object):
         return ret_str.strip()
 
 
-def validate(file_or_object):
+class Validator(object):
     """
-    Validate a given SEIS-PROV file.
+    Reusable SEIS-PROV validator.
+
+    Reads and compiles all schemas once, when they are first needed, so it
+    can be used for any number of validations. Each validation collects its
+    errors and warnings in its own context so a single validator can be used
+    from multiple threads at the same time.
+
+    :param xsd_roundtrip: Default for the ``xsd_roundtrip`` parameter of
+        :meth:`validate`.
+    :param streaming: Default for the ``streaming`` parameter of
+        :meth:`validate`.
+    :param cache: Default for the ``cache`` parameter of :meth:`validate`.
+    :param all_errors: Default for the ``all_errors`` parameter of
+        :meth:`validate`.
+    :param max_errors: Default for the ``max_errors`` parameter of
+        :meth:`validate`.
+    :param stats: Default for the ``stats`` parameter of :meth:`validate`.
+    :param native: Default for the ``native`` parameter of :meth:`validate`.
+    """
+    def __init__(self, xsd_roundtrip=False, streaming=False, cache=None,
+                 all_errors=False, max_errors=None, stats=False, native=True):
+        self.xsd_roundtrip = xsd_roundtrip
+        self.streaming = streaming
+        self.cache = cache
+        self.all_errors = all_errors
+        self.max_errors = max_errors
+        self.stats = stats
+        self.native = native
+        self._plan = None
+        self._plan_lock = threading.Lock()
+        # Compiled XSD schemas keep the errors of the last validation so
+        # each thread needs its own.
+        self._local = threading.local()
 
-    :param file_or_object: The filename or file-like object to validate.
+    @property
+    def plan(self):
+        """
+        The compiled validation plan, see :func:`_compile_validation_plan`.
+        """
+        if self._plan is None:
+            with self._plan_lock:
+                if self._plan is None:
+                    self._plan = _compile_validation_plan(
+                        _check_json_schema())
+        return self._plan
+
+    @property
+    def xsd_schema(self):
+        """
+        The compiled PROV-XML XSD schema of the current thread.
+        """
+        schema = getattr(self._local, "xsd_schema", None)
+        if schema is None:
+            schema = self._local.xsd_schema = _compile_xsd_schema()
+        return schema
+
+    def validate(self, file_or_object, xsd_roundtrip=None, streaming=None,
+                 cache=None, all_errors=None, max_errors=None, stats=None,
+                 native=None):
+        """
+        Validate a given SEIS-PROV file.
+
+        :param file_or_object: The filename or file-like object to validate.
+        :param xsd_roundtrip: If True, PROV-XML files are serialized again
+            with the prov package before they are validated against the
+            PROV-XML schema. Otherwise the originally parsed tree is
+            validated which is faster. PROV-JSON files always take the round
+            trip.
+        :param streaming: If True, files are validated while they are read
+            without ever holding the complete document in memory.
+        :param cache: A :class:`~seis_prov_validate.cache.ResultCache`.
+            Results for files with the same contents are then taken from
+            the cache.
+        :param all_errors: If True, the validation does not stop at the
+            first problem with a record but collects the errors of all
+            records. Problems with the file as a whole still stop the
+            validation.
+        :param max_errors: Stop collecting errors once this many have been
+            found. Only used together with ``all_errors``.
+        :param stats: If True, the wall time, CPU time, and peak memory of
+            each phase of the validation as well as the number of records
+            and bundles are measured and attached to the result. Tracing
+            the memory slows down the validation.
+        :param native: If True, PROV-XML files are read with the native
+            reader in :mod:`~seis_prov_validate.native` instead of the prov
+            package if possible. The results are the same, only faster.
+        """
+        if xsd_roundtrip is None:
+            xsd_roundtrip = self.xsd_roundtrip
+        if streaming is None:
+            streaming = self.streaming
+        if cache is None:
+            cache = self.cache
+        if all_errors is None:
+            all_errors = self.all_errors
+        if max_errors is None:
+            max_errors = self.max_errors
+        if not all_errors:
+            max_errors = None
+        if stats is None:
+            stats = self.stats
+        if native is None:
+            native = self.native
+
+        with _ValidationContext(self, all_errors=all_errors,
+                                max_errors=max_errors,
+                                stats=stats) as context:
+            key = cached = None
+            if cache is not None:
+                with _phase("cache"):
+                    key = _get_cache_key(cache, file_or_object,
+                                         xsd_roundtrip=xsd_roundtrip,
+                                         streaming=streaming,
+                                         all_errors=all_errors,
+                                         max_errors=max_errors)
+                    cached = cache.get(key) if key is not None else None
+
+            if cached is not None:
+                source = _get_source(file_or_object)
+                context.errors, context.warnings = [
+                    _insert_source(_i, source) for _i in cached]
+                if context.stats is not None:
+                    context.stats.cached = True
+            else:
+                context.run(_validate, file_or_object,
+                            xsd_roundtrip=xsd_roundtrip, streaming=streaming,
+                            native=native)
+                if key is not None:
+                    with _phase("cache"):
+                        cache.put(key,
+                                  _remove_source(context.errors,
+                                                 context.source),
+                                  _remove_source(context.warnings,
+                                                 context.source))
+
+        return context.result()
+
+    def validate_document(self, doc, xsd=False, all_errors=None,
+                          max_errors=None, stats=None):
+        """
+        Validate a prov document in memory without serializing it first.
+
+        :param doc: The :class:`prov.model.ProvDocument` to validate.
+        :param xsd: If True, the document is also serialized to PROV-XML
+            and validated against the PROV-XML schema. Documents created
+            with the prov package are usually valid PROV-XML so this is
+            skipped by default.
+        :param all_errors: See :meth:`validate`.
+        :param max_errors: See :meth:`validate`.
+        :param stats: See :meth:`validate`.
+        """
+        import prov.model
+        if not isinstance(doc, prov.model.ProvDocument):
+            raise TypeError("Expected a prov.model.ProvDocument, got '%s'." %
+                            type(doc).__name__)
+
+        if all_errors is None:
+            all_errors = self.all_errors
+        if max_errors is None:
+            max_errors = self.max_errors
+        if not all_errors:
+            max_errors = None
+        if stats is None:
+            stats = self.stats
+
+        with _ValidationContext(self, all_errors=all_errors,
+                                max_errors=max_errors,
+                                stats=stats) as context:
+            with _phase("schemas"):
+                plan = self.plan
+            context.run(_validate_prov_document, doc, plan, xsd=xsd)
+        return context.result()
+
+
+def _get_cache_key(cache, file_or_object, **options):
     """
-    errors = []
-    warns = []
+    The key of a file in the result cache. ``None`` if it cannot be read -
+    the validation then reports the actual problem.
+    """
+    if isinstance(file_or_object, six.string_types) and \
+            not os.path.isfile(file_or_object):
+        return None
+    try:
+        return cache.key(file_or_object, **options)
+    except (IOError, OSError):
+        return None
 
-    with warnings.catch_warnings(record=True) as w:
-        warnings.resetwarnings()
-        warnings.simplefilter("always")
 
-        try:
-            _validate(file_or_object)
-        except SeisProvValidationException as e:
-            errors.append(e.message)
+def _get_source(file_or_object):
+    """
+    The name lxml uses for a file in its messages.
+    """
+    if isinstance(file_or_object, six.string_types):
+        name = file_or_object
+    else:
+        name = getattr(file_or_object, "name", None)
+    if not isinstance(name, six.string_types):
+        return "<string>"
+    return os.path.abspath(name)
+
+
+def _remove_source(messages, source):
+    """
+    Replace the name of the file in messages so they can be cached for
+    files with the same contents at other places.
+    """
+    if not source:
+        return messages
+    return [_i.replace(source + ":", _SOURCE_PLACEHOLDER + ":")
+            for _i in messages]
+
+
+def _insert_source(messages, source):
+    return [_i.replace(_SOURCE_PLACEHOLDER, source) for _i in messages]
+
+
+def validate(file_or_object, xsd_roundtrip=False, streaming=False,
+             cache=None, all_errors=False, max_errors=None, stats=False,
+             native=True):
+    """
+    Validate a given SEIS-PROV file.
+
+    Uses a shared :class:`Validator` so the schemas are only compiled once.
+
+    :param file_or_object: The filename or file-like object to validate.
+    :param xsd_roundtrip: If True, PROV-XML files are serialized again with
+        the prov package before they are validated against the PROV-XML
+        schema. Otherwise the originally parsed tree is validated which is
+        faster. PROV-JSON files always take the round trip.
+    :param streaming: If True, files are validated while they are read
+        without ever holding the complete document in memory.
+    :param cache: A :class:`~seis_prov_validate.cache.ResultCache`. Results
+        for files with the same contents are then taken from the cache.
+    :param all_errors: If True, the validation does not stop at the first
+        problem with a record but collects the errors of all records.
+        Problems with the file as a whole still stop the validation.
+    :param max_errors: Stop collecting errors once this many have been
+        found. Only used together with ``all_errors``.
+    :param stats: If True, the wall time, CPU time, and peak memory of each
+        phase of the validation as well as the number of records and bundles
+        are measured and attached to the result. Tracing the memory slows
+        down the validation.
+    :param native: If True, PROV-XML files are read with the native reader
+        in :mod:`~seis_prov_validate.native` instead of the prov package if
+        possible. The results are the same, only faster.
+    """
+    return _get_validator().validate(file_or_object,
+                                     xsd_roundtrip=xsd_roundtrip,
+                                     streaming=streaming, cache=cache,
+                                     all_errors=all_errors,
+                                     max_errors=max_errors, stats=stats,
+                                     native=native)
 
-    for warn in w:
-        warn = warn.message
-        if not isinstance(warn, SeisProvValidationWarning):
-            continue
-        warns.append(warn.args[0])
 
-    return SeisProvValidationResult(errors=errors,
-                                    warnings=warns)
+def validate_document(doc, xsd=False, all_errors=False, max_errors=None,
+                      stats=False):
+    """
+    Validate a prov document in memory without serializing it first.
+
+    Uses a shared :class:`Validator` so the schemas are only compiled once.
+
+    :param doc: The :class:`prov.model.ProvDocument` to validate.
+    :param xsd: If True, the document is also serialized to PROV-XML and
+        validated against the PROV-XML schema. Documents created with the
+        prov package are usually valid PROV-XML so this is skipped by
+        default.
+    :param all_errors: See :func:`validate`.
+    :param max_errors: See :func:`validate`.
+    :param stats: See :func:`validate`.
+    """
+    return _get_validator().validate_document(
+        doc, xsd=xsd, all_errors=all_errors, max_errors=max_errors,
+        stats=stats)
 
 
-def _validate(file_or_object):
+def _validate(file_or_object, xsd_roundtrip=False, streaming=False,
+              native=False):
     """
     Validate a given SEIS-PROV file.
 
@@ -177,6 +854,10 @@ def _validate(file_or_object):
     just passes the file pointer.
 
     :param file_or_object: The filename or file-like object to validate.
+    :param xsd_roundtrip: Force the PROV-XML serialization round trip before
+        the XSD validation.
+    :param streaming: Validate while reading the file.
+    :param native: Use the native reader if possible.
     """
     if isinstance(file_or_object, six.string_types):
         # Check if the file exists.
@@ -186,51 +867,124 @@ def _validate(file_or_object):
         if not os.path.isfile(file_or_object):
             _log_error("Path '%s' is not a file." % file_or_object)
         with io.open(file_or_object, "rb") as fh:
-            return __validate_seis_prov(fh)
+            return __validate_seis_prov(fh, xsd_roundtrip=xsd_roundtrip,
+                                        streaming=streaming, native=native)
     else:
-        return __validate_seis_prov(file_or_object)
+        return __validate_seis_prov(file_or_object,
+                                    xsd_roundtrip=xsd_roundtrip,
+                                    streaming=streaming, native=native)
 
 
-def __validate_seis_prov(file_object):
+def __validate_seis_prov(file_object, xsd_roundtrip=False, streaming=False,
+                         native=False):
     """
     Core validation function.
 
     :param file_object: Open file or file-like object.
+    :param xsd_roundtrip: Force the PROV-XML serialization round trip before
+        the XSD validation.
+    :param streaming: Validate while reading the file.
+    :param native: Use the native reader if possible.
     """
-    original_position = file_object.tell()
-    # Step 1: Check and read the JSON schema.
-    json_schema = _check_json_schema()
-
-    # Determine file type.
-    is_json = _is_json_file(file_object)
-    file_object.seek(original_position, 0)
-    is_xml = _is_xml_file(file_object)
-    file_object.seek(original_position, 0)
-
-    if is_json is False and is_xml is False:
+    if streaming:
+        with _phase("sniff"):
+            fileformat = _sniff_format(file_object)
+        # Reading the file is the parse phase, everything else is measured
+        # as separate phases within it.
+        if fileformat == "xml":
+            from .streaming import _has_doctype, validate_xml_stream
+            # lxml crashes when validating entities against the schema
+            # while parsing. Documents with a document type declaration are
+            # rare and thus validated completely instead.
+            if not _has_doctype(file_object):
+                with _phase("parse"):
+                    return validate_xml_stream(file_object)
+        elif fileformat == "json":
+            with _phase("parse"):
+                from .streaming import validate_json_stream
+                return validate_json_stream(file_object)
+
+    # Step 1: Check and read the JSON schema and compile it.
+    with _phase("schemas"):
+        plan = _get_validation_plan()
+
+    # Determine the file type and parse it. This is the only time the file
+    # is parsed - all later steps work on the parsed tree.
+    with _phase("parse"):
+        fileformat, parsed = _parse_file(file_object)
+    if fileformat is None:
         _log_error("File is neither a valid JSON nor a valid XML file.")
-    elif is_json is True and is_xml is True:
-        # Should not happen for obvious reasons...
-        raise NotImplementedError
-    elif is_json:
-        fileformat = "json"
-    elif is_xml:
-        fileformat = "xml"
-
-    # Step 2: Attempt to read the provenance file with the prov Python package.
+    # Entities are not resolved and lxml cannot validate trees with entity
+    # references against the XSD schema. Such documents go through the
+    # serialization round trip.
+    if fileformat == "xml" and _has_entity_references(parsed):
+        xsd_roundtrip = True
+
+    # The native reader is much faster than the prov package. It only
+    # decides about documents that pass all checks, everything else is read
+    # with the prov package so the errors are the same. PROV-JSON files
+    # need the prov document for the XSD validation in any case.
+    xsd = True
+    if native and fileformat == "xml" and not xsd_roundtrip:
+        from .native import (UnsupportedDocument, read_xml,
+                             validate_native_document)
+        try:
+            with _phase("prov"):
+                native_doc = read_xml(parsed)
+        except UnsupportedDocument:
+            native_doc = None
+        if native_doc is not None and native_doc.records:
+            stats = _get_stats()
+            if stats is not None:
+                stats.bundles = len(native_doc.bundles)
+                stats.records = native_doc.record_count
+            _validate_against_xsd_scheme(None, xml_tree=parsed)
+            if validate_native_document(native_doc, plan):
+                return
+            # The tree has already been validated against the XSD schema.
+            xsd = False
+
+    # Step 2: Convert the parsed tree to a document with the prov Python
+    # package.
     try:
-        doc = prov.read(file_object, format=fileformat)
+        with _phase("prov"):
+            doc = _read_prov_document(fileformat, parsed)
     except Exception as e:
         _log_error("Could not parse the file with the prov Python library due"
                    " to: the following PROV error message: %s" % (repr(e)))
 
-    # Step 3: Validate against the PROV XML XSD Scheme.
-    _validate_against_xsd_scheme(doc)
+    # PROV-XML files can be validated against the XSD schema as they are,
+    # everything else has to be converted first.
+    _validate_prov_document(
+        doc, plan, xsd=xsd,
+        xml_tree=parsed if fileformat == "xml" and not xsd_roundtrip
+        else None)
+
+
+def _validate_prov_document(doc, plan, xsd=True, xml_tree=None):
+    """
+    Validate a prov document, all steps after reading it.
+
+    :param doc: The prov document.
+    :param plan: The compiled validation plan, see
+        :func:`_get_validation_plan`.
+    :param xsd: Validate the document against the PROV-XML XSD schema.
+    :param xml_tree: The already parsed PROV-XML tree of the document.
+    """
+    stats = _get_stats()
+    if stats is not None:
+        stats.bundles = len(doc.bundles)
+        stats.records = len(doc._records) + sum(
+            len(_i._records) for _i in doc.bundles)
 
     # Check if it has any records.
     if not doc._records:
         _log_error("File does not contain a single provenance record.")
 
+    # Step 3: Validate against the PROV XML XSD Scheme.
+    if xsd:
+        _validate_against_xsd_scheme(doc, xml_tree=xml_tree)
+
     # Find the seis prov namespace. If it does not exist, it is still a
     # valid PROV document!
     for ns in doc.namespaces:
@@ -243,220 +997,280 @@ def __validate_seis_prov(file_object):
 
     # Step 4: Custom validation against the JSON schema. Validate the root
     # document as well as any bundles.
-    seis_prov_ids = _validate_prov_bundle(doc, json_schema, ns=ns)
-    for bundle in doc.bundles:
-        seis_prov_ids.extend(
-            _validate_prov_bundle(bundle, json_schema, ns=ns))
+    with _phase("records"):
+        seis_prov_ids = _validate_prov_bundle(doc, plan, ns=ns)
+        for bundle in doc.bundles:
+            seis_prov_ids.extend(
+                _validate_prov_bundle(bundle, plan, ns=ns))
 
     if not seis_prov_ids:
         _log_warning("The document is a valid W3C PROV document but not a "
                      "single SEIS-PROV record has been found.")
         return
 
-    # Find duplicate ids.
-    duplicates = set([i for i in seis_prov_ids
-                      if sum([1 for a in seis_prov_ids if a == i]) > 1])
-    if duplicates:
-        _log_error("One or more ids have been used more than once: %s" %
-                   ", ".join(["'%s'" % _i for _i in duplicates]))
+    # Step 5: Checks across all records of the document and its bundles.
+    with _phase("identifiers"):
+        from .identifier_index import IdentifierIndex
+        _validate_identifiers(IdentifierIndex.from_document(doc), ns=ns)
 
 
-def _validate_prov_bundle(doc, json_schema, ns):
+def _validate_identifiers(index, ns):
+    """
+    Checks requiring knowledge of all identifiers in a document.
+
+    :param index: The :class:`~.identifier_index.IdentifierIndex` of the
+        document.
+    :param ns: The SEIS-PROV namespace of the document.
+    """
+    # Find duplicate ids.
+    duplicates = index.duplicates(namespace=ns.uri)
+    if duplicates:
+        _log_record_error("One or more ids have been used more than once: "
+                          "%s" % ", ".join(["'%s'" % _i[1]
+                                            for _i in duplicates]))
+
+    # References to SEIS-PROV records that are not part of the document. This
+    # is allowed by W3C PROV but most likely not intended.
+    dangling = sorted(set(
+        index.get_name(_i[2])
+        for _i in index.dangling_references(namespace=ns.uri)))
+    if dangling:
+        _log_warning("The following ids in the SEIS-PROV namespace are "
+                     "referenced by relations but not defined in the "
+                     "document: %s" % ", ".join("'%s'" % _i
+                                                for _i in dangling))
+
+
+def _validate_prov_bundle(doc, plan, ns):
     """
     Custom validator for SEIS-PROV.
+
+    Returns the local parts of the ids of all SEIS-PROV records.
+
+    :param doc: The prov document or bundle to validate.
+    :param plan: The compiled validation plan, see
+        :func:`_get_validation_plan`.
+    :param ns: The SEIS-PROV namespace of the document.
     """
     id_collector = []
+    for record in doc._records:
+        identifier = _check_record(record, plan, ns)
+        if identifier is not None:
+            id_collector.append(identifier)
+    return id_collector
 
-    json_schema_map = {
-        prov.model.PROV_ENTITY: json_schema["entities"],
-        prov.model.PROV_ACTIVITY: json_schema["activities"],
-        prov.model.PROV_AGENT: json_schema["agents"]}
 
-    for record in doc._records:
-        # I don't fully understand what the prov API intends to do with two
-        # sets of attributes so we just create a union of them here.
-        attrs = list(set(record.attributes).union(record.extra_attributes))
+def _check_record(record, plan, ns):
+    """
+    Validate a single record. If all errors are requested, an error that
+    prevents any further checks of the record is collected and the
+    validation continues with the next record.
 
-        if record.identifier:
-            id_in_seis_prov_ns = record.identifier.namespace == ns
-        else:
-            id_in_seis_prov_ns = False
-
-        # Find the prov type
-        prov_type = [i[1] for i in attrs if i[0] == prov.model.PROV_TYPE]
-
-        # Check if any of the prov:type's is in the SEIS-PROV namespace.
-        prov_type_in_ns = False
-        for t in prov_type:
-            # If neither the prov type nor the id are in the SEIS-PROV
-            # namespace it is not part of SEIS-PROV and so we don't validate
-            # it.
-            if isinstance(t, six.string_types):
-                if t.startswith("%s:" % ns.prefix):
-                    prov_type_in_ns = True
-                    break
-            elif isinstance(t, prov.model.Literal):
-                if t.value.startswith("%s:" % ns.prefix):
-                    prov_type_in_ns = True
-                    break
-            else:
-                if t.namespace == ns:
-                    prov_type_in_ns = True
-                    break
+    Returns the local part of the record's id if it is a SEIS-PROV record,
+    otherwise ``None``.
+    """
+    context = getattr(_CONTEXT, "current", None)
+    if context is None or not context.all_errors:
+        return _validate_record(record, plan, ns)
+    try:
+        return _validate_record(record, plan, ns)
+    except _ErrorLimitReached:
+        raise
+    except SeisProvValidationException as e:
+        context.add_error(e.message)
+        return record.identifier.localpart if record.identifier else None
 
-        # Neither id not prov type in SEIS-PROV namespace. We don't have to
-        # worry anymore.
-        if not id_in_seis_prov_ns and not prov_type_in_ns:
-            continue
 
-        if len(prov_type) > 1:
-            # As soon as either the id or any type is in the SEIS_PROV
-            # namespace, this is no longer allowed.
-            _log_error("Record '%s' has %i prov:type's set. Only one is "
-                       "allowed as soon as any prov:type or the record's id "
-                       "is in the SEIS-PROV namespace." %
-                       (str(record.identifier), len(prov_type)))
-        if not prov_type:
-            # If the id is in the SEIS-PROV namespace, it must have a
-            # prov_type.
-            if id_in_seis_prov_ns:
-                _log_error("Record '%s' has an id in the SEIS-PROV namespace "
-                           "but no prov:type attribute. This is not allowed."
-                           % str(record.identifier))
-            continue
-        prov_type = prov_type[0]
+def _validate_record(record, plan, ns):
+    """
+    Validate a single record against the SEIS-PROV definitions.
 
-        rec_type = record.get_type()
-        if rec_type not in (
-                prov.model.PROV_ENTITY, prov.model.PROV_ACTIVITY,
-                prov.model.PROV_AGENT) and record.identifier is None:
-            continue
+    Returns the local part of the record's id if it is a SEIS-PROV record,
+    otherwise ``None``.
 
-        # Now we need to deal with a couple of different failure cases.
-        if prov_type_in_ns:
-            # 1. It's prov_type is in the seis_prov namespace but the id is
-            #    not. This is not valid.
-            if not id_in_seis_prov_ns:
-                _log_error("Record '%s' has a prov:type attribute in the "
-                           "SEIS-PROV namespace but its id is not part of the "
-                           "namespace. This is not allowed." %
-                           (str(record.identifier)))
+    :param record: The prov record.
+    :param plan: The compiled validation plan, see
+        :func:`_get_validation_plan`.
+    :param ns: The SEIS-PROV namespace of the document.
+    """
+    import prov.model
+
+    ns_prefix = "%s:" % ns.prefix
+
+    # I don't fully understand what the prov API intends to do with two
+    # sets of attributes so we just create a union of them here.
+    attrs = list(set(record.attributes).union(record.extra_attributes))
+
+    if record.identifier:
+        id_in_seis_prov_ns = record.identifier.namespace == ns
+    else:
+        id_in_seis_prov_ns = False
+
+    # Find the prov type
+    prov_type = [i[1] for i in attrs if i[0] == prov.model.PROV_TYPE]
+
+    # Check if any of the prov:type's is in the SEIS-PROV namespace.
+    prov_type_in_ns = False
+    for t in prov_type:
+        # If neither the prov type nor the id are in the SEIS-PROV
+        # namespace it is not part of SEIS-PROV and so we don't validate
+        # it.
+        if isinstance(t, six.string_types):
+            if t.startswith(ns_prefix):
+                prov_type_in_ns = True
+                break
+        elif isinstance(t, prov.model.Literal):
+            if t.value.startswith(ns_prefix):
+                prov_type_in_ns = True
+                break
         else:
-            # 2. If the prov type is not in the SEIS-PROV namespace but the id
-            #    is, then it must either be a software agent or a person.
-            #    Anything else is not allowed.
-            if id_in_seis_prov_ns:
-                if prov_type not in (_PERSON, _SOFTWARE_AGENT, _ORGANIZATION):
-                    _log_error(
-                        "Record '%s' has an id in the SEIS-PROV namespace "
-                        "but its prov:type is neither in the SEIS-PROV "
-                        "namespace nor is it a person, an organization, or a "
-                        "software agent. This is not allowed." %
-                        str(record.identifier))
-            else:
-                # This should not be able to happen as we check for this
-                # combination a bit further up the code.
-                raise NotImplementedError
+            if t.namespace == ns:
+                prov_type_in_ns = True
+                break
 
-        if prov_type == _PERSON:
-            prov_type = "person"
-        elif prov_type == _SOFTWARE_AGENT:
-            prov_type = "software_agent"
-        elif prov_type == _ORGANIZATION:
-            prov_type = "organization"
+    # Neither id not prov type in SEIS-PROV namespace. We don't have to
+    # worry anymore.
+    if not id_in_seis_prov_ns and not prov_type_in_ns:
+        return None
+
+    if len(prov_type) > 1:
+        # As soon as either the id or any type is in the SEIS_PROV
+        # namespace, this is no longer allowed.
+        _log_error("Record '%s' has %i prov:type's set. Only one is "
+                   "allowed as soon as any prov:type or the record's id "
+                   "is in the SEIS-PROV namespace." %
+                   (str(record.identifier), len(prov_type)))
+    if not prov_type:
+        # If the id is in the SEIS-PROV namespace, it must have a
+        # prov_type.
+        if id_in_seis_prov_ns:
+            _log_error("Record '%s' has an id in the SEIS-PROV namespace "
+                       "but no prov:type attribute. This is not allowed."
+                       % str(record.identifier))
+        return None
+    prov_type = prov_type[0]
+
+    rec_type = record.get_type()
+    if rec_type not in (
+            prov.model.PROV_ENTITY, prov.model.PROV_ACTIVITY,
+            prov.model.PROV_AGENT) and record.identifier is None:
+        return None
+
+    # Now we need to deal with a couple of different failure cases.
+    if prov_type_in_ns:
+        # 1. It's prov_type is in the seis_prov namespace but the id is
+        #    not. This is not valid.
+        if not id_in_seis_prov_ns:
+            _log_error("Record '%s' has a prov:type attribute in the "
+                       "SEIS-PROV namespace but its id is not part of the "
+                       "namespace. This is not allowed." %
+                       (str(record.identifier)))
+    else:
+        # 2. If the prov type is not in the SEIS-PROV namespace but the id
+        #    is, then it must either be a software agent or a person.
+        #    Anything else is not allowed.
+        if id_in_seis_prov_ns:
+            if getattr(prov_type, "uri", None) not in _AGENT_TYPES:
+                _log_error(
+                    "Record '%s' has an id in the SEIS-PROV namespace "
+                    "but its prov:type is neither in the SEIS-PROV "
+                    "namespace nor is it a person, an organization, or a "
+                    "software agent. This is not allowed." %
+                    str(record.identifier))
         else:
-            prov_type = assert_ns_and_extract(prov_type, ns)
+            # This should not be able to happen as we check for this
+            # combination a bit further up the code.
+            raise NotImplementedError
 
-        if rec_type not in json_schema_map:
-            _log_error("%s not a record type that is valid for SEIS-PROV." %
-                       str(rec_type))
-        json_def = json_schema_map[rec_type]
+    if getattr(prov_type, "uri", None) in _AGENT_TYPES:
+        prov_type = _AGENT_TYPES[prov_type.uri]
+    else:
+        prov_type = assert_ns_and_extract(prov_type, ns)
+
+    if rec_type not in plan:
+        _log_error("%s not a record type that is valid for SEIS-PROV." %
+                   str(rec_type))
+    type_plans = plan[rec_type]
+
+    if prov_type not in type_plans:
+        _log_error("prov:type '%s' of record type '%s' is not known to "
+                   "SEIS-PROV." % (prov_type, str(rec_type)))
+
+    definition = type_plans[prov_type]
+
+    # If the id is in the SEIS-PROV namespace, it must adhere to the
+    # regular expression of the documentation.
+    if id_in_seis_prov_ns:
+        if definition.id_regex.match(
+                record.identifier.localpart) is None:
+            _log_record_error(
+                "The local part of the identifier '%s' does not match the "
+                "regular expression '%s' as is required by the standard." % (
+                    str(record.identifier), definition.id_regex.pattern))
+
+    # Validate the label.
+    prov_label = [i for i in attrs if i[0] == prov.model.PROV_LABEL]
+    if not prov_label:
+        _log_error("Record '%s' does not have a prov:label set." %
+                   str(record.identifier))
+    elif len(prov_label) > 1:
+        _log_error("Record '%s' has %i prov:label's set. Only one is "
+                   "allowed." % (str(record.identifier), len(prov_label)))
+    prov_label = prov_label[0][1]
+
+    # '*' is a special label for agents.
+    if definition.label != "*" and definition.label != prov_label:
+        _log_record_error("Record '%s' has label '%s' instead of '%s'." % (
+            str(record.identifier), prov_label, definition.label))
+
+    # Get all attributes which are part of the seis prov namespace. All
+    # others don't matter for the sake of validation.
+    attrs = [_i for _i in attrs
+             if isinstance(_i[0], prov.model.QualifiedName) and
+             _i[0].namespace == ns]
+
+    # Make sure it has all required attributes.
+    available_attributes = set([_i[0].localpart for _i in attrs])
+    missing_attributes = sorted(definition.required.difference(
+        available_attributes))
+
+    if missing_attributes:
+        _log_record_error("Record '%s' misses the following required "
+                          "attributes in the SEIS-PROV namespace: %s" %
+                          (str(record.identifier),
+                           ", ".join("'%s'" % _i
+                                     for _i in missing_attributes)))
+
+    # Validate each attribute.
+    for attr in attrs:
+        name, value = attr[0].localpart, attr[1]
+        this_def = definition.attributes.get(name)
+
+        if this_def is None and \
+                not definition.other_attributes_allowed:
+            _log_record_error("Record '%s' has an additional attribute in "
+                              "the SEIS-PROV namespace: '%s'. This is not "
+                              "allowed for this record type." % (
+                                  str(record.identifier), name))
+            continue
+        elif this_def is None:
+            # In some instances its allowed.
+            continue
 
-        if prov_type not in json_def:
-            _log_error("prov:type '%s' of record type '%s' is not known to "
-                       "SEIS-PROV." % (prov_type, str(rec_type)))
+        if not _validate_type(name, value, this_def.types,
+                              this_def.checkers):
+            continue
 
-        definition = json_def[prov_type]
+        # Also validate the patterns if any.
+        if this_def.pattern is not None:
+            if this_def.pattern.match(value) is None:
+                _log_record_error(
+                    "Attribute '%s' in record '%s' with the value '%s' does "
+                    "not match the regex '%s'." % (
+                        name, str(record.identifier), value,
+                        this_def.pattern.pattern))
 
-        # If the id is in the SEIS-PROV namespace, it must adhere to the
-        # regular expression of the documentation.
-        if id_in_seis_prov_ns:
-            id_regex = r"^sp\d{3,5}_" + definition["two_letter_code"] + \
-                r"_[a-z0-9]{7,12}$"
-            if re.match(id_regex, record.identifier.localpart) is None:
-                _log_error("The local part of the identifier '%s' does not "
-                           "match the regular expression '%s' as is required "
-                           "by the standard."
-                           % (str(record.identifier), id_regex))
-
-        id_collector.append(record.identifier.localpart)
-
-        # Validate the label.
-        prov_label = [i for i in attrs if i[0] == prov.model.PROV_LABEL]
-        if not prov_label:
-            _log_error("Record '%s' does not have a prov:label set." %
-                       str(record.identifier))
-        elif len(prov_label) > 1:
-            _log_error("Record '%s' has %i prov:label's set. Only one is "
-                       "allowed." % (str(record.identifier), len(prov_label)))
-        prov_label = prov_label[0][1]
-
-        # '*' is a special label for agents.
-        if definition["label"] != "*" and definition["label"] != prov_label:
-            _log_error("Record '%s' has label '%s' instead of '%s'." % (
-                       str(record.identifier), prov_label,
-                       definition["label"]))
-
-        # Get all attributes which are part of the seis prov namespace. All
-        # others don't matter for the sake of validation.
-        attrs = [_i for _i in attrs
-                 if isinstance(_i[0], prov.model.QualifiedName) and
-                 _i[0].namespace == ns]
-
-        # Make sure it has all required attributes.
-        required_attributes = set([_i["name"]
-                                   for _i in definition["attributes"]
-                                   if _i["required"]])
-        available_attributes = set([_i[0].localpart for _i in attrs])
-        missing_attributes = sorted(required_attributes.difference(
-            available_attributes))
-
-        if missing_attributes:
-            _log_error("Record '%s' misses the following required "
-                       "attributes in the SEIS-PROV namespace: %s" %
-                       (str(record.identifier),
-                        ", ".join("'%s'" % _i for _i in missing_attributes)))
-
-        # Validate each attribute.
-        for attr in attrs:
-            name, value = attr[0].localpart, attr[1]
-            this_def = [i for i in definition["attributes"]
-                        if i["name"] == name]
-
-            if not this_def and \
-                    not definition["other_seis_prov_attributes_allowed"]:
-                _log_error("Record '%s' has an additional attribute in the "
-                           "SEIS-PROV namespace: '%s'. This is not allowed "
-                           "for this record type." % (str(record.identifier),
-                                                      name))
-            elif not this_def:
-                # In some instances its allowed.
-                continue
-
-            this_def = this_def[0]
-            _validate_type(name, value, this_def["types"])
-
-            # Also validate the patterns if any.
-            if "pattern" in this_def:
-                if "xsd:string" not in this_def["types"]:
-                    # This should not happen.
-                    raise Exception
-                if re.match(this_def["pattern"], value) is None:
-                    _log_error("Attribute '%s' in record '%s' with the value "
-                               "'%s' does not match the regex '%s'." % (
-                                name, str(record.identifier), value,
-                                this_def["pattern"]))
-    return id_collector
+    return record.identifier.localpart
 
 
 # Collection of functions performing the actual type validation. Should return
@@ -475,21 +1289,28 @@ TYPE_MAP = {
 }
 
 
-def _validate_type(value_name, value, possible_types):
+def _validate_type(value_name, value, possible_types, checkers):
     """
     Validate the possible types and also check the values if possible.
+    Returns False if the value does not have any of the types and all
+    errors are collected.
+
+    :param value_name: Name of the attribute.
+    :param value: The value to check.
+    :param possible_types: The names of all allowed types.
+    :param checkers: The type checking functions from :data:`TYPE_MAP`
+        corresponding to ``possible_types``.
     """
-    for t in possible_types:
-        if t not in TYPE_MAP:
-            raise NotImplementedError
+    for checker in checkers:
         try:
-            if TYPE_MAP[t](value) is True:
-                break
+            if checker(value) is True:
+                return True
         except:
             continue
-    else:
-        _log_error("Attribute '%s' has an invalid type '%s'. Valid types: %s"
-                   % (value_name, type(value), ", ".join(possible_types)))
+    _log_record_error("Attribute '%s' has an invalid type '%s'. Valid types: "
+                      "%s" % (value_name, type(value),
+                              ", ".join(possible_types)))
+    return False
 
 
 def assert_ns_and_extract(name, ns):
@@ -503,20 +1324,75 @@ def assert_ns_and_extract(name, ns):
     return name[len(prefix):]
 
 
-def _validate_against_xsd_scheme(doc):
-    # Serialize to XML (this makes it work with JSON and others as well).
-    buf = io.BytesIO()
-    doc.serialize(destination=buf, format="xml")
-    buf.seek(0, 0)
+def _compile_xsd_schema():
+    """
+    Parse and compile the PROV-XML XSD schema.
+    """
+    from lxml import etree
+    return etree.XMLSchema(etree.parse(_PROV_XML_SCHEMA))
+
+
+def _get_xsd_schema():
+    """
+    The compiled PROV-XML XSD schema of the current validator.
+    """
+    return _get_validator().xsd_schema
+
+
+def _load_schemas():
+    """
+    Load and compile all schemas so the first validation does not have to
+    do it. Useful for long running processes.
+    """
+    validator = _get_validator()
+    validator.plan
+    validator.xsd_schema
+
+
+def _has_entity_references(xml_tree):
+    """
+    Check if a parsed PROV-XML tree contains unresolved entity references.
+    They require a document type declaration so all others are not
+    searched.
+
+    :param xml_tree: The lxml element tree.
+    """
+    if not xml_tree.docinfo.doctype:
+        return False
+    from lxml import etree
+    return next(xml_tree.iter(etree.Entity), None) is not None
+
 
-    xml_doc = etree.parse(buf)
-    if not __XSD_SCHEMA_CACHE:
-        __XSD_SCHEMA_CACHE.append(
-            etree.XMLSchema(etree.parse(_PROV_XML_SCHEMA)))
+def _validate_against_xsd_scheme(doc, xml_tree=None):
+    """
+    Validate a document against the PROV-XML XSD schema.
 
-    xml_schema = __XSD_SCHEMA_CACHE[0]
+    :param doc: The prov document.
+    :param xml_tree: The already parsed PROV-XML tree of the document. If not
+        given, the document is serialized to PROV-XML and parsed again.
+    """
+    with _phase("xsd"):
+        if xml_tree is None:
+            from lxml import etree
+            # Serialize to XML (this makes it work with JSON and others as
+            # well).
+            buf = io.BytesIO()
+            doc.serialize(destination=buf, format="xml")
+            buf.seek(0, 0)
+            xml_tree = etree.parse(buf)
+
+        xml_schema = _get_xsd_schema()
+
+        context = getattr(_CONTEXT, "current", None)
+        if context is not None:
+            context.source = xml_tree.docinfo.URL
 
-    is_valid = xml_schema.validate(xml_doc)
+        try:
+            is_valid = xml_schema.validate(xml_tree)
+        except Exception as e:
+            _log_error("SEIS-PROV document could not be validated against "
+                       "the PROV-XML schema: %s" % e)
+            return
     if is_valid:
         return
 
@@ -525,17 +1401,224 @@ def _validate_against_xsd_scheme(doc):
                    str(i) for i in xml_schema.error_log))
 
 
-def main():
+def format_stats(stats):
+    """
+    Format the statistics of a validation as a table.
+
+    :param stats: The ``stats`` of a :class:`SeisProvValidationResult`.
+    """
+    def memory(value):
+        return "%8.2f" % (value / 1024.0 ** 2) if value is not None \
+            else "%8s" % "-"
+
+    lines = ["%-12s %10s %10s %12s %6s" % (
+        "Phase", "Wall [ms]", "CPU [ms]", "Memory [MB]", "Calls")]
+    for name, phase in stats["phases"].items():
+        lines.append("%-12s %10.1f %10.1f     %s %6i" % (
+            name, phase["wall_time"] * 1000.0, phase["cpu_time"] * 1000.0,
+            memory(phase["peak_memory"]), phase["calls"]))
+    lines.append("%-12s %10.1f %10.1f     %s" % (
+        "total", stats["wall_time"] * 1000.0, stats["cpu_time"] * 1000.0,
+        memory(stats["peak_memory"])))
+    if stats["cached"]:
+        lines.append("Result taken from the cache.")
+    else:
+        lines.append("%i records in the document and %i bundles." % (
+            stats["records"], stats["bundles"]))
+    return "\n".join(lines)
+
+
+def _main_hdf5(paths, group, jobs, **options):
+    """
+    Validate and print the results of all documents in the given HDF5 files.
+    """
+    from .batch import find_files
+    from . import hdf5
+    try:
+        import h5py  # NOQA
+    except ImportError:
+        print("Validating HDF5 files requires h5py.", file=sys.stderr)
+        sys.exit(2)
+
+    filenames = find_files(paths, extensions=hdf5.EXTENSIONS)
+    if not filenames:
+        print("No HDF5 files found.", file=sys.stderr)
+        sys.exit(2)
+    document_count = invalid_count = unreadable_count = 0
+    for filename in filenames:
+        try:
+            for name, result in hdf5.validate_datasets(
+                    filename, jobs=jobs, group=group, **options):
+                document_count += 1
+                if not result.is_valid:
+                    invalid_count += 1
+                print("%s:%s/%s: %s" % (filename, group, name, result))
+                if result.stats is not None:
+                    print("    " + format_stats(result.stats).replace(
+                        "\n", "\n    "))
+                sys.stdout.flush()
+        except (IOError, OSError) as e:
+            unreadable_count += 1
+            print("%s: Could not read HDF5 file: %s" % (filename, e))
+
+    print("\nValidated %i documents in %i files: %i valid, %i invalid." % (
+        document_count, len(filenames) - unreadable_count,
+        document_count - invalid_count, invalid_count))
+    if unreadable_count:
+        print("%i files could not be read." % unreadable_count)
+    if invalid_count or unreadable_count:
+        sys.exit(1)
+
+
+def main(argv=None):
+    import argparse
+
+    from .batch import find_files
+    from .cache import DEFAULT_DIRECTORY, DEFAULT_MAX_SIZE, ResultCache
+    from .hdf5 import PROVENANCE_GROUP
+
     parser = argparse.ArgumentParser(
         description="Validator for SEIS-PROV files.")
-    parser.add_argument("filename", help="Filename of the SEIS-PROV file.")
-    args = parser.parse_args()
+    parser.add_argument("filename", nargs="*",
+                        help="Filenames of the SEIS-PROV files. Directories "
+                        "are searched recursively for XML and JSON files and "
+                        "glob patterns are expanded.")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Number of processes used to validate multiple "
+                        "files or by the HTTP service. 0 uses all available "
+                        "cores.")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Validate files while reading them. "
+                        "Keeps the memory usage constant for very large "
+                        "files.")
+    parser.add_argument("--all-errors", action="store_true",
+                        help="Report the errors of all records instead of "
+                        "stopping at the first one.")
+    parser.add_argument("--max-errors", type=int,
+                        help="Stop after this many errors. Implies "
+                        "--all-errors.")
+    parser.add_argument("--cache", nargs="?", const=DEFAULT_DIRECTORY,
+                        metavar="DIRECTORY",
+                        help="Cache the results of files with the same "
+                        "contents. Defaults to '%s' if no directory is "
+                        "given." % DEFAULT_DIRECTORY)
+    parser.add_argument("--cache-size", type=float,
+                        default=DEFAULT_MAX_SIZE / 1024.0 ** 2,
+                        help="Maximum size of the cache in MB.")
+    parser.add_argument("--stats", action="store_true",
+                        help="Print the time and peak memory of each phase "
+                        "of the validation. Tracing the memory slows down "
+                        "the validation.")
+    parser.add_argument("--hdf5", action="store_true",
+                        help="Validate all provenance documents embedded in "
+                        "HDF5 files, e.g. ASDF files. Directories are "
+                        "searched for .h5, .hdf5, and .asdf files. Requires "
+                        "h5py.")
+    parser.add_argument("--hdf5-group", default=PROVENANCE_GROUP,
+                        help="Group of the provenance documents in the HDF5 "
+                        "files.")
+    parser.add_argument("--serve", action="store_true",
+                        help="Run a validation daemon keeping all schemas "
+                        "in memory. Files are then validated by it with "
+                        "--daemon.")
+    parser.add_argument("--http", action="store_true",
+                        help="Run an HTTP validation service on localhost "
+                        "accepting POSTed documents.")
+    parser.add_argument("--port", type=int,
+                        help="Port of the HTTP validation service.")
+    parser.add_argument("--timeout", type=float,
+                        help="Seconds the HTTP validation service waits for "
+                        "a validation before answering with an error.")
+    parser.add_argument("--daemon", action="store_true",
+                        help="Let the running validation daemon validate "
+                        "the files.")
+    parser.add_argument("--socket",
+                        help="Socket of the validation daemon.")
+    parser.add_argument("--threads", type=int,
+                        help="Number of connections the validation daemon "
+                        "handles at the same time.")
+    args = parser.parse_args(argv)
+
+    if not args.filename and not args.serve and not args.http:
+        parser.error("the following arguments are required: filename")
+    if args.daemon and args.cache:
+        parser.error("--cache cannot be used with --daemon. Start the "
+                     "daemon with --cache instead.")
+    if args.daemon and args.hdf5:
+        parser.error("--hdf5 cannot be used with --daemon.")
+
+    cache = None
+    if args.cache:
+        cache = ResultCache(args.cache,
+                            max_size=int(args.cache_size * 1024 ** 2))
+
+    # The daemon and the service are only imported if they are used.
+    if args.serve:
+        from . import daemon
+        daemon.serve(args.socket or daemon.DEFAULT_SOCKET,
+                     threads=daemon.DEFAULT_THREADS if args.threads is None
+                     else args.threads, cache=cache)
+        return
+    if args.http:
+        from . import service
+        service.serve(service.DEFAULT_PORT if args.port is None
+                      else args.port, workers=args.jobs, cache=cache,
+                      timeout=service.DEFAULT_TIMEOUT if args.timeout is None
+                      else args.timeout)
+        return
+
+    options = {"streaming": args.streaming,
+               "all_errors": args.all_errors or args.max_errors is not None,
+               "max_errors": args.max_errors}
+    if args.stats:
+        options["stats"] = True
 
-    filename = args.filename
+    if args.hdf5:
+        options["cache"] = cache
+        _main_hdf5(args.filename, group=args.hdf5_group, jobs=args.jobs,
+                   **options)
+        return
+
+    filenames = find_files(args.filename)
+    if not filenames:
+        print("No SEIS-PROV files found.", file=sys.stderr)
+        sys.exit(2)
+
+    if args.daemon:
+        from . import daemon
+        try:
+            client = daemon.DaemonClient(args.socket or daemon.DEFAULT_SOCKET)
+        except daemon.DaemonNotRunning as e:
+            print(e, file=sys.stderr)
+            sys.exit(2)
+        results = ((_i, client.validate(_i, **options)) for _i in filenames)
+    else:
+        from .batch import validate_many
+        options["cache"] = cache
+        results = validate_many(filenames, jobs=args.jobs, **options)
+
+    # A single file results in the same output as always.
+    if len(filenames) == 1:
+        result = next(results)[1]
+        print(result)
+        if result.stats is not None:
+            print(format_stats(result.stats))
+        if not result.is_valid:
+            sys.exit(1)
+        return
 
-    result = validate(filename)
-    print(result)
-    if not result.is_valid:
+    invalid_count = 0
+    for filename, result in results:
+        if not result.is_valid:
+            invalid_count += 1
+        print("%s: %s" % (filename, result))
+        if result.stats is not None:
+            print("    " + format_stats(result.stats).replace("\n", "\n    "))
+        sys.stdout.flush()
+
+    print("\nValidated %i files: %i valid, %i invalid." % (
+        len(filenames), len(filenames) - invalid_count, invalid_count))
+    if invalid_count:
         sys.exit(1)
 
 
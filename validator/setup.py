@@ -33,8 +33,9 @@ setup(
                                "test_data/invalid_files/*.json",
                                "test_data/invalid_files/*.txt"]
     },
-    install_requires=["prov>=1.4.0", "jsonschema>=2.4.0", "lxml", "pytest",
+    install_requires=["prov>=1.4.0,<4", "jsonschema>=2.4.0", "lxml", "pytest",
                       "six"],
+    extras_require={"hdf5": ["h5py"], "columnar": ["numpy", "pyarrow"]},
     entry_points="""
         [console_scripts]
         seis-prov-validate=seis_prov_validate.validator:main